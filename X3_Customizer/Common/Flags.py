@@ -293,6 +293,20 @@ def Pack_Tships_Missile_Flags(ship_dict, flags_dict):
     ship_dict['missile_compatibility_flags'] = packed_flags
 
 
+def Get_Flag_Bits(flag_bit_to_name_dict, *flag_names):
+    '''
+    Returns an int with the bits of the given flag names set, eg. for
+    selecting lines by their flags in T_File.Update_Fields.
+    flag_bit_to_name_dict is the dict keying bit index to flag name,
+    as used by Unpack_Flags.
+    '''
+    name_to_bit_dict = {x:y for y,x in flag_bit_to_name_dict.items()}
+    bits = 0
+    for name in flag_names:
+        bits |= 1 << name_to_bit_dict[name]
+    return bits
+
+
 import collections
 def Unpack_Flags(flag_bit_to_name_dict, 
                  packed_flags_value, 
@@ -47,6 +47,9 @@ class Settings_class:
       - String, name a file to write detailed output messages to.
     * log_file_name
       - String, name a file to write json log output to.
+    * cat_index_cache_file_name
+      - String, name of a file in the log folder to cache parsed
+        catalog indexes in, for reuse on later runs.
     * disable_cleanup_and_writeback
       - Bool, if True then cleanup from a prior run as well as any final
         writes will be skipped.
@@ -88,6 +91,48 @@ class Settings_class:
       - Bool, if True then the modified files will be written to a single
         cat/dat pair, incrementally numbered above existing catalogs.
       - Scripts will be kept as loose files.
+    * skip_unchanged_outputs
+      - Bool, if True then loose files written on the prior run are
+        left untouched when the new contents are identical, instead of
+        being deleted and rewritten, so their modification times are
+        preserved.
+      - Default is False.
+    * memory_map_catalogs
+      - Bool, if True then dat files will be memory mapped and kept open
+        while reading source files, instead of being reopened for every
+        file read.
+    * use_cat_index_cache
+      - Bool, if True then parsed catalog indexes will be cached in
+        the log folder, and reused on later runs when the catalog
+        file size and modification time are unchanged.
+    * compression_level
+      - Int, gzip compression level (0-9) used when packing files into
+        a catalog; lower levels write faster but produce larger files.
+      - Default is 9, the gzip default.
+    * compression_thread_count
+      - Int, number of threads used to compress files when writing
+        a catalog; if None, this is based on the cpu count.
+    * write_thread_count
+      - Int, number of threads used to prepare and write loose output
+        files; if None, this is based on the cpu count.
+    * use_payload_cache
+      - Bool, if True then decompressed pck files read from catalogs
+        will be cached in the log folder, and reused on later runs when
+        the catalog files are unchanged.
+      - Default is False.
+    * payload_cache_max_mb
+      - Int, maximum size in megabytes of the payload cache; the least
+        recently used files are removed when this is exceeded.
+    * use_run_cache
+      - Bool, if True then the transform calls and source files of each
+        run are recorded along with the output files, and a later run
+        making the same calls on the same sources will reuse the recorded
+        outputs instead of running the transforms.
+      - Default is False.
+    * use_numpy_for_t_files
+      - Bool, if True and numpy is available, then bulk updates to
+        T file fields are done on whole columns as numpy arrays, with
+        the same results as the plain python updates.
     '''
     '''
     -Removed attributes, for now.
@@ -109,6 +154,9 @@ class Settings_class:
         s.path_to_log_folder = None
         s.message_file_name = None
         s.log_file_name = None
+        s.cat_index_cache_file_name = 'X3_Customizer_cat_index_cache.json'
+        s.payload_cache_folder_name = 'payload_cache'
+        s.run_cache_folder_name = 'run_cache'
         # Temp entry for relative source folder.
         s._relative_source_folder = None
         s.disable_cleanup_and_writeback = False
@@ -123,6 +171,16 @@ class Settings_class:
         s.allow_path_error = False
         s.target_base_tc = False
         s.output_to_catalog = True
+        s.skip_unchanged_outputs = False
+        s.memory_map_catalogs = True
+        s.use_cat_index_cache = True
+        s.compression_level = 9
+        s.compression_thread_count = None
+        s.write_thread_count = None
+        s.use_payload_cache = False
+        s.payload_cache_max_mb = 256
+        s.use_run_cache = False
+        s.use_numpy_for_t_files = True
         
 
     #def Get_Page_Text_File_Path(s):
@@ -445,6 +503,37 @@ class Settings_class:
         return os.path.join(s.path_to_log_folder, s.log_file_name)
 
 
+    def Get_Log_Journal_Path(s):
+        '''
+        Returns the path to the log journal file, including file name.
+        '''
+        return s.Get_Log_File_Path() + '.journal'
+
+
+    def Get_Cat_Index_Cache_Path(s):
+        '''
+        Returns the path to the catalog index cache file, including
+        file name.
+        '''
+        return os.path.join(s.path_to_log_folder, s.cat_index_cache_file_name)
+
+
+    def Get_Payload_Cache_Folder(s):
+        '''
+        Returns the path to the folder holding cached decompressed
+        catalog payloads.
+        '''
+        return os.path.join(s.path_to_log_folder, s.payload_cache_folder_name)
+
+
+    def Get_Run_Cache_Folder(s):
+        '''
+        Returns the path to the folder holding the run cache record and
+        cached output files.
+        '''
+        return os.path.join(s.path_to_log_folder, s.run_cache_folder_name)
+
+
 # General settings object, to be referenced by any place so interested.
 Settings = Settings_class()
 
@@ -0,0 +1,124 @@
+'''
+Support for caching parsed catalog indexes between runs.
+
+Decoding and parsing every cat file on each run takes a noticeable
+amount of time for large installs (eg. XRM/LU). Since the game cat
+files rarely change, the parsed index (path, offset and size of each
+entry) is stored in a compact json file in the log folder, and reused
+on later runs as long as the cat file size and modification time
+are unchanged.
+'''
+import os
+import json
+from ..Common.Settings import Settings
+from .File_Paths import *
+
+# Version of the cache layout; older caches are ignored.
+_cache_version = 1
+
+
+class Cat_Index_Cache:
+    '''
+    Cache of parsed catalog indexes.
+
+    Attributes:
+    * cat_index_dict
+      - Dict, keyed by absolute cat file path, holding a dict with keys:
+        'size' (int, cat file size in bytes), 'mtime_ns' (int, cat file
+        modification time), 'paths' (list of entry cat paths),
+        'offsets' (list of int dat offsets), 'sizes' (list of int sizes).
+    * modified
+      - Bool, if True then the cache has changed since it was loaded,
+        and should be stored.
+    '''
+    def __init__(s):
+        s.cat_index_dict = {}
+        s.modified = False
+
+
+    def Load(s):
+        '''
+        Load the cache file from the log folder, if it exists.
+        An unreadable or outdated cache is ignored.
+        '''
+        path = Settings.Get_Cat_Index_Cache_Path()
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r') as file:
+                cache_dict = json.load(file)
+        except Exception:
+            # Something went wrong, eg. a partial write; just rebuild.
+            return
+        if cache_dict.get('version') != _cache_version:
+            return
+
+        # Paths are stored relative to the x3 folder, as with the log.
+        for relative_path, index_dict in cache_dict['cats'].items():
+            s.cat_index_dict[
+                Relative_Path_to_System_Path(relative_path)] = index_dict
+        return
+
+
+    def Store(s, cat_paths_to_keep = None):
+        '''
+        Store the cache file to the log folder, if it was modified.
+
+        * cat_paths_to_keep
+          - Optional list of cat paths in use; other cached cats will
+            be dropped before storing.
+        '''
+        if cat_paths_to_keep != None:
+            for cat_path in list(s.cat_index_dict.keys()):
+                if cat_path not in cat_paths_to_keep:
+                    del(s.cat_index_dict[cat_path])
+                    s.modified = True
+
+        if not s.modified:
+            return
+
+        cache_dict = {
+            'version' : _cache_version,
+            'cats' : {
+                System_Path_to_Relative_Path(cat_path) : index_dict
+                for cat_path, index_dict in s.cat_index_dict.items()
+                },
+            }
+        # Write without indents or spaces, to keep it compact.
+        with open(Settings.Get_Cat_Index_Cache_Path(), 'w') as file:
+            json.dump(cache_dict, file, separators = (',',':'))
+        s.modified = False
+        return
+
+
+    def Get(s, cat_path):
+        '''
+        Returns a tuple of (paths, offsets, sizes) lists for the given
+        cat file, or None if it is not cached or has changed since
+        being cached.
+        '''
+        if cat_path not in s.cat_index_dict:
+            return None
+        index_dict = s.cat_index_dict[cat_path]
+        stat = os.stat(cat_path)
+        if (stat.st_size != index_dict['size']
+        or stat.st_mtime_ns != index_dict['mtime_ns']):
+            return None
+        return index_dict['paths'], index_dict['offsets'], index_dict['sizes']
+
+
+    def Set(s, cat_path, paths, offsets, sizes):
+        '''
+        Record the parsed index for a cat file, along with its current
+        size and modification time.
+        '''
+        stat = os.stat(cat_path)
+        s.cat_index_dict[cat_path] = {
+            'size'     : stat.st_size,
+            'mtime_ns' : stat.st_mtime_ns,
+            'paths'    : paths,
+            'offsets'  : offsets,
+            'sizes'    : sizes,
+            }
+        s.modified = True
+        return
@@ -23,7 +23,9 @@ Note: the data has an extra layer of encoding by xoring with 0x33.
 '''
 from ..Common.Settings import Settings
 import os
+import mmap
 from .File_Paths import *
+from . import Xor_Codec
 
 class Cat_Reader:
     '''
@@ -46,26 +48,33 @@ class Cat_Reader:
       - Dict, keyed by file cat path with name, containing the integer
         offset into the dat file where the contents begin.
       - This is summed from prior entries in the file_size_dict.
+    * dat_file
+      - File object for the open dat file, when memory mapping is in use.
+      - None until the first read, or after Close.
+    * dat_mmap
+      - mmap object covering the dat file, when memory mapping is in use.
+      - None until the first read, after Close, or if the dat file
+        is empty (which cannot be mapped).
     '''
-    def __init__(s, cat_path = None):
+    def __init__(s, cat_path = None, index_cache = None):
+        '''
+        * cat_path
+          - String, the full path to the cat file.
+        * index_cache
+          - Optional Cat_Index_Cache; if given, a cached index for this
+            cat will be used when still valid, otherwise the parsed index
+            will be recorded into the cache.
+        '''
         s.cat_path = cat_path
         s.file_size_dict = {}
         s.file_offset_dict = {}
-                
-        # Read the cat binary data. Error if not found.
+        s.dat_file = None
+        s.dat_mmap = None
+
+        # Error if the cat is not found.
         if not os.path.exists(s.cat_path):
-            raise Exception('Error: failed to find cat file at {}'.format(path))
-        with open(s.cat_path, 'rb') as file:
-            binary = file.read()
-            
-        # Convert back to a long string, and split the lines.
-        # Also, pick off the first line for the dat file name.
-        dat_name, *decoded_lines = s.Decode_Cat(binary).splitlines()
-        # Set the dat path, sharing the cat folder.
-        folder, _ = os.path.split(s.cat_path)
-        s.dat_path = os.path.join(folder, dat_name)
-        # Verify the dat_path has the .dat extension, as expected.
-        assert s.dat_path.endswith('.dat')
+            raise Exception('Error: failed to find cat file at {}'.format(
+                s.cat_path))
 
         # Note: addon/04.cat was observed to point to 'foo.dat', which
         #  implies the game will just look for a dat file named the same
@@ -74,6 +83,26 @@ class Cat_Reader:
         # TODO: maybe toss a warning, but probably nobody cares.
         s.dat_path = s.cat_path.replace('.cat','.dat')
 
+        # Check for a cached index first.
+        cached_index = None
+        if index_cache != None:
+            cached_index = index_cache.Get(s.cat_path)
+        if cached_index != None:
+            paths, offsets, sizes = cached_index
+            s.file_size_dict   = dict(zip(paths, sizes))
+            s.file_offset_dict = dict(zip(paths, offsets))
+            return
+
+        # Read the cat binary data.
+        with open(s.cat_path, 'rb') as file:
+            binary = file.read()
+            
+        # Convert back to a long string, and split the lines.
+        # Also, pick off the first line for the dat file name.
+        dat_name, *decoded_lines = s.Decode_Cat(binary).splitlines()
+        # Verify the dat name has the .dat extension, as expected.
+        assert dat_name.endswith('.dat')
+
         # Loop over the lines.
         # Also track a running offset for packed file start locations.
         start_offset = 0
@@ -92,7 +121,14 @@ class Cat_Reader:
 
             # Advance the offset for the next packed file.
             start_offset += size_bytes
-            
+
+        # Record to the cache for future runs.
+        if index_cache != None:
+            index_cache.Set(
+                s.cat_path,
+                list(s.file_size_dict.keys()),
+                list(s.file_offset_dict.values()),
+                list(s.file_size_dict.values()))
         return
 
 
@@ -102,24 +138,91 @@ class Cat_Reader:
         Decode the cat binary into text.
         Returns a raw text string.
         '''
-        # Remove the encoding and convert to characters, using a simple
-        #  loop to make the logic easy to read.
-        xor_value = 0xDB
-        decoded_bytes = []
-        for byte in binary:
-            # Apply the xor and convert to a character.
-            char = chr(byte ^ xor_value)
-            # Store it.
-            decoded_bytes.append(char)
-            # Advance the xor_value, keeping to the byte range.
-            xor_value = (xor_value + 1) % 256
-        return ''.join(decoded_bytes)
+        return Xor_Codec.Decode_Cat(binary)
+
+        
+    def Open(s):
+        '''
+        Open the dat file and memory map it, to be kept open across
+        reads. Does nothing if already open.
+        '''
+        if s.dat_file != None:
+            return
+        s.dat_file = open(s.dat_path, 'rb')
+        # Empty dat files cannot be mapped; reads from these will only
+        #  be for empty entries anyway.
+        if os.fstat(s.dat_file.fileno()).st_size > 0:
+            s.dat_mmap = mmap.mmap(
+                s.dat_file.fileno(), 0, access = mmap.ACCESS_READ)
+        return
+
+
+    def Close(s):
+        '''
+        Close any open dat file and memory map. Reads after this will
+        reopen them as needed.
+        '''
+        if s.dat_mmap != None:
+            try:
+                s.dat_mmap.close()
+            except BufferError:
+                # Some caller is still holding a memoryview from Read_Raw;
+                #  the map will be freed once that view is released.
+                if Settings.developer:
+                    print('Warning: dat file {} still has memoryviews open'
+                          ' when closing.'.format(s.dat_path))
+            s.dat_mmap = None
+        if s.dat_file != None:
+            s.dat_file.close()
+            s.dat_file = None
+        return
+
+
+    def Read_Raw(s, cat_path, error_if_not_found = False):
+        '''
+        Read the raw (still xor encoded) data for an entry in the dat file.
+        When memory mapping is enabled in the Settings, this returns a
+        memoryview into the mapped dat file, without copying; callers
+        should release it (eg. using a 'with' block) when done.
+        Otherwise, this returns a bytes object.
+        Arguments match those of Read.
+        '''
+        # Check for the file being missing.
+        if cat_path not in s.file_size_dict:
+            if error_if_not_found:
+                raise Exception('File {} not found in cat {}'.format(
+                    cat_path, s.cat_path
+                    ))
+            return None
+
+        offset = s.file_offset_dict[cat_path]
+        size = s.file_size_dict[cat_path]
+
+        if Settings.memory_map_catalogs:
+            # Keep the dat file mapped across calls, to avoid an open
+            #  and seek on every read.
+            s.Open()
+            # Empty files have no map, but can only hold empty entries.
+            if s.dat_mmap == None:
+                return memoryview(b'')
+            with memoryview(s.dat_mmap) as view:
+                return view[offset : offset + size]
+
+        # Otherwise, open the dat file on every call and close it
+        #  afterwards.
+        with open(s.dat_path, 'rb') as file:
+            # Move to the file start location.
+            file.seek(offset)
+            # Grab the byte range.
+            return file.read(size)
 
         
     def Read(s, cat_path, error_if_not_found = False):
         '''
         Read an entry in the corresponding dat file, based on the
         provided file name (including internal path).
+        Returns a bytearray with the decoded data, or None if the
+        file was not found.
 
         * cat_path
           - String, path of the file to look up in cat format, which
@@ -129,41 +232,18 @@ class Cat_Reader:
           - Bool, if True and the name is not recorded in this cat, then
             an exception will be thrown, otherwise returns None.
         '''
-        # Check for the file being missing.
-        if cat_path not in s.file_size_dict:
-            if error_if_not_found:
-                raise Exception('File {} not found in cat {}'.format(
-                    virtual_path, s.cat_name
-                    ))
+        data = s.Read_Raw(cat_path, error_if_not_found)
+        if data == None:
             return None
 
-        # For now, open the dat file on every call and close it
-        #  afterwards.  Could also consider leaving this open
-        #  across calls, if many reads are expected, for a speedup.
-        with open(s.dat_path, 'rb') as file:
-            # Move to the file start location.
-            file.seek(s.file_offset_dict[cat_path])
-            # Grab the byte range.
-            data = file.read(s.file_size_dict[cat_path])
-
         # The data was encoded by xoring with 0x33, so apply this operation
         #  to every byte to decode.
-        # Note: this method seems somewhat slow to run.
-        # Use bytearray for this, since it can be useful elsewhere for
+        # This returns a bytearray, since it can be useful elsewhere for
         #  mutability (mainly obj code).
-        data = bytearray(x ^ 0x33 for x in data)
-
-        # Numpy might be faster, but want to avoid non-standard packages.
-        # Alternative: bytes objects are immutable like strings, so the
-        #  constructor above might be running into issues making excessive
-        #  copies; a bytearray might work better.
-        #data = bytearray(data)
-        #for index, byte in enumerate(data):
-        #    data[index] = byte ^ 0x33
-        # Result: this only seems maybe 10-20% faster, if that; it might
-        #  be fine when not using a debugger.
-        # Keep the simple code version for now; complexity is not worth
-        #  such a small gain.
-
-        return data
+        # This is also where any memoryview gets copied out of the
+        #  mapped dat, so it can be released right after.
+        if isinstance(data, memoryview):
+            with data:
+                return Xor_Codec.Xor_Dat(data)
+        return Xor_Codec.Xor_Dat(data)
 
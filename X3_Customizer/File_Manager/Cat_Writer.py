@@ -2,12 +2,14 @@
 Support for packing files to a cat/dat pair.
 See Cat_Reader for details on catalog files.
 
-TODO: compression.
-Extensions to use:
+Files with a packed version are gzipped as they go into the catalog,
+using the packed extension:
  xml,txt -> pck
  bob -> pbb
  bod -> pbd
-All appear to use gzip, according to some google searching.
+Compression runs in a thread pool at a configurable gzip level (see
+Settings.compression_level and compression_thread_count), with the
+results streamed to the dat file in order.
 
 '''
 from ..Common.Settings import Settings
@@ -15,13 +17,18 @@ import os
 from pathlib import Path
 from .File_Paths import *
 from . import File_Types
+from . import Xor_Codec
 import gzip
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
 
 
 class Cat_Writer:
     '''
     Support class for collecting modified files into a single catalog.
-    Initial functionality will not gzip the files.
+    Files with a packed version are gzipped in a thread pool, and
+    unchanged files from a prior run reuse their packed data.
 
     Attributes:
     * cat_path
@@ -31,12 +38,52 @@ class Cat_Writer:
       - Set automatically to match the cat_path index.
     * game_files
       - List of Game_File objects to be written.
+    * compression_level
+      - Int, gzip compression level (0-9) to use for packed files.
+      - Defaults to the Settings value.
+    * thread_count
+      - Int or None, number of threads to use for compression; if None,
+        a default based on cpu count is used.
+      - Defaults to the Settings value.
+    * prior_manifest
+      - Optional dict, manifest of the existing catalog at cat_path as
+        written on a prior run (see Logs.Log.catalog_manifest_dict).
+      - Files whose content hash matches the manifest will have their
+        packed data copied from the existing dat instead of being
+        recompressed, and if no files changed, the existing cat/dat
+        are left in place.
+    * manifest
+      - Dict, manifest for the catalog, filled in by Write.
+    * kept_prior
+      - Bool, set by Write; True if the existing catalog matched and
+        was kept instead of being rewritten.
+    * cat_hash
+    * dat_hash
+      - Strings, sha256 hashes of the cat and dat file contents, set
+        by Write, computed while writing.
     '''
-    def __init__(self, cat_path):
+    def __init__(
+            self,
+            cat_path,
+            compression_level = None,
+            thread_count = None,
+            prior_manifest = None,
+        ):
         # Ensure this is a Path.
         self.cat_path = Path(cat_path)
         self.dat_path = self.cat_path.with_suffix('.dat')
         self.game_files = []
+        if compression_level == None:
+            compression_level = Settings.compression_level
+        self.compression_level = compression_level
+        if thread_count == None:
+            thread_count = Settings.compression_thread_count
+        self.thread_count = thread_count
+        self.prior_manifest = prior_manifest
+        self.manifest = {}
+        self.kept_prior = False
+        self.cat_hash = None
+        self.dat_hash = None
 
         return
 
@@ -52,60 +99,162 @@ class Cat_Writer:
     def Write(self):
         '''
         Write the contents to a cat/dat file pair.
-        Any existing files will be overwritten.
+        Any existing files will be overwritten, except when a prior
+        manifest was given and nothing changed.
+
+        Packed files are compressed in a thread pool, and each payload
+        is encoded and streamed to the dat file in order as it becomes
+        ready, so only a few payloads are held in memory at a time.
+        Both files are written to temporary paths first and then renamed
+        into place, dat before cat, so that a failed write never leaves
+        a partial catalog behind.
         '''
         # Cat contents will be kept as a list of strings.
-        # Dat contents will be running binary.
-        # First pass gets raw (maybe zipped) binary; second pass will encode.
         cat_lines = []
-        dat_binary = bytearray()
 
         # The first cat line is the name of the dat file, no path.
         cat_lines.append(self.dat_path.name)
 
-        # Collect info from the files.
-        # Note: this may generate nothing if no game files were added,
-        #  eg. when making dummy catalogs.
-        for game_file in self.game_files:
+        # Temp paths, in the same folder so the rename stays on
+        #  the same drive.
+        dat_temp_path = self.dat_path.with_name(self.dat_path.name + '.tmp')
+        cat_temp_path = self.cat_path.with_name(self.cat_path.name + '.tmp')
+
+        # Payloads can only be reused if the prior files are present.
+        prior_manifest = self.prior_manifest
+        if not (self.cat_path.exists() and self.dat_path.exists()):
+            prior_manifest = None
+        prior_dat_file = None
+        self.manifest = {}
+        self.kept_prior = False
+        dat_hash = hashlib.sha256()
+
+        try:
+            if prior_manifest:
+                prior_dat_file = open(self.dat_path, 'rb')
+
+            # Compression is the slow part, and zlib releases the GIL,
+            #  so it is spread across a thread pool. Results are taken
+            #  back in submission order, so the output is deterministic.
+            # To keep memory bounded, only a limited number of files
+            #  are kept in flight ahead of the one being written.
+            thread_count = self.thread_count or os.cpu_count() or 1
+            with ThreadPoolExecutor(max_workers = thread_count) as executor,\
+                 open(dat_temp_path, 'wb') as dat_file:
+                max_pending = thread_count * 2
+                pending = deque()
+
+                def Write_Next():
+                    '''
+                    Wait on the oldest pending file, and write it out.
+                    '''
+                    cat_path, content_hash, this_binary, encoded = pending.popleft()
+                    # Wait on the compression if needed.
+                    if isinstance(this_binary, Future):
+                        this_binary = this_binary.result()
+
+                    # Encode (if not reused) and write out this file's data.
+                    self.manifest[cat_path] = [
+                        content_hash, dat_file.tell(), len(this_binary)]
+                    if not encoded:
+                        this_binary = self.Encode_Dat(this_binary)
+                    dat_file.write(this_binary)
+                    dat_hash.update(this_binary)
+
+                    # Add the virtual path and the byte size of the file
+                    #  to the cat.
+                    cat_lines.append(cat_path +' '+ str(len(this_binary)))
+
+                # Collect info from the files.
+                # Note: this may generate nothing if no game files were
+                #  added, eg. when making dummy catalogs.
+                for game_file in self.game_files:
+
+                    # Get the binary data; any text should be utf-8.
+                    # This is done on the main thread, since it may
+                    #  touch shared transform state.
+                    this_binary = game_file.Get_Binary()
+                    content_hash = hashlib.sha256(this_binary).hexdigest()
+
+                    # Get the cat path for the file.
+                    cat_path = Virtual_Path_to_Cat_Path(game_file.virtual_path)
+
+                    # Get any possible compressed version of this path.
+                    # This is None if packing not supported.
+                    cat_path_pck = Unpacked_Path_to_Packed_Path(cat_path)
+                    if cat_path_pck:
+                        # Use the pck name in the catalog.
+                        cat_path = cat_path_pck
+
+                    # If the prior run wrote the same content, copy its
+                    #  already packed and encoded data.
+                    prior_entry = None
+                    if prior_manifest:
+                        prior_entry = prior_manifest.get(cat_path)
+                    if prior_entry != None and prior_entry[0] == content_hash:
+                        _, offset, size = prior_entry
+                        prior_dat_file.seek(offset)
+                        pending.append((cat_path, content_hash,
+                                        prior_dat_file.read(size), True))
+
+                    # If packing, gzip the binary in the pool.
+                    elif cat_path_pck:
+                        pending.append((cat_path, content_hash,
+                            executor.submit(gzip.compress, this_binary,
+                                            self.compression_level),
+                            False))
+                    else:
+                        pending.append((cat_path, content_hash,
+                                        this_binary, False))
+
+                    if len(pending) >= max_pending:
+                        Write_Next()
 
-            # Get the binary data; any text should be utf-8.
-            this_binary = game_file.Get_Binary()
+                # Finish off any remaining files.
+                while pending:
+                    Write_Next()
 
-            # Get the cat path for the file.
-            cat_path = Virtual_Path_to_Cat_Path(game_file.virtual_path)
+            if prior_dat_file != None:
+                prior_dat_file.close()
+                prior_dat_file = None
 
-            # Get any possible compressed version of this path.
-            # This is None if packing not supported.
-            cat_path_pck = Unpacked_Path_to_Packed_Path(cat_path)
+            # The cat needs to end in a newline.
+            cat_lines.append('')
 
-            # If packing, gzip the binary.
-            if cat_path_pck:
-                this_binary = gzip.compress(this_binary)
-                # Use the pck name in the catalog.
-                cat_path = cat_path_pck
-                
-            # Append to the existing dat binary.
-            dat_binary += this_binary
+            # Convert the cat to utf-8 binary, and encode it.
+            cat_str = '\n'.join(cat_lines)
+            cat_binary = bytes(cat_str, encoding = 'utf-8')
+            cat_binary = self.Encode_Cat(cat_binary)
 
-            # Add the virtual path and the byte size of the file to the cat.
-            cat_lines.append(cat_path +' '+ str(len(this_binary)))
+            self.cat_hash = hashlib.sha256(cat_binary).hexdigest()
+            self.dat_hash = dat_hash.hexdigest()
 
-        # The cat needs to end in a newline.
-        cat_lines.append('')
+            # If everything matched the prior catalog, including order,
+            #  then the existing files are already correct.
+            # Note: json loading gives lists, same as the manifest.
+            if (prior_manifest
+            and list(self.manifest.items()) == list(prior_manifest.items())):
+                dat_temp_path.unlink()
+                self.kept_prior = True
+                return
 
-        # Convert the cat to utf-8 binary.
-        cat_str = '\n'.join(cat_lines)
-        cat_binary = bytes(cat_str, encoding = 'utf-8')
+            with open(cat_temp_path, 'wb') as file:
+                file.write(cat_binary)
 
-        # Do the Xor encoding passes.
-        cat_binary = self.Encode_Cat(cat_binary)
-        dat_binary = self.Encode_Dat(dat_binary)
+            # Move the finished files into place; the cat goes last,
+            #  since it is what the game (and Cat_Reader) looks for.
+            os.replace(dat_temp_path, self.dat_path)
+            os.replace(cat_temp_path, self.cat_path)
 
-        # Write the data out.
-        with open(self.cat_path, 'wb') as file:
-            file.write(cat_binary)
-        with open(self.dat_path, 'wb') as file:
-            file.write(dat_binary)
+        except Exception:
+            # Clean up any temp files left over, then pass the
+            #  error along.
+            if prior_dat_file != None:
+                prior_dat_file.close()
+            for path in [dat_temp_path, cat_temp_path]:
+                if path.exists():
+                    path.unlink()
+            raise
 
         return
 
@@ -115,14 +264,7 @@ class Cat_Writer:
         '''
         Encode the cat binary using a running Xor.
         '''
-        xor_value = 0xDB
-        encoded_bytes = bytearray()
-        for byte in binary:
-            # Apply the xor and store it.
-            encoded_bytes.append(byte ^ xor_value)
-            # Advance the xor_value, keeping to the byte range.
-            xor_value = (xor_value + 1) % 256
-        return encoded_bytes
+        return Xor_Codec.Encode_Cat(binary)
     
 
     @staticmethod
@@ -130,9 +272,7 @@ class Cat_Writer:
         '''
         Encode the dat binary using an Xor.
         '''
-        encoded_bytes = bytearray()
-        encoded_bytes = bytearray(x ^ 0x33 for x in binary)
-        return encoded_bytes
+        return Xor_Codec.Xor_Dat(binary)
 
     #-Older, x2? style encoding used in loose pck files.
     #@staticmethod
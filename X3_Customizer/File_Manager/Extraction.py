@@ -0,0 +1,201 @@
+'''
+Support for extracting many files at once from the game sources.
+
+Files are selected by glob patterns against the virtual file system
+index, which covers the source folder, loose files (including originals
+renamed on a prior run) and catalogs, so each file comes from the same
+source Load_File would use. Files are then read in an order sorted by
+dat file and offset so that catalog reads are sequential. Decoding and
+decompression are spread over a thread pool, which helps since zlib
+releases the GIL.
+'''
+import os
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+
+from ..Common.Settings import Settings
+from .File_Paths import *
+from . import Xor_Codec
+from . import Misc
+Source_Reader = Misc.Source_Reader
+
+
+def _Get_Unpacked_Names(virtual_path):
+    '''
+    Returns a list of possible unpacked virtual paths for a virtual
+    path; packed paths may have multiple options (eg. pck may be
+    txt or xml), and unpacked paths return themselves.
+    '''
+    prefix, extension = virtual_path.rsplit('.',1)
+    if extension == 'pck':
+        return [prefix + '.txt', prefix + '.xml']
+    elif extension == 'pbd':
+        return [prefix + '.bod']
+    elif extension == 'pbb':
+        return [prefix + '.bob']
+    return [virtual_path]
+
+
+def _Pick_Pck_Name(virtual_path, binary):
+    '''
+    Select between txt and xml names for an unpacked pck file,
+    based on if the contents look like xml.
+    '''
+    # Xml starts with a tag, possibly after a byte order mark or
+    #  whitespace; t files start with comments or data.
+    prefix = virtual_path.rsplit('.',1)[0]
+    if binary.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'<'):
+        return prefix + '.xml'
+    return prefix + '.txt'
+
+
+class _Extract_Request:
+    '''
+    A single file to be extracted.
+
+    Attributes:
+    * vfs_entry
+      - VFS_Entry for the source of the file.
+    * names
+      - List of unpacked virtual paths which matched the patterns and
+        resolve to this entry.
+    * unpack
+      - Bool, if True the data needs gzip decompression.
+    * pick_name
+      - Bool, if True the unpacked name is ambiguous (eg. pck could be
+        txt or xml), and will be picked based on the file contents.
+      - If the picked name is not in names, the file is skipped.
+    '''
+    def __init__(s, vfs_entry, names, unpack, pick_name):
+        s.vfs_entry = vfs_entry
+        s.names = names
+        s.unpack = unpack
+        s.pick_name = pick_name
+
+
+def Extract_Files(
+        patterns,
+        output_folder = None,
+        thread_count = None,
+    ):
+    '''
+    Extract all files matching the given patterns from the highest
+    priority game sources, unpacking any packed files.
+
+    * patterns
+      - List of glob style strings matched against virtual paths,
+        eg. 'types/T*.txt' or 'maps/*'. Matching is case insensitive.
+      - Packed files match on their packed name or any unpacked name.
+    * output_folder
+      - Optional string, path to a folder to write files to, using the
+        virtual path folder structure.
+      - If None, the file contents are returned in memory instead.
+    * thread_count
+      - Optional int, number of threads to use for decompression.
+      - Defaults to the cpu count.
+
+    Returns a dict keyed by unpacked virtual path, holding either the
+    file binary (if output_folder is None) or the path written to.
+    '''
+    Misc.Init()
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    patterns = [x.lower() for x in patterns]
+
+    def Matches(name):
+        name = name.lower()
+        return any(fnmatch.fnmatchcase(name, x) for x in patterns)
+
+    # Pick out the requests, with each unpacked name being resolved
+    #  through the index to get the highest priority between packed
+    #  and unpacked versions.
+    # Loose files outside the usual game file folders are only indexed
+    #  when looked up, so index any in the catalog folders first, to
+    #  take precedence as they would with Load_File.
+    if Source_Reader.loose_indexed_folders != None:
+        Source_Reader.Index_Loose_Files(set(
+            x.split('/')[0].lower() for x in Source_Reader.vfs_index.entry_dict))
+
+    request_dict = {}
+    for virtual_path in Source_Reader.vfs_index.entry_dict:
+        unpacked_names = _Get_Unpacked_Names(virtual_path)
+        if Matches(virtual_path):
+            names = unpacked_names
+        else:
+            names = [x for x in unpacked_names if Matches(x)]
+        if not names:
+            continue
+
+        for name in names:
+            vfs_entry = Source_Reader.vfs_index.Find(name)
+            # Skip if some other source takes precedence over this one.
+            if vfs_entry == None or vfs_entry.virtual_path != virtual_path:
+                continue
+            # Share requests between names of the same entry.
+            if virtual_path not in request_dict:
+                request_dict[virtual_path] = _Extract_Request(
+                    vfs_entry, [],
+                    unpack = virtual_path != name,
+                    pick_name = len(unpacked_names) > 1)
+            request_dict[virtual_path].names.append(name)
+
+    # Sort so source folder and loose files come first, then cat
+    #  entries by dat file and offset, for sequential reads.
+    def Sort_Key(request):
+        vfs_entry = request.vfs_entry
+        if vfs_entry.source_type != 'cat':
+            return (0, vfs_entry.sys_path, 0)
+        return (1, vfs_entry.sys_path, vfs_entry.offset)
+    requests = sorted(request_dict.values(), key = Sort_Key)
+
+
+    def Unpack(request, binary):
+        '''
+        Decode and decompress a request binary, returning (name, binary),
+        or None if the file ended up not matching.
+        '''
+        if request.vfs_entry.source_type == 'cat':
+            with binary:
+                binary = Xor_Codec.Xor_Dat(binary)
+        if request.unpack and binary:
+            binary = Source_Reader.Decompress(
+                binary, request.vfs_entry.virtual_path)
+        if request.pick_name:
+            name = _Pick_Pck_Name(request.vfs_entry.virtual_path, binary)
+            if name not in request.names:
+                return None
+        else:
+            name = request.names[0]
+
+        # Write out the file if requested.
+        if output_folder != None:
+            path = os.path.join(output_folder, *name.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            with open(path, 'wb') as file:
+                file.write(binary)
+            return name, path
+        return name, bytes(binary)
+
+
+    # The reads are done in sorted order on this thread, with the
+    #  decoding handed off to the pool.
+    futures = []
+    with ThreadPoolExecutor(max_workers = thread_count) as executor:
+        for request in requests:
+            vfs_entry = request.vfs_entry
+            if vfs_entry.source_type == 'cat':
+                cat_reader = Source_Reader.catalog_file_dict[vfs_entry.sys_path]
+                binary = cat_reader.Read_Raw(vfs_entry.cat_path)
+                # Normalize to a memoryview, for the 'with' release.
+                binary = memoryview(binary)
+            else:
+                with open(vfs_entry.sys_path, 'rb') as file:
+                    binary = file.read()
+            futures.append(executor.submit(Unpack, request, binary))
+
+        results = dict(x for x in (future.result() for future in futures)
+                       if x != None)
+
+    if Settings.verbose:
+        print('Extracted {} files.'.format(len(results)))
+    return results
@@ -112,6 +112,7 @@ import re
 
 from .File_Paths import *
 from . import Misc
+from .Run_Cache import Run_Cache
 from .. import Common
 
 def Make_Patch(virtual_path, verify = False, reformat_xml = False):
@@ -237,6 +238,9 @@ def Apply_Patch(virtual_path, reformat_xml = False):
     with open(patch_path, 'r') as file:
         patch_file_text = file.read()
 
+    # Note the patch contents for the run cache.
+    Run_Cache.Record_Project_File_Load(patch_path)
+
     # Search out the source file.
     source_game_file = Misc.Load_File(virtual_path, return_game_file = True)
     source_file_text = source_game_file.Get_Text()
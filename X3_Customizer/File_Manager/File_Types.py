@@ -9,18 +9,53 @@ Note on newline encoding:
     However, newlines should be simple \n when file contents are written
     to a catalog, otherwise crashing and other broken behavior observed.
 
-    Get_Binary will return simple \n encoding, while Write_File will
-    be system dependent.
+    Get_Binary will return simple \n encoding, while Get_Loose_Binary
+    (used by Write_File) will be system dependent.
 '''
 import os
+import locale
 from .. import Common
 Settings = Common.Settings
 from collections import OrderedDict, defaultdict
+from collections.abc import MutableMapping
+import copy
+import bisect
+import operator
+from itertools import compress, count
+import math
 from . import File_Fields
 from .File_Paths import *
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
 
+# Conditional import of numpy, used to speed up bulk updates of T files.
+try:
+    import numpy
+    Numpy_available = True
+    # Rounding functions supported by array updates, and their numpy
+    #  equivalents.
+    _numpy_rounding_dict = {
+        round      : numpy.rint,
+        int        : numpy.trunc,
+        math.ceil  : numpy.ceil,
+        math.floor : numpy.floor,
+        }
+except ImportError:
+    Numpy_available = False
+    _numpy_rounding_dict = {}
+
+
+def _Encode_Loose_Text(text, encoding = None):
+    '''
+    Encode text the same way as a text mode file write would, converting
+    newlines to the system default and using the default encoding
+    if one is not given.
+    '''
+    if encoding == None:
+        encoding = locale.getpreferredencoding(False)
+    return text.replace('\n', os.linesep).encode(encoding)
+
+
 class Game_File:
     '''
     Base class to represent a source file.
@@ -46,7 +81,15 @@ class Game_File:
       - Bool, if True then this file should be treated as modified,
         to be written out.
       - Files only read should leave this flag False.
+
+    Subclasses which parse file contents may delay the parsing until
+    the contents are first used, by listing the attributes filled in
+    by their Parse method in _parsed_attributes and calling
+    Set_Unparsed_Binary from their init.
     '''
+    # Names of attributes which are filled in by Parse.
+    _parsed_attributes = ()
+
     def __init__(
             s,
             virtual_path,
@@ -59,6 +102,76 @@ class Game_File:
         # Default to treating as modified for files not matching any
         # subclass (which may default it to False).
         s.modified = True
+        # Defaults for files without delayed parsing.
+        s._parsed = True
+        s._unparsed_binary = None
+        s._binary_loader = None
+
+
+    def Set_Unparsed_Binary(s, file_binary = None, file_binary_loader = None):
+        '''
+        Record the original file binary, to be parsed on first use of
+        any parsed attribute.
+
+        * file_binary
+          - Bytes or bytearray with the file data.
+        * file_binary_loader
+          - Optional function taking no args and returning the file
+            binary, used if file_binary is None; eg. a decompression
+            of still packed data.
+        '''
+        assert file_binary != None or file_binary_loader != None
+        s._parsed = False
+        s._unparsed_binary = file_binary
+        s._binary_loader = file_binary_loader
+
+
+    def __getattr__(s, name):
+        '''
+        Fills in parsed attributes on first access, if parsing was
+        delayed. This is only called when normal lookup fails.
+        '''
+        # Go through __dict__ to avoid recursion here, eg. when copying.
+        if (name in type(s)._parsed_attributes
+        and s.__dict__.get('_parsed') == False):
+            s.Parse()
+            return getattr(s, name)
+        raise AttributeError("'{}' object has no attribute '{}'".format(
+            type(s).__name__, name))
+
+
+    def Parse(s):
+        '''
+        Parse the original file binary, if not done already.
+        Subclasses fill in their attributes from the binary given
+        by the base call.
+        Returns the binary to parse, or None if already parsed.
+        '''
+        if s._parsed:
+            return None
+        s._parsed = True
+        file_binary = s._unparsed_binary
+        if file_binary == None:
+            file_binary = s._binary_loader()
+        # Release the originals, since they are no longer needed.
+        s._unparsed_binary = None
+        s._binary_loader = None
+        return file_binary
+
+
+    def Get_Source_Binary(s):
+        '''
+        Returns the original file binary, as read from the source, if
+        parsing was delayed and has not happened yet; else returns None.
+        Any delayed loading (eg. unzipping) is done here, and the result
+        kept for the later Parse.
+        '''
+        if s._parsed:
+            return None
+        if s._unparsed_binary == None:
+            s._unparsed_binary = s._binary_loader()
+            s._binary_loader = None
+        return s._unparsed_binary
 
 
     def Get_Output_Path(s):
@@ -71,6 +184,17 @@ class Game_File:
         return Virtual_Path_to_Output_Path(s.virtual_path)
 
 
+    def Write_File(s, file_path):
+        '''
+        Write these contents to the target file_path.
+        Returns the binary that was written, eg. for hashing.
+        '''
+        binary = s.Get_Loose_Binary()
+        with open(file_path, 'wb') as file:
+            file.write(binary)
+        return binary
+
+
     def Is_Catalogable(s):
         '''
         Returns True if this file can be placed in a catalog.
@@ -100,10 +224,30 @@ class XML_File(Game_File):
       - List of strings, original header lines from the xml text,
         including the encoding declaration and the stylesheet
         declaration.
+
+    The above attributes are filled in from the file binary on
+    first use.
     '''
-    def __init__(s, file_binary, **kwargs):
+    _parsed_attributes = ('encoding', '_text', 'xml_header_lines')
+
+    def __init__(s, file_binary = None, file_binary_loader = None, **kwargs):
         super().__init__(**kwargs)
-        
+        s.Set_Unparsed_Binary(file_binary, file_binary_loader)
+
+        # Set as unmodified, and rely on transforms to call the appropriate
+        #  methods when doing updates (instead of modifying text).
+        s.modified = False
+        return
+
+
+    def Parse(s):
+        '''
+        Parse the file binary into text, if not done already.
+        '''
+        file_binary = super().Parse()
+        if file_binary == None:
+            return
+
         # Get the encoding to use, since xml files are sensitive to this.
         s.encoding = s.Find_Encoding(file_binary)
         # Translate to text with this encoding.
@@ -120,10 +264,6 @@ class XML_File(Game_File):
         #xml_tree = xml.etree.ElementTree.parse(file_path)
         #subdict[file_name] = xml_tree
 
-        # Set as unmodified, and rely on transforms to call the appropriate
-        #  methods when doing updates (instead of modifying text).
-        s.modified = False
-
         # Isolate the header lines, those with a "<?" prefix at the start
         #  of the file.
         s.xml_header_lines = []
@@ -285,55 +425,261 @@ class XML_File(Game_File):
         return binary
 
 
-    def Write_File(s, file_path):
+    def Get_Loose_Binary(s):
         '''
-        Write these contents to the target file_path.
+        Returns the binary to write to a loose file, using system
+        newlines.
         '''
-        # Open with the right encoding.
-        with open(file_path, 'w', encoding = s.encoding) as file:   
-            # Just write as raw text.
-            file.write(s._text)
-            # To be safe, add a newline at the end if there isn't
-            #  one, since some files require this (eg. bods) to
-            #  be read correctly.
-            if not s._text.endswith('\n'):
-                file.write('\n')
-    
+        text = s._text
+        # To be safe, add a newline at the end if there isn't
+        #  one, since some files require this (eg. bods) to
+        #  be read correctly.
+        if not text.endswith('\n'):
+            text += '\n'
+
         #-Removed; use text instead of xml.
         # Let the xml plugin pick the encoding to write out in.
         #xml_tree.write(file_path)        
-        return
+        # Use the right encoding.
+        return _Encode_Loose_Text(text, s.encoding)
+
+
+# Placeholder for fields missing from a row, in column lists.
+_missing = object()
+
+
+# Field keys for T file data lines, keyed by T_file_name_field_dict_dict
+#  name and then by column count, holding a tuple of the keys of each
+#  column (or an empty tuple for header lines).
+# Lines with the same column count always get the same keys, so these
+#  are compiled once, on first use.
+_row_keys_cache = {}
+
+
+def _Compile_Row_Keys(field_dict_name, column_count):
+    '''
+    Returns a tuple of the field keys for a T file line with the given
+    column count, using the field names where known and the column index
+    otherwise, or an empty tuple if the line is a header.
+    '''
+    field_dict = File_Fields.T_file_name_field_dict_dict[field_dict_name]
+    if column_count < field_dict['min_data_entries']:
+        return ()
+
+    # Step through the fields, with an index counter.
+    keys = []
+    for index in range(column_count):
+        # If this index has a field name, use it, otherwise use 
+        #  the index for a key.
+        this_key = index
+        if index in field_dict:
+            this_key = field_dict[index]
+        # Also check negative indices.
+        negative_index = index - column_count
+        if negative_index in field_dict:
+            this_key = field_dict[negative_index]
+            # Error if both matched; something went wrong in that
+            #  case.
+            assert index not in field_dict
+        keys.append(this_key)
+    return tuple(keys)
+
+
+class T_Row(MutableMapping):
+    '''
+    View of one data line of a T_File, acting like the OrderedDict of
+    the line's labelled fields. Values are stored in the T_File columns,
+    and reads and writes go directly to them.
+
+    Copies (through the copy module) are detached OrderedDicts, suitable
+    for editing and passing to Add_Entries.
+
+    Numeric fields can also be accessed through Get_Int, Get_Float and
+    Set_Number, which parse each field once and keep the result for
+    later calls (see T_File).
+
+    Attributes:
+    * t_file
+      - The T_File holding this row.
+    * columns, row_texts, tracked_keys
+      - The matching T_File attributes, kept here for faster access.
+    * index
+      - Int, index of this row in the T_File data rows and columns.
+    '''
+    __slots__ = ('t_file', 'columns', 'row_texts', 'tracked_keys', 'index')
+
+    def __init__(s, t_file, index):
+        s.t_file = t_file
+        s.columns = t_file.columns
+        s.row_texts = t_file.row_texts
+        s.tracked_keys = t_file.tracked_keys
+        s.index = index
+
+    def __getitem__(s, key):
+        # Missing columns raise KeyError here.
+        value = s.columns[key][s.index]
+        if type(value) is str:
+            return value
+        if value is _missing:
+            raise KeyError(key)
+        # Numbers set through Set_Number are given back as text.
+        return str(value)
+
+    def get(s, key, default = None):
+        try:
+            return s[key]
+        except KeyError:
+            return default
+
+    def __contains__(s, key):
+        column = s.columns.get(key)
+        return column != None and column[s.index] is not _missing
+
+    def __setitem__(s, key, value):
+        # Text edits of a field the line already has, which is neither
+        #  parsed nor indexed, only need the text replaced; this is the
+        #  common case for transforms looping over lines.
+        if key not in s.tracked_keys and type(value) is str:
+            index = s.index
+            column = s.columns.get(key)
+            if column is not None and column[index] is not _missing:
+                column[index] = value
+                s.row_texts[index] = None
+                return
+        s.t_file._Set_Value(key, s.index, value)
+
+    def __delitem__(s, key):
+        # Error if not present.
+        s[key]
+        s.t_file._Set_Value(key, s.index, _missing)
+
+    def __iter__(s):
+        return iter(s.t_file.row_keys[s.index])
+
+    def __len__(s):
+        return len(s.t_file.row_keys[s.index])
+
+    def __copy__(s):
+        return OrderedDict(s.items())
+
+    def __deepcopy__(s, memo):
+        return OrderedDict((x, copy.deepcopy(y, memo)) for x, y in s.items())
+
+    def __repr__(s):
+        return 'T_Row({})'.format(list(s.items()))
+
+    def Get_Int(s, key):
+        '''
+        Returns the value of a field as an int, parsing it on first use.
+        '''
+        return s.t_file._Get_Number(key, s.index, int)
+
+    def Get_Float(s, key):
+        '''
+        Returns the value of a field as a float, parsing it on first use.
+        '''
+        return s.t_file._Get_Number(key, s.index, float)
+
+    def Set_Number(s, key, value):
+        '''
+        Set a field to an int or float value. The value is converted to
+        text when the file is written out, or when read as a string.
+        '''
+        assert type(value) in (int, float)
+        s.t_file._Set_Number(key, s.index, value)
 
 
 # TODO: rename to something other than 'T', which gets confused with
 #  text files (in a t folder).
 class T_File(Game_File):
     '''
-    T file contents holder, as a list of OrderedDict objects.
+    T file contents holder, with lines acting as OrderedDict objects.
     Represents files found in the 'types' folder.
-    Class exists mainly to clarify naming for now, and for any
-    future attribute expansion.
+
+    Data lines are stored by column, with one list of strings per field,
+    and are accessed through T_Row views that act like the OrderedDict
+    of the line. Header lines are kept as plain OrderedDicts.
 
     Attributes:
     * text
       - Raw text for this file.
     * line_dict_list
-      - List of OrderedDict objects, each holding the labelled 
+      - List of OrderedDict-like objects, each holding the labelled 
         contents of a line.
       - This includes all lines, with headers.
     * data_dict_list
       - As above, but only holding lines that have data, skipping 
         headers. This is used for transform editing.
+      - These are T_Row objects.
+    * columns
+      - Dict, keyed by field name (or index for unnamed fields), holding
+        a list of the field's string values for each data line, in order.
+      - Lines without the field hold a placeholder.
+      - Fields set through Set_Number hold the number until written out.
+    * row_keys
+      - List of tuples, the ordered field keys of each data line.
+      - Lines with the same fields share the same tuple.
+    * parsed_columns
+      - Dict, keyed by tuple of (field key, int or float), holding a list
+        of the field's parsed values for each data line, or None where
+        not parsed yet.
+      - Filled in by the typed accessors (Get_Int, Get_Float,
+        Get_Number_Column), and cleared for any field that is set.
+    * number_keys
+      - Set of field keys whose columns may hold numbers instead of
+        text, to be converted at writeout.
+    * indexes
+      - Dict, keyed by field key, holding dicts which match each text
+        value of the field to a list of the indices of the data lines
+        holding it, in order.
+      - Built on first lookup of a field in indexed_fields, and kept up
+        to date as lines are edited or added.
+    * row_texts
+      - List holding the original text of each data line, with its
+        newline, or None once the line has been modified or if it was
+        added. Unmodified lines are written out from this text.
+    * tracked_keys
+      - Set of field keys which have had parsed values or an index, so
+        that setting them needs to keep those up to date. T_Row views
+        set text of other fields directly.
+
+    The above attributes are filled in from the file binary on
+    first use.
     '''
-    def __init__(s, file_binary, **kwargs):
+    _parsed_attributes = ('text', 'line_dict_list', 'data_dict_list',
+                          'columns', 'row_keys', 'parsed_columns',
+                          'number_keys', 'indexes', 'row_texts',
+                          'tracked_keys')
+
+    # Fields which Find and Find_All will look up through an index.
+    # Other fields are searched line by line.
+    indexed_fields = ('name', 'subtype', 'race')
+
+    def __init__(s, file_binary = None, file_binary_loader = None, **kwargs):
         super().__init__(**kwargs)
-        s.text = None
+        assert s.virtual_path.startswith('types/')
+        s.Set_Unparsed_Binary(file_binary, file_binary_loader)
+        return
+
+
+    def Parse(s):
+        '''
+        Parse the file binary into header line dicts and data columns,
+        if not done already.
+        '''
+        file_binary = super().Parse()
+        if file_binary == None:
+            return
         s.line_dict_list = []
         s.data_dict_list = []
-        assert s.virtual_path.startswith('types/')
+        s.columns = {}
+        s.row_keys = []
+        s.parsed_columns = {}
+        s.number_keys = set()
+        s.indexes = {}
+        s.row_texts = []
+        s.tracked_keys = set()
                 
-        # Field ordering could be done with named tuples, but in practice
-        #  it is  probably easiest to just use ordered dicts.
         # Indices without names will be keyed by the index integer.
 
         # Get the file text. Treat as default utf-8.
@@ -348,6 +694,9 @@ class T_File(Game_File):
         # Since lines end in semicolons, the last entry will generally 
         #  be a simple new line.
         data_list_list = []
+        # The line text is kept, to be reused for data lines that
+        #  do not get modified.
+        line_list = []
         # Keep line endings when splitting (True arg to splitlines).
         for line in s.text.splitlines(True):
             # Comment lines (//) are ignored.
@@ -355,17 +704,25 @@ class T_File(Game_File):
                 continue
             # Split the entries.
             data_list_list.append(line.split(';'))
+            line_list.append(line)
             
 
         # Lookup the fields for this file name.
-        field_dict = File_Fields.T_file_name_field_dict_dict[s.name]
+        field_dict_name = s.name
+        alt_fields_cols_names = File_Fields.T_file_name_field_dict_dict[
+            field_dict_name].get('alt_fields_cols_names')
+        # Field keys of each line, by column count, filled in as new
+        #  counts are seen.
+        row_keys_dict = _row_keys_cache.setdefault(field_dict_name, {})
+
+        # Data lines, as pairs of (key tuple, value list), to be
+        #  put into columns at the end.
+        data_keys_values_list = []
 
         # Loop over the lines, aiming to annotate the entries with field
         #  names.
-        for data_list in data_list_list:
-
-            # Create an ordered dict for this line to hold the fields.
-            this_dict = OrderedDict()
+        for data_list, line in zip(data_list_list, line_list):
+            column_count = len(data_list)
 
             # Note: for the jobs file, the line could be in tc, ap, or fl
             #  format, distinguished by column count.
@@ -376,49 +733,802 @@ class T_File(Game_File):
             #  case, with no extra lines.
             # (This is inside the loop, so it gets triggered on the first
             #  data line which has a length matching an AP file).
-            entries = len(data_list)
-            if ('alt_fields_cols_names' in field_dict
-            and len(data_list) in field_dict['alt_fields_cols_names']):
+            if (alt_fields_cols_names != None
+            and column_count in alt_fields_cols_names):
                 # Switch to the ap/fl field dict.
                 # This will only swap once; afterward there is no
                 #  'alt_fields_cols_names' field in field_dict, and these 
                 #  checks are skipped.
-                field_dict = File_Fields.T_file_name_field_dict_dict[
-                    field_dict['alt_fields_cols_names'][len(data_list)]]
-                        
-
-            # Step through the fields, with an index counter.
-            for index, field_string in enumerate(data_list):
-
-                # If this index has a field name, use it, otherwise use 
-                #  the index for a key.
-                this_key = index
-                # Only do the named key check when the line is considered
-                #  a data line; don't do this for headers/comments.
-                if len(data_list) >= field_dict['min_data_entries']:
-                    if index in field_dict:
-                        this_key = field_dict[index]
-                    # Also check negative indices.
-                    negative_index = index - len(data_list)
-                    if negative_index in field_dict:
-                        this_key = field_dict[negative_index]
-                        # Error if both matched; something went wrong in that
-                        #  case.
-                        assert index not in field_dict
-
-                # Record in the ordered dict.
-                # Values will not be converted to ints, since some might 
-                #  need to stay strings.
-                # Int conversion should happen upon use elsewhere.
-                this_dict[this_key] = field_string
-                                
-
-            # Add this line dict to the list that tracks all lines.
-            s.line_dict_list.append(this_dict)
-            # Conditionally add this line dict to the data tracking list,
-            #  skipping if the line is too short.
-            if len(this_dict) >= field_dict['min_data_entries']:
-                s.data_dict_list.append(this_dict)
+                field_dict_name = alt_fields_cols_names[column_count]
+                alt_fields_cols_names = File_Fields.T_file_name_field_dict_dict[
+                    field_dict_name].get('alt_fields_cols_names')
+                row_keys_dict = _row_keys_cache.setdefault(field_dict_name, {})
+
+            keys = row_keys_dict.get(column_count)
+            if keys == None:
+                keys = row_keys_dict[column_count] = _Compile_Row_Keys(
+                    field_dict_name, column_count)
+
+            # Header lines are kept as ordered dicts keyed by index.
+            if not keys:
+                s.line_dict_list.append(OrderedDict(enumerate(data_list)))
+                continue
+
+            # Values will not be converted to ints, since some might 
+            #  need to stay strings.
+            # Int conversion should happen upon use elsewhere.
+            data_keys_values_list.append((keys, data_list))
+
+            # Add a view for this line, to the lists of all lines and
+            #  of data lines.
+            this_row = T_Row(s, len(s.data_dict_list))
+            s.line_dict_list.append(this_row)
+            s.data_dict_list.append(this_row)
+            s.row_texts.append(line)
+
+        s._Fill_Columns(data_keys_values_list)
+        return
+
+
+    def _Fill_Columns(s, data_keys_values_list):
+        '''
+        Fill in the columns and row_keys from a list of (key tuple,
+        value list) pairs, one per data line.
+        '''
+        s.row_keys = [keys for keys, _ in data_keys_values_list]
+        row_count = len(data_keys_values_list)
+
+        # Normally all lines share the same keys, and the values can be
+        #  transposed directly into columns.
+        # The columns dict is filled in place, since the row views
+        #  already refer to it.
+        s.columns.clear()
+        if len(set(s.row_keys)) == 1:
+            s.columns.update(zip(s.row_keys[0], map(list, zip(
+                *[values for _, values in data_keys_values_list]))))
+            return
+
+        # Otherwise fill in the columns cell by cell.
+        for index, (keys, values) in enumerate(data_keys_values_list):
+            for key, value in zip(keys, values):
+                column = s.columns.get(key)
+                if column == None:
+                    column = s.columns[key] = [_missing] * row_count
+                column[index] = value
+        return
+
+
+    def _Add_Column(s, key):
+        '''
+        Add an empty column for the given key, returning it.
+        '''
+        column = s.columns[key] = [_missing] * len(s.row_keys)
+        return column
+
+
+    def _Append_Row(s, keys, values):
+        '''
+        Add a new data line at the end of the columns, returning its
+        T_Row view. The view is not added to the line lists.
+        '''
+        for column in s.columns.values():
+            column.append(_missing)
+        for parsed_column in s.parsed_columns.values():
+            parsed_column.append(None)
+        s.row_keys.append(tuple(keys))
+        s.row_texts.append(None)
+        index = len(s.row_keys) - 1
+        for key, value in zip(keys, values):
+            column = s.columns.get(key)
+            if column == None:
+                column = s._Add_Column(key)
+            column[-1] = value
+            s._Update_Index(key, index, _missing, value)
+        return T_Row(s, index)
+
+
+    def _Set_Value(s, key, index, value):
+        '''
+        Set the value of a field on a data line, string or number, or
+        remove the field if given the missing placeholder.
+        '''
+        column = s.columns.get(key)
+        if column == None:
+            column = s._Add_Column(key)
+        if value is _missing:
+            s.row_keys[index] = tuple(
+                x for x in s.row_keys[index] if x != key)
+        elif column[index] is _missing:
+            # New fields go on the end, as with an OrderedDict.
+            s.row_keys[index] = s.row_keys[index] + (key,)
+        s._Update_Index(key, index, column[index], value)
+        column[index] = value
+        s.row_texts[index] = None
+
+        # Clear any parsed values, keeping a set number.
+        for number_type in (int, float):
+            parsed_column = s.parsed_columns.get((key, number_type))
+            if parsed_column != None:
+                parsed_column[index] = None
+        if type(value) in (int, float):
+            s.number_keys.add(key)
+            s._Get_Parsed_Column(key, type(value))[index] = value
+        return
+
+
+    def _Set_Number(s, key, index, value):
+        '''
+        Set the value of a field on a data line to a number, keeping it
+        as the parsed value for its type.
+        '''
+        column = s.columns.get(key)
+        # Fall back on the general case for new fields.
+        if column == None or column[index] is _missing:
+            s._Set_Value(key, index, value)
+            return
+        s._Update_Index(key, index, column[index], value)
+        column[index] = value
+        s.row_texts[index] = None
+        number_type = type(value)
+        other_column = s.parsed_columns.get(
+            (key, float if number_type is int else int))
+        if other_column != None:
+            other_column[index] = None
+        parsed_column = s.parsed_columns.get((key, number_type))
+        if parsed_column == None:
+            parsed_column = s._Get_Parsed_Column(key, number_type)
+        parsed_column[index] = value
+        s.number_keys.add(key)
+        return
+
+
+    def _Get_Index(s, key):
+        '''
+        Returns the index dict for a field, building it if needed.
+        '''
+        index_dict = s.indexes.get(key)
+        if index_dict == None:
+            index_dict = s.indexes[key] = {}
+            s.tracked_keys.add(key)
+            for index, value in enumerate(s.columns.get(key, ())):
+                if value is _missing:
+                    continue
+                if type(value) is not str:
+                    value = str(value)
+                index_dict.setdefault(value, []).append(index)
+        return index_dict
+
+
+    def _Update_Index(s, key, index, old_value, new_value):
+        '''
+        Update any index on a field for a data line changing from the
+        old value to the new value, either of which may be the missing
+        placeholder.
+        '''
+        index_dict = s.indexes.get(key)
+        if index_dict == None:
+            return
+        if old_value is not _missing:
+            old_value = str(old_value)
+            index_list = index_dict[old_value]
+            index_list.remove(index)
+            if not index_list:
+                del index_dict[old_value]
+        if new_value is not _missing:
+            # Keep the line indices in order.
+            bisect.insort(index_dict.setdefault(str(new_value), []), index)
+        return
+
+
+    def _Get_Parsed_Column(s, key, number_type):
+        '''
+        Returns the list of parsed values of a field for the given
+        number type, creating it if needed.
+        '''
+        parsed_column = s.parsed_columns.get((key, number_type))
+        if parsed_column == None:
+            parsed_column = s.parsed_columns[(key, number_type)] = (
+                [None] * len(s.row_keys))
+            s.tracked_keys.add(key)
+        return parsed_column
+
+
+    @staticmethod
+    def _Parse_Number(value, number_type):
+        '''
+        Parse a column value as the given number type. Errors are the
+        same as when parsing the field text.
+        '''
+        if type(value) is not str:
+            if type(value) is number_type:
+                return value
+            value = str(value)
+        return number_type(value)
+
+
+    def _Get_Number(s, key, index, number_type):
+        '''
+        Returns the value of a field on a data line as an int or float,
+        parsing it if needed. Raises KeyError if the line does not have
+        the field.
+        '''
+        parsed_column = s.parsed_columns.get((key, number_type))
+        if parsed_column == None:
+            parsed_column = s._Get_Parsed_Column(key, number_type)
+        value = parsed_column[index]
+        if value is None:
+            column = s.columns.get(key)
+            if column == None or column[index] is _missing:
+                raise KeyError(key)
+            value = parsed_column[index] = s._Parse_Number(
+                column[index], number_type)
+        return value
+
+
+    def Get_Column(s, key):
+        '''
+        Returns a list of the values of a field for all data lines,
+        with None for lines without the field. The list is a copy.
+        '''
+        column = s.columns.get(key)
+        if column == None:
+            return [None] * len(s.row_keys)
+        if key in s.number_keys:
+            return [x if type(x) is str
+                    else None if x is _missing else str(x)
+                    for x in column]
+        if _missing not in column:
+            return list(column)
+        return [None if x is _missing else x for x in column]
+
+
+    def Set_Column(s, key, values):
+        '''
+        Set the values of a field for all data lines, from a list
+        as returned by Get_Column. Lines without the field should
+        have a None value.
+        '''
+        assert len(values) == len(s.row_keys)
+        column = s.columns.get(key)
+        if column == None:
+            column = s._Add_Column(key)
+        # Normally every line has the field, and the values can be
+        #  swapped in directly.
+        if None not in values and _missing not in column:
+            s._Mark_Changed_Rows(column, values)
+            column[:] = values
+            # Parsed values and any index are no longer valid.
+            for number_type in (int, float):
+                s.parsed_columns.pop((key, number_type), None)
+            s.indexes.pop(key, None)
+            return
+        for index, value in enumerate(values):
+            if value == None:
+                assert column[index] is _missing
+            else:
+                s._Set_Value(key, index, value)
+        return
+
+
+    def _Mark_Changed_Rows(s, column, values):
+        '''
+        Mark data lines as modified where the new values of a column
+        differ from the old ones.
+        '''
+        row_texts = s.row_texts
+        changed_indices = list(compress(count(), map(operator.ne, column, values)))
+        if len(changed_indices) == len(row_texts):
+            row_texts[:] = [None] * len(row_texts)
+        else:
+            for index in changed_indices:
+                row_texts[index] = None
+        return
+
+
+    def Get_Number_Column(s, key, number_type = int):
+        '''
+        Returns a list of the values of a field for all data lines,
+        parsed as the number_type (int or float), with None for lines
+        without the field. Values are parsed once and kept for later
+        calls. The list is a copy.
+        '''
+        parsed_column = s._Get_Parsed_Column(key, number_type)
+        if None in parsed_column:
+            column = s.columns.get(key)
+            if column == None:
+                return [None] * len(s.row_keys)
+            # Normally the field is unparsed text on every line, and can
+            #  be converted all at once.
+            if (key not in s.number_keys and _missing not in column
+            and parsed_column.count(None) == len(parsed_column)):
+                parsed_column[:] = map(number_type, column)
+                return list(parsed_column)
+            parsed_column[:] = [
+                y if y != None
+                else None if x is _missing
+                else s._Parse_Number(x, number_type)
+                for x, y in zip(column, parsed_column)]
+        return list(parsed_column)
+
+
+    def Set_Number_Column(s, key, values):
+        '''
+        Set the values of a field for all data lines to numbers, from a
+        list as returned by Get_Number_Column. Lines without the field
+        should have a None value. The numbers are converted to text
+        when written out.
+        '''
+        assert len(values) == len(s.row_keys)
+        column = s.columns.get(key)
+        if (column == None or _missing in column or None in values
+        or len(set(type(x) for x in values)) != 1):
+            # Go through the values one at a time.
+            for index, value in enumerate(values):
+                if value == None:
+                    assert column == None or column[index] is _missing
+                else:
+                    s._Set_Value(key, index, value)
+            return
+
+        # Normally every line has the field, and all values share a type.
+        number_type = type(values[0])
+        assert number_type in (int, float)
+        s._Mark_Changed_Rows(column, values)
+        column[:] = values
+        for this_type in (int, float):
+            s.parsed_columns.pop((key, this_type), None)
+        s.parsed_columns[(key, number_type)] = list(values)
+        s.tracked_keys.add(key)
+        s.number_keys.add(key)
+        s.indexes.pop(key, None)
+        return
+
+
+    def _Get_Line_Indices(s, key, value):
+        '''
+        Returns a list of the indices of data lines with the given field
+        value, in order, using an index if the field is indexed.
+        '''
+        if key in s.indexed_fields:
+            return s._Get_Index(key).get(value, [])
+        return [index for index, x in enumerate(s.columns.get(key, ()))
+                if x is not _missing and str(x) == value]
+
+
+    def Get_Line_Factors(s, default, factors_dict, keys = ('subtype',)):
+        '''
+        Returns a list with a factor for each data line, for use with
+        Update_Fields. Lines are matched to factors_dict by their values
+        of the given keys, with earlier keys taking priority, and get
+        the default factor if there is no match.
+
+        * default
+          - Factor for lines without a match. May be None to skip them.
+        * factors_dict
+          - Dict keyed by field value, eg. a ship subtype or name,
+            holding the factor (or any other per-line value).
+        * keys
+          - Field keys whose values are matched against factors_dict.
+          - Defaults to just 'subtype'.
+        '''
+        factors = [default] * len(s.row_keys)
+        # Apply the lowest priority key first, so others overwrite it.
+        for key in reversed(keys):
+            for value, factor in factors_dict.items():
+                for index in s._Get_Line_Indices(key, value):
+                    factors[index] = factor
+        return factors
+
+
+    def Use_Numpy(s):
+        '''
+        Returns True if numpy is available and enabled in the Settings,
+        in which case Update_Fields works on whole columns as arrays
+        where it can.
+        '''
+        return Numpy_available and Settings.use_numpy_for_t_files
+
+
+    def Get_Number_Array(s, key, number_type = int):
+        '''
+        Returns a numpy array of the values of a field for all data
+        lines, parsed as the number_type (int or float), with 0 for
+        lines without the field. Requires numpy. The array is a copy;
+        changes can be put back with Set_Number_Column(array.tolist()).
+        '''
+        if not Numpy_available:
+            raise ImportError('numpy is needed for Get_Number_Array')
+        values = s.Get_Number_Column(key, number_type)
+        if None in values:
+            values = [0 if x == None else x for x in values]
+        return numpy.array(
+            values, dtype = numpy.int64 if number_type is int else numpy.float64)
+
+
+    def Get_Line_Mask(s, selector = None, flags = None):
+        '''
+        Returns a numpy bool array with an entry for each data line, True
+        for lines picked by the selector and flags, as used by
+        Update_Fields. Requires numpy.
+        '''
+        if not Numpy_available:
+            raise ImportError('numpy is needed for Get_Line_Mask')
+        mask = numpy.zeros(len(s.row_keys), dtype = bool)
+        mask[numpy.asarray(s._Select_Lines(selector, flags), dtype = int)] = True
+        return mask
+
+
+    def _Select_Lines(s, selector, flags = None):
+        '''
+        Returns a list of the indices of data lines picked by the
+        selector and flags, as used by Update_Fields.
+        '''
+        if selector == None:
+            selected = range(len(s.row_keys))
+        elif callable(selector):
+            selected = [index for index, line_dict in enumerate(s.data_dict_list)
+                        if selector(line_dict)]
+        else:
+            # Lines need to match all fields in the selector dict.
+            selected = None
+            for key, values in selector.items():
+                if isinstance(values, str):
+                    values = [values]
+                indices = set()
+                for value in values:
+                    indices.update(s._Get_Line_Indices(key, value))
+                selected = indices if selected == None else selected & indices
+            selected = sorted(selected)
+
+        if flags:
+            flag_indices = s._Select_Flag_Lines(flags)
+            if isinstance(selected, range):
+                selected = flag_indices
+            else:
+                flag_indices = set(flag_indices)
+                selected = [x for x in selected if x in flag_indices]
+        return selected
+
+
+    def _Select_Flag_Lines(s, flags):
+        '''
+        Returns a list of the indices of data lines matching the flags,
+        as used by Update_Fields. Lines without a flag field do not match.
+        '''
+        if s.Use_Numpy():
+            mask = numpy.ones(len(s.row_keys), dtype = bool)
+            for key, (set_bits, clear_bits) in flags.items():
+                if key not in s.columns:
+                    return []
+                values = s.Get_Number_Array(key)
+                mask &= (values & set_bits) == set_bits
+                mask &= (values & clear_bits) == 0
+                mask &= numpy.array([x is not _missing for x in s.columns[key]])
+            return numpy.flatnonzero(mask).tolist()
+
+        selected = range(len(s.row_keys))
+        for key, (set_bits, clear_bits) in flags.items():
+            values = s.Get_Number_Column(key)
+            selected = [index for index in selected
+                        if values[index] != None
+                        and values[index] & set_bits == set_bits
+                        and not values[index] & clear_bits]
+        return selected
+
+
+    def Update_Fields(
+            s,
+            fields,
+            factor = None,
+            function = None,
+            selector = None,
+            flags = None,
+            number_type = int,
+            rounding = None,
+            minimum = None,
+            maximum = None,
+            text_format = None,
+        ):
+        '''
+        Update numeric fields over all selected data lines, working
+        directly on the columns. Each value is parsed as the number_type,
+        multiplied by its factor (or passed to the function), rounded,
+        clamped, and put back. Lines without a field are skipped.
+
+        If numpy is available (see Use_Numpy), updates using factors and
+        no function are done on whole columns as arrays, giving the
+        same results.
+
+        * fields
+          - Field key, or list of keys, to update.
+        * factor
+          - Number to scale all values by, or a list with a factor for
+            each data line (eg. from Get_Line_Factors), where lines with
+            None are left unchanged.
+        * function
+          - Optional function giving the new value, used in place of
+            multiplying by the factor.
+          - Takes the value and the line's factor if a factor was given,
+            else just the value. If it returns None, the line is left
+            unchanged.
+        * selector
+          - Optional, picks which lines to update. Either a function
+            taking a line dict and returning True to update the line,
+            or a dict keyed by field key holding a value or list of
+            values, of which lines must match one for every key.
+          - Defaults to updating all lines.
+        * flags
+          - Optional dict keyed by the field key of a packed flags field,
+            holding a tuple of (bits that must be set, bits that must be
+            clear), as ints, for lines to be updated. See
+            Flags.Get_Flag_Bits.
+        * number_type
+          - int or float, the type to parse the existing values as.
+        * rounding
+          - Optional function applied to new values, eg. round, int,
+            or math.ceil.
+        * minimum, maximum
+          - Optional limits on the new values, applied after rounding.
+        * text_format
+          - Optional format string to convert new values to text with,
+            eg. '{0:.1f}'. If not given, values are kept as numbers
+            until written out.
+        '''
+        if isinstance(fields, str):
+            fields = [fields]
+        line_indices = s._Select_Lines(selector, flags)
+        if s.Use_Numpy() and s._Can_Update_Arrays(
+                factor, function, number_type, rounding, minimum, maximum):
+            # Lines to update and their factors are shared by all fields.
+            line_mask, factor_array = s._Get_Array_Selection(
+                line_indices, factor)
+        else:
+            line_mask = None
+
+        for field in fields:
+            if field not in s.columns:
+                raise KeyError(field)
+            changed = None
+            if line_mask is not None:
+                changed = s._Update_Field_Array(
+                    field, line_mask, factor_array, number_type,
+                    rounding, minimum, maximum, text_format)
+            # Values too large for the arrays fall back to the lists.
+            if changed == None:
+                changed = s._Update_Field_List(
+                    field, line_indices, factor, function, number_type,
+                    rounding, minimum, maximum, text_format)
+            if not changed:
+                continue
+
+            # Other parsed values and any index are no longer valid.
+            for this_type in (int, float):
+                if this_type is not number_type:
+                    s.parsed_columns.pop((field, this_type), None)
+            s.indexes.pop(field, None)
+            if text_format == None:
+                s.number_keys.add(field)
+        return
+
+
+    def _Update_Field_List(s, field, line_indices, factor, function,
+                           number_type, rounding, minimum, maximum,
+                           text_format):
+        '''
+        Update a field for Update_Fields, a line at a time.
+        Returns True if any line was changed.
+        '''
+        column = s.columns[field]
+        parsed_column = s._Get_Parsed_Column(field, number_type)
+        factor_list = factor if isinstance(factor, list) else None
+        changed = False
+
+        for index in line_indices:
+            this_factor = factor
+            if factor_list != None:
+                this_factor = factor_list[index]
+                if this_factor == None:
+                    continue
+
+            value = parsed_column[index]
+            if value is None:
+                text = column[index]
+                if text is _missing:
+                    continue
+                value = parsed_column[index] = s._Parse_Number(
+                    text, number_type)
+
+            if function == None:
+                new_value = value * this_factor
+            elif factor == None:
+                new_value = function(value)
+            else:
+                new_value = function(value, this_factor)
+            if new_value is None:
+                continue
+            if rounding != None:
+                new_value = rounding(new_value)
+            if minimum != None and new_value < minimum:
+                new_value = minimum
+            if maximum != None and new_value > maximum:
+                new_value = maximum
+
+            changed = True
+            s.row_texts[index] = None
+            if text_format != None:
+                column[index] = text_format.format(new_value)
+                parsed_column[index] = None
+            else:
+                column[index] = new_value
+                # Keep the parsed value if it has the right type.
+                parsed_column[index] = (new_value
+                    if type(new_value) is number_type else None)
+        return changed
+
+
+    @staticmethod
+    def _Can_Update_Arrays(factor, function, number_type, rounding,
+                           minimum, maximum):
+        '''
+        Returns True if an Update_Fields call can be done with arrays
+        and give the same results as the line by line update.
+        '''
+        if function != None:
+            return False
+        if isinstance(factor, list):
+            if not set(map(type, factor)) <= {int, float, type(None)}:
+                return False
+        elif type(factor) not in (int, float):
+            return False
+
+        # New values need to be all ints or all floats, as when
+        #  updating a line at a time, with limits of the same type.
+        if rounding != None:
+            if rounding not in _numpy_rounding_dict:
+                return False
+            result_type = int
+        elif number_type is float:
+            result_type = float
+        else:
+            # Ints scaled without rounding may give either type.
+            return False
+        return all(x == None or type(x) is result_type
+                   for x in (minimum, maximum))
+
+
+    def _Get_Array_Selection(s, line_indices, factor):
+        '''
+        Returns a tuple of (numpy bool array picking the lines to update,
+        factor as a number or numpy array) for array updates, from the
+        Update_Fields line indices and factor.
+        '''
+        if isinstance(line_indices, range):
+            mask = numpy.ones(len(s.row_keys), dtype = bool)
+        else:
+            mask = numpy.zeros(len(s.row_keys), dtype = bool)
+            mask[numpy.asarray(line_indices, dtype = int)] = True
+        # Lines with a None factor are skipped.
+        if isinstance(factor, list):
+            if None in factor:
+                mask &= numpy.array([x is not None for x in factor])
+                factor = [1 if x is None else x for x in factor]
+            factor = numpy.array(factor)
+        return mask, factor
+
+
+    def _Update_Field_Array(s, field, mask, factor, number_type,
+                            rounding, minimum, maximum, text_format):
+        '''
+        Update a field for Update_Fields, using numpy arrays, for the
+        lines picked by the mask.
+        Returns True if any line was changed, or None if the values
+        do not fit in an array.
+        '''
+        column = s.columns[field]
+        # Skip lines without the field.
+        if _missing in column:
+            mask = mask & numpy.array([x is not _missing for x in column])
+        if not mask.any():
+            return False
+
+        # Parse just the picked lines, so that other lines may hold text
+        #  that is not a number, as with the line by line update.
+        picked_all = mask.all()
+        try:
+            if picked_all:
+                values = s.Get_Number_Array(field, number_type)
+            else:
+                parsed_column = s._Get_Parsed_Column(field, number_type)
+                values = []
+                for index in numpy.flatnonzero(mask).tolist():
+                    value = parsed_column[index]
+                    if value is None:
+                        value = parsed_column[index] = s._Parse_Number(
+                            column[index], number_type)
+                    values.append(value)
+                values = numpy.array(
+                    values, dtype = numpy.int64 if number_type is int
+                    else numpy.float64)
+        except OverflowError:
+            return None
+
+        if not picked_all and isinstance(factor, numpy.ndarray):
+            factor = factor[mask]
+        # Int products need to stay in range, as they are not converted
+        #  to floats.
+        if (values.dtype.kind == 'i' and numpy.asarray(factor).dtype.kind == 'i'
+        and int(numpy.abs(values).max()) * int(numpy.abs(factor).max()) >= 2**62):
+            return None
+        new_values = values * factor
+        # Int products are already rounded.
+        if rounding != None and new_values.dtype.kind == 'f':
+            new_values = _numpy_rounding_dict[rounding](new_values).astype(
+                numpy.int64)
+        if minimum != None:
+            new_values = numpy.maximum(new_values, minimum)
+        if maximum != None:
+            new_values = numpy.minimum(new_values, maximum)
+
+        # Put the values back as python numbers.
+        parsed_column = s._Get_Parsed_Column(field, number_type)
+        keep_parsed = text_format == None and (rounding != None) == (number_type is int)
+        new_values = new_values.tolist()
+        if keep_parsed:
+            new_parsed = new_values
+        else:
+            new_parsed = [None] * len(new_values)
+        if text_format != None:
+            new_values = [text_format.format(x) for x in new_values]
+
+        row_texts = s.row_texts
+        if len(new_values) == len(column):
+            column[:] = new_values
+            parsed_column[:] = new_parsed
+            row_texts[:] = [None] * len(row_texts)
+        else:
+            for index, new_value, parsed_value in zip(
+                    numpy.flatnonzero(mask).tolist(), new_values, new_parsed):
+                column[index] = new_value
+                parsed_column[index] = parsed_value
+                row_texts[index] = None
+        return True
+
+
+    def _Serialize_Numbers(s):
+        '''
+        Convert any numbers set in the columns to text. The parsed
+        numbers are kept for further use.
+        '''
+        for key in s.number_keys:
+            column = s.columns[key]
+            column[:] = [x if type(x) is str or x is _missing else str(x)
+                         for x in column]
+        s.number_keys.clear()
+        return
+
+
+    def _Get_Line_Strings(s):
+        '''
+        Returns a list of the text of each line, with their newlines.
+        Unmodified data lines reuse their original text.
+        '''
+        s._Serialize_Numbers()
+        columns = s.columns
+        row_keys = s.row_keys
+        row_texts = s.row_texts
+        line_list = []
+        for line_dict in s.line_dict_list:
+            if type(line_dict) is T_Row:
+                index = line_dict.index
+                text = row_texts[index]
+                if text is None:
+                    # Join with semicolons.
+                    text = ';'.join(
+                        [columns[key][index] for key in row_keys[index]])
+                line_list.append(text)
+            else:
+                line_list.append(';'.join(line_dict.values()))
+        return line_list
 
                 
     def Get_Text(s):
@@ -439,42 +1549,20 @@ class T_File(Game_File):
         '''
         Returns a bytearray with the file contents.
         '''
-        binary = bytearray()
-        # Loop over the lines.
-        for line_dict in s.line_dict_list:
-
-            # Convert the line fields to a list.
-            field_list = line_dict.values()
-            # Join with semicolons.
-            this_line = ';'.join(field_list)
-
-            # The last entry of each sublist is alrady a new line, so
-            #  no new line needed here.
-            # Encode and store.
-            binary += this_line.replace('\n','\r\n').encode()
-        return binary
+        # The last entry of each line is already a new line, so
+        #  no new line needed here.
+        return bytearray(
+            ''.join(s._Get_Line_Strings()).replace('\n','\r\n').encode())
 
 
-    def Write_File(s, file_path):
+    def Get_Loose_Binary(s):
         '''
-        Write these contents to the target file_path.
+        Returns the binary to write to a loose file, using system
+        newlines.
         '''
-        # Open the file to write to.
-        with open(file_path, 'w') as file:
-            # Loop over the lines.
-            for line_dict in s.line_dict_list:
-    
-                # Convert the line fields to a list.
-                field_list = line_dict.values()
-                # Join with semicolons.
-                this_line = ';'.join(field_list)
-    
-                # Write to the file.
-                # The last entry of each sublist is alrady a new line, so
-                #  no new line needed here.
-                file.write(this_line)
-            
-        return
+        # The last entry of each line is already a new line, so
+        #  no new line needed here.
+        return _Encode_Loose_Text(''.join(s._Get_Line_Strings()))
                
 
     def Find(s, key, value):
@@ -484,12 +1572,34 @@ class T_File(Game_File):
         Tships file will return the Pericles entry.
         Raises an exception is the key is not valid for this file
         type; otherwise returns None if a value match is not found.
+        If more than one line matches, the first is returned.
         '''
+        if key in s.indexed_fields:
+            if key not in s.columns and s.data_dict_list:
+                raise KeyError(key)
+            index_list = s._Get_Index(key).get(value)
+            if index_list:
+                return s.data_dict_list[index_list[0]]
+            return None
+
         for line_dict in s.data_dict_list:
             if line_dict[key] == value:
                 return line_dict
         return None
 
+
+    def Find_All(s, key, value):
+        '''
+        Returns a list of all line dicts that match the given key:value
+        pair, in file order, skipping lines without the key.
+        Eg. Find_All('subtype', 'SG_SH_M3') on the Tships file returns
+        all of the M3 ships.
+        '''
+        if key in s.indexed_fields:
+            return [s.data_dict_list[x]
+                    for x in s._Get_Index(key).get(value, [])]
+        return [x for x in s.data_dict_list if x.get(key) == value]
+
     
     def Add_Entries(s, new_entry_list):
         '''
@@ -497,6 +1607,10 @@ class T_File(Game_File):
 
         * new_entry_list
           - List of OrderedDict entries matching the tfile's line format.
+          - The entries are copied into the file columns; the list and its
+            dicts (along with any attributes transforms annotated them
+            with, eg. template_name) are left as given. Later edits to
+            the new lines should go through the file's data_dict_list.
         '''
         # Return early if the list is empty.
         if not new_entry_list:
@@ -533,8 +1647,10 @@ class T_File(Game_File):
         # These need to go in both the data and line lists, data for future
         # visibility to this and other transforms, lines to be seen at
         # writeout.
-        s.data_dict_list += new_entry_list
-        s.line_dict_list += new_entry_list
+        new_row_list = [s._Append_Row(list(x.keys()), list(x.values()))
+                        for x in new_entry_list]
+        s.data_dict_list += new_row_list
+        s.line_dict_list += new_row_list
 
         # Find the header line.
         for line_dict in s.line_dict_list:
@@ -568,21 +1684,9 @@ class Globals_File(T_File):
     convenient wayts to access fields, including support for defaults
     when a field is not present.
 
-    New attributes:
-    * named_lines_dict
-      - Dict, keyed by global field name, holding the OrderedDict line
-        entry.
+    Lines are looked up by name through the T_File index.
     '''
-    def __init__(s, *args, **kwargs):
-        # Init the standard t file.
-        super().__init__(**kwargs)
-
-        # Build a dict matching fields names to line entries.
-        s.named_lines_dict = {
-            x['name'] : x for x in s.data_dict_list
-            }
-
-        return
+    indexed_fields = ('name',)
 
 
     def Get_Field(s, field_name):
@@ -590,8 +1694,9 @@ class Globals_File(T_File):
         Return the value for a given field. If the field is not found,
         a default is returned. Values is returned as a string.
         '''
-        if field_name in s.named_lines_dict:
-            value = s.named_lines_dict[field_name]['value']
+        this_line = s.Find('name', field_name)
+        if this_line != None:
+            value = this_line['value']
         else:
             # The fields should be present in the defaults, at least.
             assert field_name in File_Fields.Global_Defaults
@@ -613,8 +1718,9 @@ class Globals_File(T_File):
         prior to this call.
         '''
         # Do a direct update if the line is present.
-        if field_name in s.named_lines_dict:
-            s.named_lines_dict[field_name]['value'] = str(value)
+        this_line = s.Find('name', field_name)
+        if this_line != None:
+            this_line['value'] = str(value)
         else:
             # Add a new line.
             this_line = OrderedDict()
@@ -651,13 +1757,12 @@ class Obj_File(Game_File):
         return s.binary
 
 
-    def Write_File(s, file_path):
+    def Get_Loose_Binary(s):
         '''
-        Write these contents to the target file_path.
+        Returns the binary to write to a loose file.
         '''
-        # Do a binary write.
-        with open(file_path, 'wb') as file:
-            file.write(s.binary)
+        # This is a direct binary write.
+        return s.binary
 
 
 class Misc_File(Game_File):
@@ -699,26 +1804,24 @@ class Misc_File(Game_File):
             return binary
         
 
-    def Write_File(s, file_path):
+    def Get_Loose_Binary(s):
         '''
-        Write these contents to the target file_path.
+        Returns the binary to write to a loose file, using system
+        newlines for text.
         '''
         if s.text != None:
-            # Do a text write.
-            with open(file_path, 'w') as file:
-                # To be safe, add a newline at the end if there isn't
-                #  one, since some files require this (eg. bods) to
-                #  be read correctly.
-                file.write(s.text)
-                if not s.text.endswith('\n'):
-                    file.write('\n')
-
-        elif s.binary != None:
-            # Do a binary write.
-            with open(file_path, 'wb') as file:
-                file.write(s.binary)
-                
-        return
+            # Encode as a text write.
+            # To be safe, add a newline at the end if there isn't
+            #  one, since some files require this (eg. bods) to
+            #  be read correctly.
+            text = s.text
+            if not text.endswith('\n'):
+                text += '\n'
+            return _Encode_Loose_Text(text)
+
+        # Otherwise a direct binary write.
+        assert s.binary != None
+        return s.binary
 
 
 #-Removed for now; this would need to be paired up with something
@@ -0,0 +1,142 @@
+'''
+Support for cached folder listings, to answer file existence checks
+without a stat call per check.
+
+Source reading checks for loose files (packed and unpacked versions,
+plus any renamed backups) on every file request, which can add up to
+thousands of stat calls, and these are slow on network mounted game
+installs. Instead, each folder is listed once with os.scandir on
+first use, and later checks are set lookups.
+
+Files created or removed by the customizer during a run should be
+noted through Add_File/Remove_File, or the listing refreshed.
+'''
+import os
+
+
+class Folder_Listing:
+    '''
+    Cache of folder contents.
+
+    Attributes:
+    * folder_files_dict
+      - Dict, keyed by normalized folder path, holding a set of the
+        normalized names of files in that folder.
+      - Folders that do not exist hold an empty set.
+    '''
+    def __init__(s):
+        s.folder_files_dict = {}
+
+
+    @staticmethod
+    def _Normalize(path):
+        '''
+        Returns a normalized version of the path for use as a key,
+        with case folded on case insensitive systems (eg. windows).
+        '''
+        return os.path.normcase(os.path.abspath(path))
+
+
+    def _List_Folder(s, folder_key):
+        '''
+        Scan a folder (given as a normalized path), recording its file
+        names.
+        '''
+        file_names = set()
+        try:
+            with os.scandir(folder_key) as entries:
+                for entry in entries:
+                    if not entry.is_dir():
+                        file_names.add(os.path.normcase(entry.name))
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        s.folder_files_dict[folder_key] = file_names
+        return
+
+
+    def Exists(s, sys_path):
+        '''
+        Returns True if a file exists at the given path, according to
+        the folder listing.
+        '''
+        folder, name = os.path.split(s._Normalize(sys_path))
+        if folder not in s.folder_files_dict:
+            s._List_Folder(folder)
+        return name in s.folder_files_dict[folder]
+
+
+    def Walk_Files(s, root_folder, skip_folders = ()):
+        '''
+        Returns a list of absolute paths of all files under the given
+        folder, recursively, while recording listings along the way.
+        Files are ordered as with os.walk: each folder's files come
+        before those of its subfolders. Symbolic links to folders are
+        not followed.
+
+        * root_folder
+          - Path of the folder to walk.
+        * skip_folders
+          - Optional list of paths of subfolders to not walk into.
+        '''
+        file_paths = []
+        root_folder = os.path.abspath(root_folder)
+        skip_keys = set(s._Normalize(x) for x in skip_folders)
+
+        def Walk(folder):
+            # Gather names in scan order, for consistent file ordering.
+            file_names = []
+            sub_folders = []
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            sub_folders.append(entry)
+                        else:
+                            file_names.append(entry.name)
+            except (FileNotFoundError, NotADirectoryError):
+                pass
+            s.folder_files_dict[s._Normalize(folder)] = set(
+                os.path.normcase(x) for x in file_names)
+
+            file_paths.extend(os.path.join(folder, x) for x in file_names)
+            for entry in sub_folders:
+                sub_folder = os.path.join(folder, entry.name)
+                if (not entry.is_symlink()
+                and s._Normalize(sub_folder) not in skip_keys):
+                    Walk(sub_folder)
+
+        Walk(root_folder)
+        return file_paths
+
+
+    def Add_File(s, sys_path):
+        '''
+        Note a file as created at the given path. Only affects folders
+        already listed, since others will pick it up when scanned.
+        '''
+        folder, name = os.path.split(s._Normalize(sys_path))
+        if folder in s.folder_files_dict:
+            s.folder_files_dict[folder].add(name)
+
+
+    def Remove_File(s, sys_path):
+        '''
+        Note a file as removed at the given path.
+        '''
+        folder, name = os.path.split(s._Normalize(sys_path))
+        if folder in s.folder_files_dict:
+            s.folder_files_dict[folder].discard(name)
+
+
+    def Refresh(s, folder = None):
+        '''
+        Drop cached listings, so they will be rescanned on next use.
+
+        * folder
+          - Optional path to a single folder to refresh; if None, all
+            folders are refreshed.
+        '''
+        if folder == None:
+            s.folder_files_dict.clear()
+        else:
+            s.folder_files_dict.pop(s._Normalize(folder), None)
@@ -7,8 +7,14 @@ from ..Common.Settings import Settings
 import hashlib
 from .File_Paths import *
 
+# Number of bytes to read at a time when hashing files.
+_hash_chunk_size = 1024 * 1024
+
 # General messages printout by transforms or during runtime.
 Message_file = None
+# List collecting written summary text while a capture is active (eg. for
+#  the run cache to replay later), else None.
+Summary_capture = None
 def Write_Summary_Line(line, newline = True):
     '''
     Write a line to the summary file.
@@ -24,6 +30,8 @@ def Write_Summary_Line(line, newline = True):
     Message_file.write(line)
     if newline:
         Message_file.write('\n')
+    if Summary_capture != None:
+        Summary_capture.append(line + ('\n' if newline else ''))
     return
     
 
@@ -46,6 +54,11 @@ class Log:
       - May need pruning for files whose existing hash doesn't match
         the stored hash in the prior run (indicating the file was
         overwritten externally).
+    * file_paths_written_stat_dict
+      - Dict, keyed by the same paths as file_paths_written_hash_dict,
+        holding a list of [size, mtime_ns] for the file as written.
+      - Used to skip rehashing files that have not changed since the
+        prior run.
     * file_paths_renamed_dict
       - Dict of strings, paths to files renamed by the customizer, keyed
         by the original path and holding the new path.
@@ -55,6 +68,23 @@ class Log:
       - When from an older run, these files should be considered as sources,
         and should be renamed back to their base version by the newer run
         if it is otherwise not writing out a matching customized file.
+    * catalog_manifest_dict
+      - Dict, keyed by path to a cat file written by the customizer,
+        holding a dict keyed by cat path of each file in the catalog,
+        holding a list of [content hash, dat offset, dat size].
+      - The content hash is of the file binary before compression,
+        used to detect files which are unchanged on the next run, so
+        their already packed dat data can be reused.
+      - When from an older run, entries are dropped if the cat or its dat
+        were changed externally.
+    * journal_file
+      - File object for the open journal, when journaling is active.
+      - While active, records are appended to the journal as they are
+        made, and the full log is only written by Store.
+    * journal_batch
+      - List of journal records held back while a batch is open, to be
+        written together by Commit_Journal_Batch, including the start
+        record held by Start_Journal; None when no batch is open.
     '''
     def __init__(s):
         # Always default to the current highest version.
@@ -62,21 +92,35 @@ class Log:
         import Change_Log
         s.version = Change_Log.Get_Version()
         s.file_paths_written_hash_dict = {}
+        s.file_paths_written_stat_dict = {}
         s.file_paths_renamed_dict = {}
+        s.catalog_manifest_dict = {}
+        s.journal_file = None
+        s.journal_batch = None
         
 
     def Load(s):
         '''
-        Load information from an existing log json file.
-        If a log file is not found, nothing will be changed.
+        Load information from an existing log json file, along with
+        any journal left over from a run that did not finish.
+        If neither file is found, nothing will be changed.
         '''
         path = Settings.Get_Log_File_Path()
-        # If the file doesn't exist, return early.
-        if not os.path.exists(path):
+        journal_path = Settings.Get_Log_Journal_Path()
+        # If the files don't exist, return early.
+        if not os.path.exists(path) and not os.path.exists(journal_path):
             return
 
-        with open(path, 'r') as file:
-            log_dict = json.load(file)
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                log_dict = json.load(file)
+        else:
+            # Only a journal was left; start from an empty log.
+            log_dict = {
+                'version' : s.version,
+                'file_paths_written_hash_dict' : {},
+                'file_paths_renamed_dict' : {},
+                }
 
         #-Removed; special handling applies instead to deal with
         # relative paths.
@@ -94,6 +138,12 @@ class Log:
             s.file_paths_written_hash_dict[
                 Relative_Path_to_System_Path(relative_path)] = hash
 
+        # Handle file stats; these are missing in older logs.
+        for relative_path, stat in log_dict.get(
+            'file_paths_written_stat_dict', {}).items():
+            s.file_paths_written_stat_dict[
+                Relative_Path_to_System_Path(relative_path)] = stat
+
         # Handle renamings.
         for source_relative_path, dest_relative_path in log_dict[
             'file_paths_renamed_dict'].items():
@@ -103,6 +153,15 @@ class Log:
                 ] = Relative_Path_to_System_Path(dest_relative_path)
             
 
+        # Handle catalog manifests; these are missing in older logs.
+        for relative_path, manifest in log_dict.get(
+            'catalog_manifest_dict', {}).items():
+            s.catalog_manifest_dict[
+                Relative_Path_to_System_Path(relative_path)] = manifest
+
+        # Apply any records from an unfinished run.
+        s.Replay_Journal()
+
         # Check for hash mismatches in the prior written files.
         hash_mismatched_file_paths = []
         for file_path, hash in s.file_paths_written_hash_dict.items():
@@ -111,7 +170,10 @@ class Log:
             #  come from test code that disabled writeouts, and this
             #  can be ignored.
 
-            # Get an updated hash.
+            # Get an updated hash, skipping the rehash if the file
+            #  size and modification time are unchanged.
+            if s.File_Stat_Matches(file_path):
+                continue
             new_hash = s.Get_File_Hash(file_path)
 
             # If the file is no longer found, hash will be None and this
@@ -123,6 +185,15 @@ class Log:
         # Delete these paths from the dict.
         for path in hash_mismatched_file_paths:
             del(s.file_paths_written_hash_dict[path])
+            s.file_paths_written_stat_dict.pop(path, None)
+
+        # Drop manifests for catalogs that were changed externally, or
+        #  whose dat was changed.
+        for cat_path in list(s.catalog_manifest_dict.keys()):
+            dat_path = cat_path.replace('.cat','.dat')
+            if (cat_path not in s.file_paths_written_hash_dict
+            or dat_path not in s.file_paths_written_hash_dict):
+                del(s.catalog_manifest_dict[cat_path])
             
         # TODO: think about how to detect cases where a generated
         #  file is the same as a user written file, eg. if the source
@@ -155,7 +226,9 @@ class Log:
         log_dict = {}
         log_dict['version'] = s.version
         log_dict['file_paths_written_hash_dict'] = {}
+        log_dict['file_paths_written_stat_dict'] = {}
         log_dict['file_paths_renamed_dict'] = {}
+        log_dict['catalog_manifest_dict'] = {}
 
         # Handle hashes.
         for abs_path, hash in s.file_paths_written_hash_dict.items():
@@ -164,16 +237,189 @@ class Log:
             log_dict['file_paths_written_hash_dict'][
                 System_Path_to_Relative_Path(abs_path)] = hash
 
+        # Handle file stats.
+        for abs_path, stat in s.file_paths_written_stat_dict.items():
+            log_dict['file_paths_written_stat_dict'][
+                System_Path_to_Relative_Path(abs_path)] = stat
+
         # Handle renamings.
         for source_abs_path, dest_abs_path in s.file_paths_renamed_dict.items():
             # Convert both to relative and store.
             log_dict['file_paths_renamed_dict'][
                 System_Path_to_Relative_Path(source_abs_path)
                 ] = System_Path_to_Relative_Path(dest_abs_path)
+
+        # Handle catalog manifests.
+        for abs_path, manifest in s.catalog_manifest_dict.items():
+            log_dict['catalog_manifest_dict'][
+                System_Path_to_Relative_Path(abs_path)] = manifest
             
         # Write the json, with indents for readability.
-        with open(Settings.Get_Log_File_Path(), 'w') as file:
+        # This goes to a temp file first, so a failed write does not
+        #  lose the prior log.
+        path = Settings.Get_Log_File_Path()
+        with open(path + '.tmp', 'w') as file:
             json.dump(log_dict, file, indent = 2)
+        os.replace(path + '.tmp', path)
+
+        # The journal is now captured by the log, and can be removed.
+        s.Stop_Journal(delete = True)
+        return
+
+
+    def Start_Journal(s):
+        '''
+        Start journaling records to the journal file, replacing any
+        prior journal. This should be done after any leftover journal
+        was replayed by Load, and after cleaning up prior outputs.
+        Records from here on are appended and flushed to disk one at
+        a time, and compacted into the log json by Store.
+
+        This opens a journal batch holding the start record, so that
+        records carried over from the prior run can be added before
+        Commit_Journal_Batch writes them together. The new journal is
+        written to a temp file and only replaces the prior journal on
+        that commit, so an interruption before then leaves the prior
+        journal in effect.
+        '''
+        s.Stop_Journal()
+        s.journal_file = open(Settings.Get_Log_Journal_Path() + '.tmp', 'w')
+        # The start record marks the journal as holding a complete
+        #  replacement for the prior log contents.
+        s.journal_batch = [{'type' : 'start', 'version' : s.version}]
+        return
+
+
+    def Stop_Journal(s, delete = False):
+        '''
+        Close any open journal file.
+
+        * delete
+          - Bool, if True the journal file is also removed.
+        '''
+        if s.journal_file != None:
+            s.journal_file.close()
+            s.journal_file = None
+        if delete:
+            journal_path = Settings.Get_Log_Journal_Path()
+            for path in [journal_path, journal_path + '.tmp']:
+                if os.path.exists(path):
+                    os.remove(path)
+        return
+
+
+    def _Append_Journal(s, record):
+        '''
+        Append a record dict to the journal, if journaling is active,
+        making sure it reaches the disk. If a batch is open, the record
+        is held until the batch is committed.
+        '''
+        if s.journal_file == None:
+            return
+        if s.journal_batch != None:
+            s.journal_batch.append(record)
+            return
+        s._Write_Journal([record])
+        return
+
+
+    def _Write_Journal(s, records):
+        '''
+        Write a list of records to the journal, syncing once at the end.
+        '''
+        for record in records:
+            s.journal_file.write(json.dumps(record) + '\n')
+        s.journal_file.flush()
+        os.fsync(s.journal_file.fileno())
+        return
+
+
+    def Start_Journal_Batch(s):
+        '''
+        Start holding back journal records, so that a group of them can
+        be written with a single sync by Commit_Journal_Batch.
+        The in-memory log is still updated immediately.
+        '''
+        s.journal_batch = []
+        return
+
+
+    def Commit_Journal_Batch(s):
+        '''
+        Write out any journal records held since Start_Journal_Batch
+        or Start_Journal.
+        '''
+        records = s.journal_batch
+        s.journal_batch = None
+        if s.journal_file == None:
+            return
+        if records:
+            s._Write_Journal(records)
+
+        # A journal opened by Start_Journal is moved into place once its
+        #  start record is on disk, then reopened for appending (since
+        #  open files cannot be replaced on windows).
+        journal_path = Settings.Get_Log_Journal_Path()
+        if s.journal_file.name != journal_path:
+            s.journal_file.close()
+            os.replace(journal_path + '.tmp', journal_path)
+            s.journal_file = open(journal_path, 'a')
+        return
+
+
+    def Replay_Journal(s):
+        '''
+        Apply the records of a leftover journal file, if one exists.
+        A journal with a start record replaces the loaded contents,
+        since the run that wrote it had already cleaned up the prior
+        outputs. A partially written last record is ignored.
+        '''
+        journal_path = Settings.Get_Log_Journal_Path()
+        if not os.path.exists(journal_path):
+            return
+
+        with open(journal_path, 'r') as file:
+            lines = file.readlines()
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Write was cut off; nothing follows.
+                break
+
+            record_type = record['type']
+            if record_type == 'start':
+                s.version = record['version']
+                s.file_paths_written_hash_dict.clear()
+                s.file_paths_written_stat_dict.clear()
+                s.file_paths_renamed_dict.clear()
+                s.catalog_manifest_dict.clear()
+
+            elif record_type == 'written':
+                path = Relative_Path_to_System_Path(record['path'])
+                s.file_paths_written_hash_dict[path] = record['hash']
+                s.file_paths_written_stat_dict[path] = record['stat']
+
+            elif record_type == 'forget':
+                path = Relative_Path_to_System_Path(record['path'])
+                s.file_paths_written_hash_dict.pop(path, None)
+                s.file_paths_written_stat_dict.pop(path, None)
+                s.catalog_manifest_dict.pop(path, None)
+
+            elif record_type == 'renamed':
+                s.file_paths_renamed_dict[
+                    Relative_Path_to_System_Path(record['source'])
+                    ] = Relative_Path_to_System_Path(record['dest'])
+
+            elif record_type == 'restored':
+                s.file_paths_renamed_dict.pop(
+                    Relative_Path_to_System_Path(record['source']), None)
+
+            elif record_type == 'manifest':
+                s.catalog_manifest_dict[
+                    Relative_Path_to_System_Path(record['path'])
+                    ] = record['manifest']
+        return
 
 
     def Get_File_Hash(s, path):
@@ -186,20 +432,78 @@ class Log:
         # Can use sha256, which seems to be the current default over
         #  ones like md5.        
         hash = hashlib.sha256()
-        # Presumably manually buffering a file will help with hashing
-        #  it, but can keep things simple for now and do a full read.
+        # Read in chunks, to avoid holding large files (eg. the
+        #  customizer dat) in memory.
         with open(path, 'rb') as file:
-            hash.update(file.read())
+            for chunk in iter(lambda: file.read(_hash_chunk_size), b''):
+                hash.update(chunk)
         return hash.hexdigest()
 
 
-    def Record_File_Path_Written(s, path):
+    @staticmethod
+    def Get_File_Stat(path):
+        '''
+        Return a list of [size, mtime_ns] for a file on the given path.
+        If the file does not exist, returns None.
+        '''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+
+    def File_Stat_Matches(s, path):
+        '''
+        Returns True if the file at the given path has the same size and
+        modification time as when it was recorded as written.
+        '''
+        recorded_stat = s.file_paths_written_stat_dict.get(path)
+        if recorded_stat == None:
+            return False
+        return s.Get_File_Stat(path) == recorded_stat
+
+
+    def Record_File_Path_Written(s, path, binary = None, file_hash = None):
         '''
         Record the path of a file written by the customizer, along with
         a hash of the contents. This should be called after the file
-        has been written, so the correct hash is computed.
+        has been written, so the correct hash and stats are recorded.
+
+        * binary
+          - Optional bytes or bytearray, the exact contents written to
+            the file, to be hashed instead of reading the file back.
+        * file_hash
+          - Optional string, hash of the file contents already computed
+            by the writer (eg. while streaming).
+        '''
+        if file_hash == None:
+            if binary != None:
+                file_hash = hashlib.sha256(binary).hexdigest()
+            else:
+                file_hash = s.Get_File_Hash(path)
+        s.file_paths_written_hash_dict[path] = file_hash
+        s.file_paths_written_stat_dict[path] = s.Get_File_Stat(path)
+        s._Append_Journal({
+            'type' : 'written',
+            'path' : System_Path_to_Relative_Path(path),
+            'hash' : file_hash,
+            'stat' : s.file_paths_written_stat_dict[path],
+            })
+
+
+    def Forget_File_Path_Written(s, path):
         '''
-        s.file_paths_written_hash_dict[path] = s.Get_File_Hash(path)
+        Remove a file from the written records, eg. if it was carried
+        over from a prior run but then deleted.
+        '''
+        s.file_paths_written_hash_dict.pop(path, None)
+        s.file_paths_written_stat_dict.pop(path, None)
+        s.catalog_manifest_dict.pop(path, None)
+        s._Append_Journal({
+            'type' : 'forget',
+            'path' : System_Path_to_Relative_Path(path),
+            })
 
 
     def Record_File_Path_Renamed(s, source_path, dest_path):
@@ -207,6 +511,52 @@ class Log:
         Record the paths of a renamed file, from source to dest.
         '''
         s.file_paths_renamed_dict[source_path] = dest_path
+        s._Append_Journal({
+            'type'   : 'renamed',
+            'source' : System_Path_to_Relative_Path(source_path),
+            'dest'   : System_Path_to_Relative_Path(dest_path),
+            })
+
+
+    def Forget_File_Path_Renamed(s, source_path):
+        '''
+        Remove a rename from the records, eg. if it was carried over from
+        a prior run but then renamed back to the source path.
+        '''
+        s.file_paths_renamed_dict.pop(source_path, None)
+        s._Append_Journal({
+            'type'   : 'restored',
+            'source' : System_Path_to_Relative_Path(source_path),
+            })
+
+
+    def Record_Catalog_Manifest(s, cat_path, manifest):
+        '''
+        Record the manifest of a catalog written by the customizer.
+        See catalog_manifest_dict for the format.
+        '''
+        s.catalog_manifest_dict[cat_path] = manifest
+        s._Append_Journal({
+            'type'     : 'manifest',
+            'path'     : System_Path_to_Relative_Path(cat_path),
+            'manifest' : manifest,
+            })
+
+
+    def Get_Catalog_Manifest(s, cat_path):
+        '''
+        Returns the manifest dict of a catalog written on a prior run,
+        or None if there is no valid manifest for it.
+        '''
+        return s.catalog_manifest_dict.get(cat_path)
+
+
+    def Get_File_Hash_From_Last_Run(s, path):
+        '''
+        Returns the hash recorded for a file written on the prior run,
+        or None if it was not written (or was changed externally).
+        '''
+        return s.file_paths_written_hash_dict.get(path)
 
 
     def Get_File_Paths_From_Last_Run(s):
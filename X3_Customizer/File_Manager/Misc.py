@@ -9,6 +9,8 @@ import os
 from collections import OrderedDict
 import inspect
 import shutil
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 from .. import Common
 Settings = Common.Settings
@@ -18,6 +20,8 @@ Source_Reader = Source_Reader.Source_Reader
 from . import Cat_Writer
 from .File_Types import *
 from . import Logs
+from .Logs import Write_Summary_Line
+from .Run_Cache import Run_Cache
 Log_New = Logs.Log_New
 Log_Old = Logs.Log_Old
 
@@ -93,11 +97,25 @@ def Init():
 #  to be used during output.
 File_dict = {}
 
+# Dict matching lowercased virtual paths to the File_dict keys, so that
+#  requests for a file using different case find the same Game_File.
+File_dict_lower_keys = {}
+
 def Add_File(game_file):
     '''
     Add a Game_File object to the File_dict, keyed by its virtual path.
     '''
     File_dict[game_file.virtual_path] = game_file
+    File_dict_lower_keys[game_file.virtual_path.lower()] = game_file.virtual_path
+
+
+def Get_File_dict_Key(file_name):
+    '''
+    Returns the File_dict key for a file name, matching any prior
+    loaded file that differs only in case. If no such file is loaded,
+    the file_name is returned as-is.
+    '''
+    return File_dict_lower_keys.get(file_name.lower(), file_name)
 
 
 # Decorator function for transforms to check if their required
@@ -127,6 +145,7 @@ def Transform_Wrapper(
         XRM = True,
         LU = True,
         TC = True,
+        cacheable = True,
     ):
     '''
     Wrapper function for transforms.
@@ -154,6 +173,11 @@ def Transform_Wrapper(
     * FL
       - Bool, if True then the transform should be compatable with
         Farnham's Legacy.
+    * cacheable
+      - Bool, if False then the transform results should not be reused
+        by the run cache, eg. if it is not deterministic or depends on
+        more than its args and loaded files; calling it will stop the
+        run cache for the rest of the run.
     '''
 
     # Record the required file names to a set for use elsewhere.
@@ -202,6 +226,9 @@ def Transform_Wrapper(
             ('FL'     ,  FL),
             ])
 
+        # Record if the run cache may skip this transform.
+        func._cacheable = cacheable
+
         # Record the transform function.
         Transform_list.append(func)
 
@@ -224,12 +251,27 @@ def Transform_Wrapper(
 
             # Note this transform as being seen.
             Transforms_names_run.add(func.__name__)
-            
+
+            # Pass to the run cache, which may delay the call, or skip
+            #  it if prior results end up being reused.
+            return Run_Cache.Call(func, Run_Transform, args, kwargs)
+
+
+        def Run_Transform(*args, **kwargs):
+            '''
+            Run the transform, after checking for its required files.
+            '''
             # Loop over the required files.
             for file_name in func._file_names:
                 # Do a test load; if succesful, the file was found.
+                # Only the Game_File is needed here, so that its contents
+                #  do not get parsed until the transform uses them.
+                # Any unzipping is still done here, since the transform
+                #  will need it anyway, so that gzip problems are caught.
                 try:
-                    Load_File(file_name)
+                    game_file = Load_File(file_name, return_game_file = True)
+                    if game_file != None:
+                        game_file.Get_Source_Binary()
                 # Catch file problems.
                 except Common.File_Missing_Exception:
                     print('Skipped {}, required file {} not found or is empty.'.format(
@@ -240,6 +282,8 @@ def Transform_Wrapper(
                     return
                 # Catch gzip problems.
                 except Common.Gzip_Exception:
+                    # Drop the file, so it does not get written out.
+                    File_dict.pop(Get_File_dict_Key(file_name), None)
                     print('Skipped {}, required file {} failed during unzipping.'.format(
                         func.__name__,
                         file_name
@@ -342,6 +386,13 @@ def Load_File(file_name,
     #if file_name == 'text_override':
     #    file_name = Settings.Get_Page_Text_File_Path()
 
+    # Let the run cache know about loads from outside transforms.
+    Run_Cache.Check_Load()
+
+    # Reuse a loaded file if the name only differs in case, since the
+    #  game ignores case.
+    file_name = Get_File_dict_Key(file_name)
+
     # If the file is not loaded, handle loading.
     if file_name not in File_dict:
         
@@ -356,6 +407,9 @@ def Load_File(file_name,
         #  if not found.
         game_file = Source_Reader.Read(file_name, error_if_not_found = False)
 
+        # Note the source contents for the run cache.
+        Run_Cache.Record_File_Load(file_name, game_file)
+
         # Problem if the file isn't found.
         if game_file == None:
             if error_if_not_found:
@@ -368,15 +422,35 @@ def Load_File(file_name,
 
 
     # Return the file contents.
-    if return_game_file:
-        return File_dict[file_name]
-    elif return_text:
-        return File_dict[file_name].Get_Text()
-    else:
-        return File_dict[file_name].Read_Data()
+    # Unzipping is delayed until the contents are used, so a file that
+    #  fails then is dropped, as if its load failed.
+    try:
+        if return_game_file:
+            return File_dict[file_name]
+        elif return_text:
+            return File_dict[file_name].Get_Text()
+        else:
+            return File_dict[file_name].Read_Data()
+    except Common.Gzip_Exception:
+        File_dict.pop(file_name, None)
+        raise
 
           
-def Cleanup():
+# Path to a catalog from the prior run which was kept by Cleanup,
+#  for reuse by Write_Files; None if no catalog was kept.
+Kept_prior_cat_path = None
+# Paths to loose files from the prior run which were kept by Cleanup,
+#  for Write_Files to leave in place if unchanged, or else replace or
+#  remove.
+Kept_prior_loose_paths = set()
+# Dict of renames from the prior run which Cleanup left in place since
+#  they made room for a kept loose file (or its packed version), keyed
+#  by original path and holding the renamed path.
+Kept_prior_renamed_dict = {}
+# Count of loose files from the prior run removed by Cleanup.
+Removed_prior_loose_count = 0
+
+def Cleanup(keep_prior_catalog = False, keep_prior_loose_files = False):
     '''
     Handles cleanup of old transform files, undoing all file renames
      and deleting prior outputs.
@@ -387,18 +461,59 @@ def Cleanup():
      be run standalone to do a generic cleaning.
     Preferably do this late in a run, so that files from a prior run
      are not removed if the new run had an error during a transform.
+
+    * keep_prior_catalog
+      - Bool, if True then a catalog written by the prior run is left
+        in place (when still valid), so that Write_Files can reuse its
+        unchanged contents. Write_Files will then take care of
+        replacing or removing it.
+    * keep_prior_loose_files
+      - Bool, if True then loose files written by the prior run are
+        left in place, along with the renamed originals they replaced,
+        so that Write_Files can skip rewriting files whose contents
+        did not change. Write_Files will then take care of replacing
+        or removing them.
     '''
+    global Kept_prior_cat_path
+    global Kept_prior_loose_paths
+    global Kept_prior_renamed_dict
+    global Removed_prior_loose_count
     # It is possible Init was never run if no transforms were provided.
     # Ensure it gets run here in such cases.
     if First_call:
         Init()
 
+    # Check if the prior catalog can be kept; this requires it to still
+    #  be the highest numbered catalog, and to have a manifest.
+    paths_to_keep = []
+    prior_cat_path = Source_Reader.prior_customizer_cat_path
+    if (keep_prior_catalog
+    and prior_cat_path != None
+    and not Source_Reader.prior_customizer_cat_needs_dummy
+    and Log_Old.Get_Catalog_Manifest(prior_cat_path) != None):
+        Kept_prior_cat_path = prior_cat_path
+        paths_to_keep = [prior_cat_path, prior_cat_path.replace('.cat','.dat')]
+
+    # Loose files are anything other than catalogs.
+    Kept_prior_loose_paths = set()
+    if keep_prior_loose_files:
+        for path in Log_Old.Get_File_Paths_From_Last_Run():
+            if (not path.endswith(('.cat','.dat'))
+            and os.path.exists(path)):
+                Kept_prior_loose_paths.add(path)
+        paths_to_keep.extend(Kept_prior_loose_paths)
+
     # Find all files generated on a prior run, that still appear to be
     #  from that run (eg. were not changed externally), and remove
     #  them.
+    Removed_prior_loose_count = 0
     for path in Log_Old.Get_File_Paths_From_Last_Run():
+        if path in paths_to_keep:
+            continue
         if os.path.exists(path):
             os.remove(path)
+            if not path.endswith(('.cat','.dat')):
+                Removed_prior_loose_count += 1
 
     # Note: if the prior file was a catalog, and other higher numbered
     #  catalogs were added by the user since the last run, then
@@ -423,14 +538,28 @@ def Cleanup():
     # If the standard form is occupied, it is likely it was overwritten
     #  externally between runs; in this case the backup should not be
     #  restored.
+    # Renames that made room for kept loose files are left alone.
+    kept_conflict_paths = set(Kept_prior_loose_paths)
+    for path in Kept_prior_loose_paths:
+        path_pck = Unpacked_Path_to_Packed_Path(path)
+        if path_pck != None:
+            kept_conflict_paths.add(path_pck)
+    Kept_prior_renamed_dict = {}
     for original_path, renamed_path in Log_Old.Get_Renamed_File_Paths():
         # Skip if the renamed file doesn't exist anymore for some reason.
         if not os.path.exists(renamed_path):
             continue
+        if original_path in kept_conflict_paths:
+            Kept_prior_renamed_dict[original_path] = renamed_path
+            continue
         # Skip if the original file name is taken for some reason.
         if os.path.exists(original_path):
             continue
         os.rename(renamed_path, original_path)
+
+    # Loose files were moved around, so any cached folder listings
+    #  used for source lookups are stale.
+    Source_Reader.folder_listing.Refresh()
             
 
 def Add_Source_Folder_Copies():
@@ -446,8 +575,9 @@ def Add_Source_Folder_Copies():
     #  or not, in keeping with behavior of older versions of the customizer.
     # These will do direct copies.
     for virtual_path, sys_path in Source_Reader.source_file_path_dict.items():
-        # Skip files already written.
-        if virtual_path in File_dict:
+        # Skip files already written, including those loaded with
+        #  a differently cased name.
+        if Get_File_dict_Key(virtual_path) in File_dict:
             continue
 
         # TODO:
@@ -463,6 +593,17 @@ def Add_Source_Folder_Copies():
         # Create the game file.
         Add_File(Misc_File(binary = binary, virtual_path = virtual_path))
 
+
+def Finish_Transforms():
+    '''
+    Finish up transforms, running any the run cache delayed, or
+     restoring prior results.
+    This should be called after the user script completes, and before
+     Cleanup, so that delayed transforms and the run cache source checks
+     still see the prior run outputs in place.
+    '''
+    Run_Cache.Finish(File_dict, Add_File)
+
                 
 def Write_Files():
     '''
@@ -476,11 +617,33 @@ def Write_Files():
     # Do this before the proper writeout, so it can reuse functionality.
     Add_Source_Folder_Copies()
 
-    # TODO: do a pre-pass on all files to do a test write, then if all
-    #  look good, do the actual writes and log updates, to weed out
-    #  bugs early.
-    # Maybe could do it Clang style with gibberish extensions, then once
-    #  all files, written, rename then properly.
+    # Start the log journal; each write and rename from here on is
+    #  appended to it as it happens, so that a failure partway through
+    #  still leaves a record of which files came from this run.
+    # The full log is written once at the end.
+    # The records carried over below are written in the same batch as
+    #  the journal start, since that replaces the prior log contents.
+    Log_New.Start_Journal()
+
+    # A catalog kept from the prior run is still on disk, so carry
+    #  over its records until it is replaced or removed.
+    if Kept_prior_cat_path != None:
+        for path in [Kept_prior_cat_path,
+                     Kept_prior_cat_path.replace('.cat','.dat')]:
+            Log_New.Record_File_Path_Written(
+                path, file_hash = Log_Old.Get_File_Hash_From_Last_Run(path))
+        Log_New.Record_Catalog_Manifest(
+            Kept_prior_cat_path,
+            Log_Old.Get_Catalog_Manifest(Kept_prior_cat_path))
+
+    # Similarly for loose files kept from the prior run, and the renamed
+    #  files they replaced.
+    for path in Kept_prior_loose_paths:
+        Log_New.Record_File_Path_Written(
+            path, file_hash = Log_Old.Get_File_Hash_From_Last_Run(path))
+    for original_path, renamed_path in Kept_prior_renamed_dict.items():
+        Log_New.Record_File_Path_Renamed(original_path, renamed_path)
+    Log_New.Commit_Journal_Batch()
 
 
     # Pick out the path to the catalog folder and file.
@@ -488,12 +651,22 @@ def Write_Files():
             Settings.Get_Addon_Folder(),
             Source_Reader.Get_Next_Higher_Cat_Index() + '.cat')
     # Note: this path may be the same as used in a prior run, but
-    #  the prior cat file should have been removed by cleanup.
-    assert not os.path.exists(cat_path)
-    cat_writer = Cat_Writer.Cat_Writer(cat_path)
+    #  the prior cat file should have been removed by cleanup, unless
+    #  it was kept for reuse.
+    if cat_path == Kept_prior_cat_path:
+        prior_manifest = Log_Old.Get_Catalog_Manifest(cat_path)
+    else:
+        assert not os.path.exists(cat_path)
+        prior_manifest = None
+    cat_writer = Cat_Writer.Cat_Writer(
+        cat_path, prior_manifest = prior_manifest)
 
 
-    # Loop over the files that were loaded.
+    # Sort out the modified files, looking up their output paths.
+    # Whether a file goes to a catalog or not, the path is needed to
+    #  find existing loose files.
+    # This is a list of (file_object, file_path, for_catalog) tuples.
+    output_list = []
     for file_name, file_object in File_dict.items():
 
         # Skip if not modified.
@@ -505,80 +678,171 @@ def Write_Files():
         #  on the settings.
         if file_object.Is_Catalogable() and Settings.output_to_catalog:
             for_catalog = True
+            cat_writer.Add_File(file_object)
         else:
             for_catalog = False
 
-        # Look up the output path.
-        # Whether the file goes to a catalog or not, this is needed to
-        #  find existing loose files.
-        file_path = file_object.Get_Output_Path()
-        
-        # In case the target directory doesn't exist, such as on a
-        #  first run, make it, but only when not sending to a catalog.
-        if not for_catalog:
-            folder_path, _ = os.path.split(file_path)
-            if not os.path.exists(folder_path):
-                os.makedirs(folder_path)
-
-        # Rename any conflicting files, of same name or pck version.
-        # These should never be old versions of the customize output,
-        #  since the Cleanup call handled them.
-        file_path_pck = Unpacked_Path_to_Packed_Path(file_path)
-        for conflict_path in [file_path, file_path_pck]:
-            # Skip if None (for files with no packed version).
-            if conflict_path == None:
-                continue
-
-            # Skip if no such file exists.
-            if not os.path.exists(conflict_path):
-                continue
-
-            # Get the backup path name.
-            backup_path = Get_Backed_Up_Sys_Path(conflict_path)
-            # Delete any old backup (this should be more or less safe,
-            #  hopefully, if other checks were good.)
-            if os.path.exists(backup_path):
-                os.remove(backup_path)
-            # Do the rename.
-            os.rename(conflict_path, backup_path)
-
-            # Record this to the log.
-            Log_New.Record_File_Path_Renamed(conflict_path, backup_path)
-            
-            # Note: it is possible something will fail during a file write,
-            #  in which case some files will have been written but not others,
-            #  which can confuse any older logs (with old hashes).
-            # As a clumsy workaround, the log will be written out freshly
-            #  after every single written or renamed file for now.
-            Log_New.Store()
-
-        if not for_catalog:
-            # Write out the file, using the object's individual method.
-            file_object.Write_File(file_path)
-
-            # Add this to the log, post-write for correct hash.
-            Log_New.Record_File_Path_Written(file_path)
-
-            # As above, refresh the log file.
-            Log_New.Store()
-
-        else:
-            # Add to the catalog writer.
-            cat_writer.Add_File(file_object)
+        output_list.append(
+            (file_object, file_object.Get_Output_Path(), for_catalog))
+
+    loose_output_list = [x for x in output_list if not x[2]]
+
+    # In case target directories don't exist, such as on a first run,
+    #  make them, but only for loose files.
+    for folder_path in set(os.path.dirname(x[1]) for x in loose_output_list):
+        if not os.path.exists(folder_path):
+            os.makedirs(folder_path)
+
+    # Loose files are written to temp paths first, so that a failure
+    #  in any of them leaves the existing files untouched.
+    # Serializing and writing is spread across a thread pool.
+    # Files kept from the prior run with the same contents are skipped,
+    #  returning None instead of the binary.
+    def Write_Temp_File(file_object, file_path):
+        binary = file_object.Get_Loose_Binary()
+        if (file_path in Kept_prior_loose_paths
+        and hashlib.sha256(binary).hexdigest()
+            == Log_Old.Get_File_Hash_From_Last_Run(file_path)):
+            return None
+        with open(Get_Temp_Sys_Path(file_path), 'wb') as file:
+            file.write(binary)
+        return binary
+    def Remove_Temp_Files():
+        for _, file_path, _ in loose_output_list:
+            if os.path.exists(Get_Temp_Sys_Path(file_path)):
+                os.remove(Get_Temp_Sys_Path(file_path))
+    try:
+        with ThreadPoolExecutor(
+                max_workers = Settings.write_thread_count) as executor:
+            binaries = list(executor.map(
+                lambda x: Write_Temp_File(x[0], x[1]), loose_output_list))
+    except Exception:
+        Remove_Temp_Files()
+        raise
+    binary_dict = {file_path : binary
+                   for (_, file_path, _), binary
+                   in zip(loose_output_list, binaries)}
+
+    # Commit the renames and writes, collecting the log records into
+    #  one journal batch.
+    written_count = 0
+    unchanged_count = 0
+    removed_count = Removed_prior_loose_count
+    Log_New.Start_Journal_Batch()
+    try:
+        # Remove kept files from the prior run that are no longer being
+        #  output, and rename back the files they replaced.
+        # This is done first, so that the restored files are treated
+        #  as conflicts below if needed.
+        for path in sorted(Kept_prior_loose_paths - set(binary_dict)):
+            os.remove(path)
+            Log_New.Forget_File_Path_Written(path)
+            removed_count += 1
+            for original_path in [path, Unpacked_Path_to_Packed_Path(path)]:
+                if original_path not in Kept_prior_renamed_dict:
+                    continue
+                if not os.path.exists(original_path):
+                    os.rename(Kept_prior_renamed_dict[original_path],
+                              original_path)
+                    Log_New.Forget_File_Path_Renamed(original_path)
+
+        for file_object, file_path, for_catalog in output_list:
+
+            # Rename any conflicting files, of same name or pck version.
+            # These should never be old versions of the customize output,
+            #  since the Cleanup call handled them.
+            file_path_pck = Unpacked_Path_to_Packed_Path(file_path)
+            for conflict_path in [file_path, file_path_pck]:
+                # Skip if None (for files with no packed version).
+                if conflict_path == None:
+                    continue
+
+                # Skip if no such file exists.
+                if not os.path.exists(conflict_path):
+                    continue
+
+                # Skip kept files from the prior run, which are updated
+                #  in place.
+                if conflict_path in Kept_prior_loose_paths:
+                    continue
+
+                # Get the backup path name.
+                backup_path = Get_Backed_Up_Sys_Path(conflict_path)
+                # Delete any old backup (this should be more or less safe,
+                #  hopefully, if other checks were good.)
+                if os.path.exists(backup_path):
+                    os.remove(backup_path)
+                # Do the rename.
+                os.rename(conflict_path, backup_path)
+
+                # Record this to the log.
+                Log_New.Record_File_Path_Renamed(conflict_path, backup_path)
+
+            # Leave unchanged files alone; their log records were
+            #  carried over already.
+            if not for_catalog and binary_dict[file_path] == None:
+                unchanged_count += 1
+
+            elif not for_catalog:
+                # Move the finished file into place.
+                os.replace(Get_Temp_Sys_Path(file_path), file_path)
+                written_count += 1
+
+                # Add this to the log, post-move for correct stats; the
+                #  hash comes from the written binary.
+                Log_New.Record_File_Path_Written(
+                    file_path, binary = binary_dict[file_path])
+
+    finally:
+        # Record whatever was done, even if something failed partway,
+        #  and clear out any temp files that were not moved into place.
+        Log_New.Commit_Journal_Batch()
+        Remove_Temp_Files()
+
+    if loose_output_list or removed_count:
+        line = 'Loose files: {} written, {} unchanged, {} removed.'.format(
+            written_count, unchanged_count, removed_count)
+        Write_Summary_Line(line)
+        if Settings.verbose:
+            print(line)
 
 
     # If anything was added to the cat_writer, do its write.
     if cat_writer.game_files:
         cat_writer.Write()
+        if cat_writer.kept_prior and Settings.verbose:
+            print('Catalog {} unchanged from the prior run.'.format(cat_path))
 
         # Log both the cat and dat files as written.
-        Log_New.Record_File_Path_Written(cat_path)
-        Log_New.Record_File_Path_Written(cat_path.replace('.cat','.dat'))
+        # The writer hashed these as they were written.
+        Log_New.Record_File_Path_Written(
+            cat_path, file_hash = cat_writer.cat_hash)
+        Log_New.Record_File_Path_Written(
+            cat_path.replace('.cat','.dat'), file_hash = cat_writer.dat_hash)
+        Log_New.Record_Catalog_Manifest(cat_path, cat_writer.manifest)
+
+    # Otherwise, if a prior catalog was kept, it is no longer wanted.
+    elif Kept_prior_cat_path != None:
+        for path in [Kept_prior_cat_path,
+                     Kept_prior_cat_path.replace('.cat','.dat')]:
+            if os.path.exists(path):
+                os.remove(path)
+            Log_New.Forget_File_Path_Written(path)
+
+    # Record this run's results for reuse.
+    Run_Cache.Store(output_list)
+
+    # Compact everything into the log file, clearing the journal.
+    Log_New.Store()
+    return
 
-        # Refresh the log file.
-        Log_New.Store()
 
-    return
+def Close():
+    '''
+    Release any source files held open during the run, such as
+    memory mapped dat files. This should be called at the end of a run.
+    '''
+    Source_Reader.Close()
 
 
 def Copy_File(
@@ -604,9 +868,13 @@ def Copy_File(
 
     # Get the path for where to find the source file, and load
     #  its binary.
-    with open(Virtual_Path_to_Project_Source_Path(source_virtual_path), 'rb') as file:
+    source_path = Virtual_Path_to_Project_Source_Path(source_virtual_path)
+    with open(source_path, 'rb') as file:
         source_binary = file.read()
 
+    # Note the source contents for the run cache.
+    Run_Cache.Record_Project_File_Load(source_path)
+
     # Create a generic game object for this, using the dest path.
     Add_File(Misc_File(virtual_path = dest_virtual_path, 
                        binary = source_binary))
@@ -0,0 +1,166 @@
+'''
+Support for caching decompressed pck payloads between runs.
+
+Packed files in the game catalogs (eg. types/TShips.pck, or the large
+maps/x3_universe.pck) get gunzipped on every run, even though the base
+game and mod catalogs rarely change. This cache stores decompressed
+payloads as individual files in a folder under the log folder, keyed
+on the catalog entry location and the cat/dat modification times, so
+that warm runs can skip both the dat read and the decompression.
+
+The cache has a size cap; when exceeded, the least recently used
+payloads (by file modification time, refreshed on each hit) are removed.
+
+Lazily loaded files may be decompressed, and so cached, from worker
+threads (eg. during threaded writeout or extraction), so accesses
+are serialized with a lock.
+'''
+import os
+import hashlib
+import threading
+from ..Common.Settings import Settings
+from .File_Paths import *
+
+
+class Payload_Cache:
+    '''
+    Cache of decompressed catalog payloads.
+
+    Attributes:
+    * folder
+      - String, path to the folder holding cached payload files.
+    * max_bytes
+      - Int, maximum total size of cached payloads.
+    * file_size_dict
+      - Dict, keyed by cached file name, holding its size in bytes.
+      - Filled in from the folder contents on the first access.
+    * total_bytes
+      - Int, summed size of all cached payload files.
+    * cat_stamp_dict
+      - Dict, keyed by cat file path, holding a string stamp made from
+        the cat and dat modification times, so they are only checked
+        once per run.
+    * lock
+      - threading.Lock, held during Get and Set, covering the size
+        records, the stamps, and the cache folder contents.
+    '''
+    def __init__(s):
+        s.folder = Settings.Get_Payload_Cache_Folder()
+        s.max_bytes = int(Settings.payload_cache_max_mb * 1024 * 1024)
+        s.file_size_dict = None
+        s.total_bytes = 0
+        s.cat_stamp_dict = {}
+        s.lock = threading.Lock()
+
+
+    def _Scan(s):
+        '''
+        Record the sizes of existing cached files, if not done already.
+        Should be called with the lock held.
+        '''
+        if s.file_size_dict != None:
+            return
+        s.file_size_dict = {}
+        if not os.path.exists(s.folder):
+            os.makedirs(s.folder)
+        for entry in os.scandir(s.folder):
+            if entry.is_file() and entry.name.endswith('.bin'):
+                s.file_size_dict[entry.name] = entry.stat().st_size
+        s.total_bytes = sum(s.file_size_dict.values())
+        # The cap may have been lowered since the last run.
+        if s.total_bytes > s.max_bytes:
+            s._Evict()
+        return
+
+
+    def _Get_File_Name(s, cat_path, offset, size):
+        '''
+        Returns the cache file name for a catalog entry.
+        '''
+        if cat_path not in s.cat_stamp_dict:
+            cat_stat = os.stat(cat_path)
+            dat_stat = os.stat(cat_path.replace('.cat','.dat'))
+            s.cat_stamp_dict[cat_path] = '{}|{}|{}'.format(
+                System_Path_to_Relative_Path(cat_path),
+                cat_stat.st_mtime_ns,
+                dat_stat.st_mtime_ns)
+        key = '{}|{}|{}'.format(s.cat_stamp_dict[cat_path], offset, size)
+        return hashlib.sha1(key.encode()).hexdigest() + '.bin'
+
+
+    def Get(s, cat_path, offset, size):
+        '''
+        Returns the cached decompressed binary for the catalog entry at
+        the given dat offset and size, or None if not cached.
+        '''
+        with s.lock:
+            s._Scan()
+            file_name = s._Get_File_Name(cat_path, offset, size)
+            if file_name not in s.file_size_dict:
+                return None
+            path = os.path.join(s.folder, file_name)
+            try:
+                with open(path, 'rb') as file:
+                    binary = file.read()
+                # Refresh the modification time, for lru eviction.
+                os.utime(path)
+            except OSError:
+                # Treat as a miss if the file went missing somehow.
+                return None
+        return binary
+
+
+    def Set(s, cat_path, offset, size, binary):
+        '''
+        Record the decompressed binary for a catalog entry, evicting
+        older entries if the size cap is exceeded.
+        Payloads larger than the cap are not cached.
+        '''
+        if len(binary) > s.max_bytes:
+            return
+        with s.lock:
+            s._Scan()
+            file_name = s._Get_File_Name(cat_path, offset, size)
+            path = os.path.join(s.folder, file_name)
+
+            # Write to a temp file and move it into place, so a partial
+            #  file is never picked up.
+            temp_path = path + '.tmp'
+            with open(temp_path, 'wb') as file:
+                file.write(binary)
+            os.replace(temp_path, path)
+
+            s.total_bytes += len(binary) - s.file_size_dict.get(file_name, 0)
+            s.file_size_dict[file_name] = len(binary)
+
+            if s.total_bytes > s.max_bytes:
+                s._Evict(keep = file_name)
+        return
+
+
+    def _Evict(s, keep = None):
+        '''
+        Remove the least recently used cached files until under the
+        size cap, never removing the file named by keep.
+        Should be called with the lock held.
+        '''
+        # Sort by modification time, oldest first.
+        mtime_name_list = []
+        for file_name in s.file_size_dict:
+            if file_name == keep:
+                continue
+            path = os.path.join(s.folder, file_name)
+            try:
+                mtime_name_list.append((os.stat(path).st_mtime_ns, file_name))
+            except OSError:
+                mtime_name_list.append((0, file_name))
+        mtime_name_list.sort()
+
+        for _, file_name in mtime_name_list:
+            if s.total_bytes <= s.max_bytes:
+                break
+            path = os.path.join(s.folder, file_name)
+            if os.path.exists(path):
+                os.remove(path)
+            s.total_bytes -= s.file_size_dict.pop(file_name)
+        return
@@ -0,0 +1,446 @@
+'''
+Support for reusing the outputs of a whole prior run, when the same
+transforms are called with the same arguments on the same source files.
+
+Scripts are often rerun unchanged against an unchanged game install,
+in which case every transform recomputes the same results. When the
+run cache is enabled, each transform call is recorded with its name and
+argument repr, along with hashes of the source files it loaded through
+Load_File or read from the project folders (patches, copied files), and
+any summary lines it wrote. The modified files are saved with the record
+when they are written out.
+
+On the next run, transform calls are deferred while they match the
+prior record in order. When the script finishes, before Cleanup moves
+any prior outputs, if every call matched and the source files still
+hash the same, the recorded output files are restored in place of
+running the transforms. Otherwise, the deferred calls are run in order
+as normal, at the point of mismatch or at the end of the transforms.
+
+Deferring is stopped, and the run not recorded, if a transform is not
+cacheable (see Transform_Wrapper), if its arguments have no stable repr,
+or if the script loads files directly instead of through transforms.
+
+Note: the record is keyed on the customizer version and settings, not
+on the transform code itself, so the cache should be cleared (or not
+used) when editing transforms.
+'''
+import os
+import json
+import hashlib
+from ..Common.Settings import Settings
+from . import Logs
+from .Logs import Write_Summary_Line
+from .File_Types import Misc_File
+
+
+class Run_Cache_class:
+    '''
+    Records transform calls for the run cache, and handles deferring
+    and restoring them.
+
+    Attributes:
+    * prior_record
+      - Dict, the record from the prior run, or None if there is none.
+    * prior_record_loaded
+      - Bool, True once the prior record was looked up; this is done
+        on first use, after paths are set up.
+    * invocation_list
+      - List of dicts, one per transform call run so far this run,
+        holding 'name', 'args', 'file_hashes', 'project_file_hashes'
+        and 'summary' entries.
+    * current_invocation
+      - Dict from invocation_list for the transform currently running,
+        or None when outside a transform.
+    * deferred_list
+      - List of tuples of (name, args repr, run function, args, kwargs)
+        for transform calls matching the prior record which have not
+        been run yet.
+    * matching
+      - Bool, True while all transform calls so far matched the prior
+        record, so calls are still being deferred.
+    * disabled
+      - Bool, set when something that cannot be cached happened; the
+        run will no longer defer calls and will not be recorded.
+    * finished
+      - Bool, set once Finish has been called.
+    * restored
+      - Bool, True if Finish restored the prior outputs.
+    * output_names
+      - List of virtual paths of files modified by the transforms,
+        captured by Finish, to be saved with the record.
+    '''
+    def __init__(s):
+        s.prior_record = None
+        s.prior_record_loaded = False
+        s.invocation_list = []
+        s.current_invocation = None
+        s.deferred_list = []
+        s.matching = True
+        s.disabled = False
+        s.finished = False
+        s.restored = False
+        s.output_names = []
+
+
+    def Is_Enabled(s):
+        '''
+        Returns True if transform calls should go through the cache.
+        Test runs (without writeback) always run transforms.
+        '''
+        return (Settings.use_run_cache
+                and not Settings.disable_cleanup_and_writeback
+                and not s.disabled
+                and not s.finished)
+
+
+    def _Get_Record_Path(s):
+        '''
+        Returns the path to the run record json file.
+        '''
+        return os.path.join(Settings.Get_Run_Cache_Folder(), 'run_cache.json')
+
+
+    def _Get_Output_Path(s, binary_hash):
+        '''
+        Returns the path to a cached output file, by its hash.
+        '''
+        return os.path.join(Settings.Get_Run_Cache_Folder(),
+                            binary_hash + '.bin')
+
+
+    def _Get_Prior_Record(s):
+        '''
+        Returns the prior run record, loading it if needed.
+        '''
+        if not s.prior_record_loaded:
+            s.prior_record_loaded = True
+            path = s._Get_Record_Path()
+            if os.path.exists(path):
+                try:
+                    with open(path, 'r') as file:
+                        s.prior_record = json.load(file)
+                except ValueError:
+                    # Treat a damaged record as missing.
+                    s.prior_record = None
+        return s.prior_record
+
+
+    def _Get_Key(s):
+        '''
+        Returns a string capturing the customizer version and the
+        settings, which must match for a prior record to be reused.
+        '''
+        import Change_Log
+        # Verbosity does not change outputs.
+        settings_items = sorted((k, repr(v)) for k, v in vars(Settings).items()
+                                if k != 'verbose')
+        return repr((Change_Log.Get_Version(), settings_items))
+
+
+    @staticmethod
+    def _Get_Args_Repr(args, kwargs):
+        '''
+        Returns a repr string of the transform args, or None if they do
+        not have a stable repr (eg. functions or other objects that
+        repr with their memory address).
+        '''
+        args_repr = repr((args, sorted(kwargs.items())))
+        if ' at 0x' in args_repr:
+            return None
+        return args_repr
+
+
+    @staticmethod
+    def _Get_File_Hash(game_file):
+        '''
+        Returns a hash of the source contents of a Game_File, or None
+        if the file was not found.
+        '''
+        if game_file == None:
+            return None
+        binary = game_file.Get_Source_Binary()
+        if binary == None:
+            binary = game_file.Get_Binary()
+        return hashlib.sha256(binary).hexdigest()
+
+
+    @staticmethod
+    def _Get_Path_Hash(file_path):
+        '''
+        Returns a hash of the contents of a file on disk, or None if
+        the file was not found.
+        '''
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'rb') as file:
+            return hashlib.sha256(file.read()).hexdigest()
+
+
+    def Call(s, func, run_function, args, kwargs):
+        '''
+        Handle a call to a transform, either deferring it or running it.
+
+        * func
+          - The transform function, as captured by Transform_Wrapper.
+        * run_function
+          - Function which runs the transform, taking the args and kwargs.
+        '''
+        if not s.Is_Enabled():
+            return run_function(*args, **kwargs)
+
+        # Transforms called from within other transforms are part of
+        #  the outer call.
+        if s.current_invocation != None:
+            return run_function(*args, **kwargs)
+
+        name = func.__name__
+        args_repr = s._Get_Args_Repr(args, kwargs)
+
+        # Stop caching for calls that cannot be cached.
+        if not func._cacheable or args_repr == None:
+            s.Disable()
+            return run_function(*args, **kwargs)
+
+        # Defer the call if it matches the next prior call.
+        if s.matching:
+            prior_record = s._Get_Prior_Record()
+            index = len(s.deferred_list)
+            if (prior_record != None
+            and index < len(prior_record['invocations'])
+            and prior_record['invocations'][index]['name'] == name
+            and prior_record['invocations'][index]['args'] == args_repr):
+                s.deferred_list.append(
+                    (name, args_repr, run_function, args, kwargs))
+                return None
+            s.Flush()
+
+        return s._Run(name, args_repr, run_function, args, kwargs)
+
+
+    def _Run(s, name, args_repr, run_function, args, kwargs):
+        '''
+        Run a transform call, recording the files it loads and the summary
+        lines it writes.
+        '''
+        invocation = {
+            'name'                : name,
+            'args'                : args_repr,
+            'file_hashes'         : {},
+            'project_file_hashes' : {},
+            'summary'             : '',
+            }
+        s.invocation_list.append(invocation)
+        s.current_invocation = invocation
+        Logs.Summary_capture = []
+        try:
+            return run_function(*args, **kwargs)
+        finally:
+            invocation['summary'] = ''.join(Logs.Summary_capture)
+            Logs.Summary_capture = None
+            s.current_invocation = None
+
+
+    def Flush(s):
+        '''
+        Stop deferring calls, and run any that were deferred.
+        '''
+        s.matching = False
+        deferred_list = s.deferred_list
+        s.deferred_list = []
+        for call in deferred_list:
+            s._Run(*call)
+        return
+
+
+    def Disable(s):
+        '''
+        Run any deferred calls, and stop using the cache for this run.
+        '''
+        s.Flush()
+        s.disabled = True
+        return
+
+
+    def Check_Load(s):
+        '''
+        Called on any Load_File. Loads made outside of any transform
+        disable the cache, since whatever the script does with the file
+        is not recorded.
+        '''
+        if s.Is_Enabled() and s.current_invocation == None:
+            s.Disable()
+        return
+
+
+    def Record_File_Load(s, file_name, game_file):
+        '''
+        Record a file loaded from its source by Load_File, or None if
+        the file was not found.
+        '''
+        if s.Is_Enabled() and s.current_invocation != None:
+            s.current_invocation['file_hashes'][file_name] = (
+                s._Get_File_Hash(game_file))
+        return
+
+
+    def Record_Project_File_Load(s, file_path):
+        '''
+        Record a file read from the project folders rather than through
+        Load_File, such as a patch or a file to copy.
+        '''
+        if s.Is_Enabled() and s.current_invocation != None:
+            s.current_invocation['project_file_hashes'][file_path] = (
+                s._Get_Path_Hash(file_path))
+        return
+
+
+    def Finish(s, File_dict, Add_File):
+        '''
+        Called when transforms are done, before Cleanup. Restores
+        the prior outputs into the File_dict if all calls matched the
+        prior record and the source files are unchanged, else runs any
+        deferred calls.
+
+        * File_dict
+          - Dict of loaded Game_Files, keyed by virtual path.
+        * Add_File
+          - Function to add a Game_File to the File_dict.
+        '''
+        if not s.Is_Enabled():
+            s.finished = True
+            return
+        if s.matching and s._Prior_Record_Matches():
+            s._Restore(Add_File)
+        else:
+            s.Flush()
+
+        # Note which files the transforms modified, to record them.
+        s.output_names = [game_file.virtual_path
+                          for game_file in File_dict.values()
+                          if game_file.modified]
+        s.finished = True
+        return
+
+
+    def _Prior_Record_Matches(s):
+        '''
+        Returns True if the deferred calls and current sources match
+        the prior record, and its output files are present.
+        '''
+        # Avoid circular import.
+        from .Source_Reader import Source_Reader
+
+        prior_record = s._Get_Prior_Record()
+        if prior_record == None:
+            return False
+        if len(s.deferred_list) != len(prior_record['invocations']):
+            return False
+        if prior_record['key'] != s._Get_Key():
+            return False
+
+        for invocation in prior_record['invocations']:
+            for file_name, file_hash in invocation['file_hashes'].items():
+                game_file = Source_Reader.Read(
+                    file_name, error_if_not_found = False)
+                if s._Get_File_Hash(game_file) != file_hash:
+                    return False
+            # Records from older versions may lack project files.
+            for file_path, file_hash in invocation.get(
+                    'project_file_hashes', {}).items():
+                if s._Get_Path_Hash(file_path) != file_hash:
+                    return False
+
+        for output in prior_record['outputs']:
+            if not os.path.exists(s._Get_Output_Path(output['hash'])):
+                return False
+        return True
+
+
+    def _Restore(s, Add_File):
+        '''
+        Restore the prior outputs and summary lines, in place of running
+        the deferred calls.
+        '''
+        prior_record = s._Get_Prior_Record()
+        s.deferred_list = []
+
+        for output in prior_record['outputs']:
+            with open(s._Get_Output_Path(output['hash']), 'rb') as file:
+                binary = file.read()
+            # Cached files hold their final written contents, so can be
+            #  written out directly.
+            Add_File(Misc_File(
+                binary = binary,
+                virtual_path = output['virtual_path']))
+
+        for invocation in prior_record['invocations']:
+            if invocation['summary']:
+                Write_Summary_Line(invocation['summary'], newline = False)
+            if Settings.verbose:
+                print('Reused cached results of {}'.format(invocation['name']))
+
+        # The record stays the same.
+        s.invocation_list = prior_record['invocations']
+        s.restored = True
+        return
+
+
+    def Store(s, output_list):
+        '''
+        Save the record of this run, along with its output files.
+
+        * output_list
+          - List of tuples of (Game_File, output path, for_catalog) for
+            the files written out, as used by Write_Files.
+        '''
+        if not (s.finished and Settings.use_run_cache
+                and not s.disabled and not s.restored):
+            return
+
+        folder = Settings.Get_Run_Cache_Folder()
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        # Save the outputs made by transforms, as their written binary.
+        output_name_set = set(s.output_names)
+        outputs = []
+        for game_file, file_path, for_catalog in output_list:
+            if game_file.virtual_path not in output_name_set:
+                continue
+            if for_catalog:
+                binary = game_file.Get_Binary()
+            else:
+                binary = game_file.Get_Loose_Binary()
+            binary_hash = hashlib.sha256(binary).hexdigest()
+            path = s._Get_Output_Path(binary_hash)
+            if not os.path.exists(path):
+                with open(path + '.tmp', 'wb') as file:
+                    file.write(binary)
+                os.replace(path + '.tmp', path)
+            outputs.append({
+                'virtual_path' : game_file.virtual_path,
+                'hash'         : binary_hash,
+                })
+
+        record = {
+            'key'         : s._Get_Key(),
+            'invocations' : s.invocation_list,
+            'outputs'     : outputs,
+            }
+        path = s._Get_Record_Path()
+        with open(path + '.tmp', 'w') as file:
+            json.dump(record, file, indent = 2)
+        os.replace(path + '.tmp', path)
+
+        # Remove output files no longer referenced.
+        hash_set = set(x['hash'] for x in outputs)
+        for entry in os.scandir(folder):
+            if (entry.name.endswith('.bin')
+            and entry.name[:-len('.bin')] not in hash_set):
+                os.remove(entry.path)
+        return
+
+
+# Single, global copy of the cache.
+Run_Cache = Run_Cache_class()
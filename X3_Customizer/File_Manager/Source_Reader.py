@@ -12,9 +12,31 @@ from collections import OrderedDict
 from .File_Types import *
 from .File_Paths import *
 from .Cat_Reader import *
+from .Cat_Index_Cache import Cat_Index_Cache
+from .Payload_Cache import Payload_Cache
+from .Folder_Listing import Folder_Listing
+from .VFS_Index import *
+from . import Xor_Codec
 from .. import Common
 import gzip
 
+
+# Lowercase names of the top level folders holding game files that
+#  transforms read, which have their loose files indexed at startup.
+# Other folders (eg. mods, soundtrack, mov) can be large, and are only
+#  indexed when a file under them is requested.
+Loose_File_Folders = [
+    'cutscenes',
+    'director',
+    'l',
+    'maps',
+    'objects',
+    's',
+    'scripts',
+    't',
+    'types',
+    ]
+
 '''
 Notes on X3 Plugin Manager generated TWareT.pck file:
     This file does not work with standard gzip, though does appear to
@@ -60,9 +82,11 @@ class Source_Reader_class:
     by matching a hash in the prior run's log) will be skipped.
     Files which were backed up on a prior run will be checked.
     
-    Cat files will be parsed as they are reached in the search order,
-    not before, to avoid excessive startup time when deeper cat files
-    may never be needed.
+    The source folder, loose files and all cat files are indexed during
+    Init into a merged VFS_Index, so that later lookups do not need to
+    check for loose files or search through the cats. Loose files
+    outside the usual game file folders are indexed on first lookup.
+    Cat parsing is kept cheap on later runs by the cat index cache.
 
     Attributes:
     * source_file_path_dict
@@ -78,8 +102,9 @@ class Source_Reader_class:
         by priority, where the first entry is the highest priority cat.
       - Early catalogs are from the addon folder, later catalogs are from
         the base x3 folder.
-      - Dict entries are initially None, and get replaced with Catalog_Files
-        as the cats are searched.
+    * vfs_index
+      - VFS_Index, holding the highest priority source folder, loose
+        file, or catalog entry for each virtual path.
     * file_to_cat_dict
       - Dict, keyed by file name, with the Cat_Reader object that holds
         the file with the highest priority.
@@ -96,6 +121,21 @@ class Source_Reader_class:
         cat is deleted normally).
       - Any new catalog file will always be at least 2 steps higher than
         the prior cat file in this case.
+    * cat_index_cache
+      - Cat_Index_Cache holding parsed cat indexes from prior runs, used
+        to skip cat decoding when the cat files are unchanged.
+      - None if caching is disabled in the Settings.
+    * folder_listing
+      - Folder_Listing used to check for loose files and cats, to
+        avoid repeated stat calls.
+    * payload_cache
+      - Payload_Cache holding decompressed pck files from catalogs,
+        used to skip decompression on later runs.
+      - None if caching is disabled in the Settings.
+    * loose_indexed_folders
+      - Set of lowercase names of top level folders which have had
+        their loose files indexed.
+      - None if loose files are ignored.
     '''
     def __init__(s):
         s.source_file_path_dict = {}
@@ -103,6 +143,11 @@ class Source_Reader_class:
         s.file_to_cat_dict = {}
         s.prior_customizer_cat_path = None
         s.prior_customizer_cat_needs_dummy = False
+        s.cat_index_cache = None
+        s.payload_cache = None
+        s.folder_listing = Folder_Listing()
+        s.vfs_index = VFS_Index()
+        s.loose_indexed_folders = None
 
     def Init(s):
         '''
@@ -121,29 +166,16 @@ class Source_Reader_class:
             #  eg. if a transform was formerly run on a file but then commented
             #  out, need to overwrite the previous results with a non-transformed
             #  version of the file.
-            # Uses os.walk to go through the source folder and all subfolders.
-            # Note: dir_path is the relative dir from the source folder, including
-            #  the source folder. This could be removed by doing a nested walk
-            #  from each folder in the source_folder, though this wouldn't work if
-            #  the user just wanted to give a basic list of files to transform and
-            #  manually handle moving around outputs.
-            #  Edits to the path can remove the first folder, though are clumsy
-            #  to implement.
-            #  The working directory could be moved to the source directory
-            #  temporarily for this, though starting walk using '.' will have
-            #  that as the start of the path still (which might be fine).
-            original_cwd = os.getcwd()
-            os.chdir(source_folder)
-
-            for dir_path, folder_names, file_names in os.walk('.'):
-                # Loop over the file names.
-                for file_name in file_names:
-                    # Record the absolute path.
-                    s.Record_New_Source_File( os.path.abspath(
-                        os.path.join(dir_path, file_name)))
-
-            # Restore the working directory.
-            os.chdir(original_cwd)
+            # The listing walks the source folder and all subfolders,
+            #  giving absolute paths.
+            for sys_path in s.folder_listing.Walk_Files(source_folder):
+                s.Record_New_Source_File(sys_path)
+
+        # Index loose files in the game folders, unless this is disabled
+        #  in the settings.
+        if Settings.ignore_loose_files == False:
+            s.loose_indexed_folders = set()
+            s.Index_Loose_Files(Loose_File_Folders)
          
         
         # Search for cat files the game will recognize.
@@ -168,7 +200,7 @@ class Source_Reader_class:
                 cat_path = os.path.join(path, cat_name)
 
                 # Stop if the cat file is not found.
-                if not os.path.exists(cat_path):
+                if not s.folder_listing.Exists(cat_path):
                     break
 
                 # Record the path if the cat is not from a prior run.
@@ -203,9 +235,27 @@ class Source_Reader_class:
         #  knowing which pair a user might have selected, so mods applied
         #  in that way will be ignored for now.
 
-        # Fill in dict entries with the list paths, in reverse order.
-        for path in reversed(cat_dir_list_low_to_high):
-            s.catalog_file_dict[path] = None
+        # Load any cached cat indexes from a prior run.
+        if Settings.use_cat_index_cache:
+            s.cat_index_cache = Cat_Index_Cache()
+            s.cat_index_cache.Load()
+
+        if Settings.use_payload_cache:
+            s.payload_cache = Payload_Cache()
+
+        # Fill in dict entries with the list paths, in reverse order,
+        #  parsing the cats and adding them to the vfs index.
+        for priority, path in enumerate(reversed(cat_dir_list_low_to_high)):
+            cat_reader = Cat_Reader(path, s.cat_index_cache)
+            s.catalog_file_dict[path] = cat_reader
+            s.vfs_index.Add_Cat(path, cat_reader, Priority_cat_start + priority)
+
+        # Note any files with conflicting case in their paths.
+        s.vfs_index.Log_Case_Variants()
+
+        # Optionally note which files are overriding others.
+        if Settings.write_file_source_paths_to_message_log:
+            s.vfs_index.Log_Overrides()
             
         return
 
@@ -230,13 +280,150 @@ class Source_Reader_class:
         return next_index_str
 
 
+    def Close(s):
+        '''
+        Close any dat files held open by the cat readers.
+        This should be called at the end of a run, after all source
+        files have been read.
+        '''
+        for cat_reader in s.catalog_file_dict.values():
+            if cat_reader != None:
+                cat_reader.Close()
+
+        # Save any newly parsed cat indexes, dropping cats no longer
+        #  in use.
+        if s.cat_index_cache != None:
+            s.cat_index_cache.Store(
+                cat_paths_to_keep = list(s.catalog_file_dict.keys()))
+
+
+    def Index_Loose_Files(s, folder_names):
+        '''
+        Adds loose files from the addon and base x3 folders to the vfs
+        index, below the source folder and above the catalogs.
+        Files written by the customizer on a prior run are skipped, and
+        any original files they replaced (which were renamed) are used
+        in their place.
+
+        * folder_names
+          - List of lowercase names of top level folders to index,
+            eg. 'types'. Folders already indexed are skipped.
+        '''
+        folder_names = set(folder_names) - s.loose_indexed_folders
+        if not folder_names:
+            return
+        s.loose_indexed_folders.update(folder_names)
+
+        # Paths that were renamed on a prior run, and the renamed files,
+        #  limited to those in the requested folders.
+        renamed_path_dict = {
+            original_sys_path : renamed_sys_path
+            for original_sys_path, renamed_sys_path
+            in Log_Old.Get_Renamed_File_Paths()
+            if s._Get_Loose_Virtual_Path(original_sys_path
+                                         ).split('/')[0].lower()
+            in folder_names}
+        renamed_sys_paths = set(renamed_path_dict.values())
+
+        # Folders that do not hold game files are skipped, as is the addon
+        #  folder when walking the base folder, since it is walked
+        #  separately.
+        skip_folders = [Settings.Get_Addon_Folder(),
+                        os.path.dirname(Settings.Get_Log_File_Path())]
+        if Settings.Get_Source_Folder() != None:
+            skip_folders.append(Settings.Get_Source_Folder())
+
+        # The addon folder may be the base folder, eg. for vanilla TC.
+        root_folders = [Settings.Get_Addon_Folder()]
+        if Settings.Get_X3_Folder() != Settings.Get_Addon_Folder():
+            root_folders.append(Settings.Get_X3_Folder())
+
+        for root_folder in root_folders:
+            # Only walk the requested top level folders.
+            try:
+                with os.scandir(root_folder) as entries:
+                    folder_paths = [
+                        entry.path for entry in entries
+                        if entry.is_dir() and not entry.is_symlink()
+                        and entry.name.lower() in folder_names]
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+            for folder_path in folder_paths:
+                for sys_path in s.folder_listing.Walk_Files(
+                        folder_path, skip_folders = skip_folders):
+                    if (sys_path in renamed_sys_paths
+                    or Log_Old.File_Is_From_Last_Run(sys_path)):
+                        continue
+                    s._Add_Loose_Entry(sys_path)
+
+        # Renamed files stand in for their original paths, if those
+        #  hold a prior run output or are gone.
+        for original_sys_path, renamed_sys_path in renamed_path_dict.items():
+            if (s.folder_listing.Exists(renamed_sys_path)
+            and (Log_Old.File_Is_From_Last_Run(original_sys_path)
+                 or not s.folder_listing.Exists(original_sys_path))):
+                s._Add_Loose_Entry(original_sys_path, renamed_sys_path)
+        return
+
+
+    def _Add_Loose_Entry(s, sys_path, read_sys_path = None):
+        '''
+        Add a loose file to the vfs index, if the game would read it.
+
+        * sys_path
+          - String, system path where the game reads the file.
+        * read_sys_path
+          - Optional string, system path to read the file contents from
+            instead, eg. for a renamed file.
+        '''
+        virtual_path = s._Get_Loose_Virtual_Path(sys_path)
+
+        # Files at the top of the folder (eg. the cats themselves) are
+        #  not game files, and lookups only map some folders to the
+        #  addon, so only entries that round trip would ever be found.
+        if '/' not in virtual_path or (
+                os.path.normcase(Virtual_Path_to_System_Path(virtual_path))
+                != os.path.normcase(sys_path)):
+            return
+
+        s.vfs_index.Add_Entry(VFS_Entry(
+            virtual_path = virtual_path,
+            source_type  = 'loose',
+            sys_path     = read_sys_path if read_sys_path != None else sys_path,
+            priority     = Priority_loose,
+            packed       = Is_Packed_Path(virtual_path),
+            ))
+        return
+
+
+    def _Get_Loose_Virtual_Path(s, sys_path):
+        '''
+        Returns the virtual path for a loose file in the game folders,
+        relative to the addon folder if under it, else to the base folder.
+        '''
+        for root_folder in [Settings.Get_Addon_Folder(), Settings.Get_X3_Folder()]:
+            relative_path = os.path.relpath(sys_path, root_folder)
+            if relative_path.split(os.path.sep)[0] != os.pardir:
+                break
+        return relative_path.replace(os.path.sep, '/')
+
+
     def Record_New_Source_File(s, sys_path):
         '''
         Records a new file in the source folder, placed there after init.
         The provided path should be absolute.
         '''
+        s.folder_listing.Add_File(sys_path)
         virtual_path = System_Path_to_Virtual_Path(sys_path)
         s.source_file_path_dict[virtual_path] = sys_path
+        s.vfs_index.Add_Entry(VFS_Entry(
+            virtual_path = virtual_path,
+            source_type  = 'source',
+            sys_path     = sys_path,
+            priority     = Priority_source,
+            packed       = Is_Packed_Path(virtual_path),
+            ))
         
 
     def Decompress(s, file_binary, virtual_path):
@@ -267,7 +454,7 @@ class Source_Reader_class:
             #  to get a magic value to Xor with all other bytes, then
             #  that is all decompressed with gzip.
             magic = file_binary[0] ^ 0xC8
-            file_binary = bytearray(x ^ magic for x in file_binary)
+            file_binary = Xor_Codec.Xor_Constant(file_binary, magic)
 
             try:
                 # Toss the first byte for this.
@@ -284,6 +471,22 @@ class Source_Reader_class:
         return decompressed_binary
 
 
+    @staticmethod
+    def Gzip_Is_Nonempty(file_binary):
+        '''
+        Returns True if the given binary is in the plain gzip format and
+        its trailer indicates nonempty contents, without decompressing.
+        Returns False otherwise, including for x2 style packed files,
+        in which case decompression is needed to know.
+        '''
+        # Gzip data starts with a 2-byte magic, and ends with the
+        #  uncompressed size (mod 2^32) as 4 little endian bytes.
+        # Empty contents will always have a 0 size here.
+        return (len(file_binary) >= 18
+                and file_binary[:2] == b'\x1f\x8b'
+                and int.from_bytes(file_binary[-4:], 'little') != 0)
+
+
     def Read(s, 
              virtual_path,
              error_if_not_found = True,
@@ -295,6 +498,7 @@ class Source_Reader_class:
         Contents may be binary or text, depending on the Game_File subclass.
         This will search for packed versions as well, automatically unzipping
          the contents.
+        Unzipping and parsing of contents is delayed until first used.
         If the file contents are empty, this returns None; this may occur
          for LU dummy files.
          
@@ -313,9 +517,6 @@ class Source_Reader_class:
         '''
         # Grab the extension.
         file_extension = virtual_path.rsplit('.',1)[1]
-        # Determine the name for a possibly packed version.
-        # This is None if the file is not expected to be packed.
-        virtual_path_pck = Unpacked_Path_to_Packed_Path(virtual_path)
 
         # Flag to indicate if the binary was loaded from a pck file, and
         #  needs unzipping.
@@ -328,128 +529,65 @@ class Source_Reader_class:
         file_binary = None
         # For debug, the path of the file sourced from, maybe a cat.
         file_source_path = None
-
-        # Check the source folder.
-        # This could do a full path check, but will reuse the parsed
-        #  files found during Init.
-        # Pck takes precedence over other files when X3 loads them.
-        for test_virtual_path in [virtual_path_pck, virtual_path]:
-            # Skip empty packed paths.
-            if test_virtual_path == None:
-                continue
-            # Skip if not found.
-            if test_virtual_path not in s.source_file_path_dict:
-                continue
-
+        # When the payload cache is in use and the file was not in it,
+        #  the (cat path, offset, size) to record the unzipped binary to.
+        payload_cache_key = None
+
+        # Loose files outside the usual game file folders are indexed
+        #  when first requested.
+        if s.loose_indexed_folders != None:
+            s.Index_Loose_Files([virtual_path.split('/')[0].lower()])
+
+        # Look up the highest priority indexed source, from the source
+        #  folder, loose game files, or the cats.
+        # If it was found under the packed name, it needs unzipping.
+        vfs_entry = s.vfs_index.Find(virtual_path)
+
+        # Check the source folder and loose files, which may be renamed
+        #  originals of files replaced on a prior run.
+        # Pck takes precedence over other files when X3 loads them,
+        #  which the index handles.
+        if vfs_entry != None and vfs_entry.source_type in ['source', 'loose']:
             # Open the file and grab the binary data.
             # If this needs to be treated as text, it will be
             #  reinterpretted elsewhere.
-            file_source_path = s.source_file_path_dict[test_virtual_path]
+            file_source_path = vfs_entry.sys_path
             with open(file_source_path, 'rb') as file:
                 file_binary = file.read()
-                # If it was pck, clarify as zipped.
-                file_binary_is_zipped = test_virtual_path == virtual_path_pck
-                
-            # Don't check the other suffix after a match is found.
-            break
-
-
-        # Check for a loose file outside the source folder, unless
-        #  this is disabled in the settings.
-        if file_binary == None and Settings.ignore_loose_files == False:
-            sys_path = Virtual_Path_to_System_Path(virtual_path)
-            sys_path_pck = Unpacked_Path_to_Packed_Path(sys_path)
-
-            # Loop over pck and standard versions.
-            for test_sys_path in [sys_path_pck, sys_path]:
-                # Skip empty packed paths.
-                if test_sys_path == None:
-                    continue
-
-                # Following checks will look for a renamed file or a file with
-                #  the original name.
-                # TODO: consider doing a more generic renamed file check.
-                file_path_to_source = None
-
-                # If the file was not created by the customizer on a previous
-                #  run, and exists, use it.
-                # This allows a user to overwrite a customizer file with a new
-                #  version, and have it get used over any prior backup.
-                if (not Log_Old.File_Is_From_Last_Run(test_sys_path)
-                and os.path.exists(test_sys_path)):
-                    file_path_to_source = test_sys_path
-                
-                # Check if there is a renamed version of the file, if the main
-                #  path was not valid.
-                if file_path_to_source == None:
-                    renamed_sys_path = Log_Old.Get_Renamed_File_Path(test_sys_path)
-                    # Source from the renamed file, if it still exists.
-                    if (renamed_sys_path != None
-                    and os.path.exists(renamed_sys_path)):
-                        file_path_to_source = renamed_sys_path
-                    
-                # If no path found, go to next loop iteration.
-                if file_path_to_source == None:
-                    continue
-
-                # Load from the selected file.
-                file_source_path = file_path_to_source
-                with open(file_path_to_source, 'rb') as file:
-                    file_binary = file.read()
-                    # If it was pck, clarify as zipped.
-                    # (Use the test_sys_path, since the actual path may
-                    #  have a backup extension.)
-                    file_binary_is_zipped = test_sys_path == sys_path_pck
+            # If it was pck, clarify as zipped.
+            # (Use the entry virtual path, since the actual path may
+            #  have a backup extension.)
+            file_binary_is_zipped = (
+                vfs_entry.virtual_path.lower() != virtual_path.lower())
 
 
         # If still no binary found, check the cat/dat pairs.
-        # Special check: if looking for a script, they are never
-        #  in the cat/dats, so can skip checks early.
+        # Scripts are never in the cat/dats, and the index skips them.
         # Note: it is possible unpacked versions of files (with a packed
         #  version) are not recognized in catalogs by the game, but this
         #  will look for them anyway.
         if (file_binary == None
-        and not virtual_path.startswith('scripts/')):
-
-            # Get the cat versions of the file path.
-            cat_path = Virtual_Path_to_Cat_Path(virtual_path)
-            cat_path_pck = Unpacked_Path_to_Packed_Path(cat_path)
-
-            # Loop over the cats in priority order.
-            for cat_file, cat_reader in s.catalog_file_dict.items():
-
-                # If the reader hasn't been created, make it.
-                if cat_reader == None:
-                    cat_reader = Cat_Reader(cat_file)
-                    s.catalog_file_dict[cat_file] = cat_reader
-
-                # Loop over the pck and standard versions.
-                # Note: this is done in the inner loop, checking each cat
-                #  for a pck or non-pck before moving on to the next.
-                # (It is unclear on how the game handles this, though it
-                #  should be fine since the cats are expected to not
-                #  mix packed and unpacked versions.)
-                for test_cat_path in [cat_path_pck, cat_path]:
-                    
-                    # Skip empty packed paths.
-                    if test_cat_path == None:
-                        continue
-
-                    # Check the cat for the file.
-                    file_binary = cat_reader.Read(test_cat_path)
-                    if file_binary == None:
-                        continue
-
-                    # If it returned something, then it matched, so can
-                    #  stop searching.
-                    file_source_path = cat_file
-                    # If it was pck, clarify as zipped.
-                    file_binary_is_zipped = test_cat_path == cat_path_pck
-                    break
-
-                # Stop looping over cats once a match found.
+        and vfs_entry != None
+        and vfs_entry.source_type == 'cat'):
+            file_source_path = vfs_entry.sys_path
+            # If it was pck, clarify as zipped.
+            file_binary_is_zipped = (
+                vfs_entry.virtual_path.lower() != virtual_path.lower())
+
+            # Packed files may have been decompressed on a prior run.
+            if file_binary_is_zipped and s.payload_cache != None:
+                file_binary = s.payload_cache.Get(
+                    vfs_entry.sys_path, vfs_entry.offset, vfs_entry.size)
                 if file_binary != None:
-                    break
+                    file_binary_is_zipped = False
+                else:
+                    # Record the decompressed result once available.
+                    payload_cache_key = (
+                        vfs_entry.sys_path, vfs_entry.offset, vfs_entry.size)
+
+            if file_binary == None:
+                cat_reader = s.catalog_file_dict[vfs_entry.sys_path]
+                file_binary = cat_reader.Read(vfs_entry.cat_path)
 
 
         # If no binary was found, error.
@@ -460,12 +598,27 @@ class Source_Reader_class:
             return None
 
         # Decompress if needed.
+        # This is normally delayed until the file contents are used,
+        #  since many files are only checked for existence or are never
+        #  edited, except when it is unclear if the file is empty.
+        file_binary_loader = None
         if file_binary_is_zipped:
-            file_binary = s.Decompress(file_binary, virtual_path)
+            zipped_binary = file_binary
+            def file_binary_loader():
+                binary = s.Decompress(zipped_binary, virtual_path)
+                if payload_cache_key != None:
+                    s.payload_cache.Set(*payload_cache_key, binary)
+                return binary
+
+            if s.Gzip_Is_Nonempty(zipped_binary):
+                file_binary = None
+            else:
+                file_binary = file_binary_loader()
+                file_binary_loader = None
 
         # If the binary is an empty string, this is an LU dummy file,
         #  so return None.
-        if not file_binary:
+        if file_binary_loader == None and not file_binary:
             return None
 
         # Convert the binary into a Game_File object.
@@ -486,11 +639,21 @@ class Source_Reader_class:
         # Construct the game file.
         # These will also record the path used, to help know where to place
         #  an edited file in the folder structure.
-        game_file = game_file_class(
-            file_binary = file_binary,
-            virtual_path = virtual_path,
-            file_source_path = file_source_path,
-            )
+        # Parsing is delayed until the contents are used.
+        # Note: only xml and txt files may be packed, and their classes
+        #  support the loader.
+        if file_binary_loader != None:
+            game_file = game_file_class(
+                file_binary_loader = file_binary_loader,
+                virtual_path = virtual_path,
+                file_source_path = file_source_path,
+                )
+        else:
+            game_file = game_file_class(
+                file_binary = file_binary,
+                virtual_path = virtual_path,
+                file_source_path = file_source_path,
+                )
 
         if Settings.write_file_source_paths_to_message_log:
             Write_Summary_Line(
@@ -0,0 +1,259 @@
+'''
+Support for a merged index of the game's virtual file system.
+
+Files may be sourced from the user source folder, loose game folders,
+or any number of catalogs, with a priority order between them.
+Rather than probing each of these on every file request, the sources
+are indexed once, recording for each virtual path the highest priority
+source, so lookups (including misses) become simple dict checks.
+
+Lower priority sources that were overridden are also kept, to help
+debug which file is actually getting used.
+
+The game does not care about case in file names, but paths may differ
+in case between the source folder, catalogs, and transform requests.
+Lookups are therefore resolved through a lowercased key, with the
+highest priority source across case variants being used. Entries keep
+their original case, and files are written out using the requested
+case. Paths found with multiple case variants are tracked so they
+can be reported.
+'''
+from ..Common.Settings import Settings
+from .File_Paths import *
+from .Logs import Write_Summary_Line
+
+# Priority values for the source types; cats use the cat priority
+#  offset by the last of these.
+# Lower values take precedence.
+Priority_source = 0
+Priority_loose = 1
+Priority_cat_start = 2
+
+
+class VFS_Entry:
+    '''
+    A single source for a file in the virtual file system.
+
+    Attributes:
+    * virtual_path
+      - String, virtual path of the file as found in its source, which
+        will have a packed extension (eg. pck) if packed.
+    * source_type
+      - String, one of 'source', 'loose', or 'cat'.
+    * sys_path
+      - String, system path to the source or loose file (which may be
+        a renamed original from a prior run), or to the cat file for
+        catalog entries.
+    * cat_path
+      - String, path of the entry within the cat file; None for files
+        not in a cat.
+    * offset
+      - Int, offset of the entry in the dat file; None if not in a cat.
+    * size
+      - Int, size of the entry in the dat file; None if not in a cat.
+    * packed
+      - Bool, True if the file data is gzipped (eg. a pck file).
+    * priority
+      - Int, the source priority; lower values take precedence.
+    '''
+    __slots__ = ('virtual_path', 'source_type', 'sys_path', 'cat_path',
+                 'offset', 'size', 'packed', 'priority')
+
+    def __init__(
+            s,
+            virtual_path,
+            source_type,
+            sys_path,
+            priority,
+            packed = False,
+            cat_path = None,
+            offset = None,
+            size = None,
+        ):
+        s.virtual_path = virtual_path
+        s.source_type = source_type
+        s.sys_path = sys_path
+        s.cat_path = cat_path
+        s.offset = offset
+        s.size = size
+        s.packed = packed
+        s.priority = priority
+
+
+    def __repr__(s):
+        if s.source_type == 'cat':
+            return '{} ({}: {} at {}, {} bytes)'.format(
+                s.virtual_path, s.sys_path, s.cat_path, s.offset, s.size)
+        return '{} ({}: {})'.format(
+            s.virtual_path, s.source_type, s.sys_path)
+
+
+class VFS_Index:
+    '''
+    Merged index of file sources, keyed by virtual path.
+
+    Attributes:
+    * entry_dict
+      - Dict, keyed by virtual path (with packed extension for packed
+        files), holding the highest priority VFS_Entry for that path.
+    * shadowed_entries_dict
+      - Dict, keyed by virtual path, holding a list of lower priority
+        VFS_Entry objects that were overridden.
+      - Only paths with overrides are present.
+    * lower_entry_dict
+      - Dict, keyed by lowercased virtual path, holding the highest
+        priority VFS_Entry among all case variants of the path.
+    * case_variants_dict
+      - Dict, keyed by lowercased virtual path, holding a list of the
+        differently cased virtual paths seen for it.
+      - Only paths with more than one case variant are present.
+    '''
+    def __init__(s):
+        s.entry_dict = {}
+        s.shadowed_entries_dict = {}
+        s.lower_entry_dict = {}
+        s.case_variants_dict = {}
+
+
+    def Add_Entry(s, entry):
+        '''
+        Add a VFS_Entry to the index. If an entry of higher or equal
+        priority is already present for the same path, the new entry
+        is recorded as shadowed instead.
+        '''
+        virtual_path = entry.virtual_path
+        s._Add_Lower_Entry(entry)
+
+        prior_entry = s.entry_dict.get(virtual_path)
+        if prior_entry == None:
+            s.entry_dict[virtual_path] = entry
+            return
+
+        if entry.priority < prior_entry.priority:
+            s.entry_dict[virtual_path] = entry
+            shadowed_entry = prior_entry
+        else:
+            shadowed_entry = entry
+        s.shadowed_entries_dict.setdefault(virtual_path, []).append(shadowed_entry)
+        return
+
+
+    def _Add_Lower_Entry(s, entry):
+        '''
+        Record an entry under its lowercased path, keeping the highest
+        priority one, and noting any case variants.
+        '''
+        lower_path = entry.virtual_path.lower()
+        prior_entry = s.lower_entry_dict.get(lower_path)
+        if prior_entry == None:
+            s.lower_entry_dict[lower_path] = entry
+            return
+
+        if prior_entry.virtual_path != entry.virtual_path:
+            variants = s.case_variants_dict.setdefault(
+                lower_path, [prior_entry.virtual_path])
+            if entry.virtual_path not in variants:
+                variants.append(entry.virtual_path)
+
+        if entry.priority < prior_entry.priority:
+            s.lower_entry_dict[lower_path] = entry
+        return
+
+
+    def Add_Cat(s, cat_file_path, cat_reader, priority):
+        '''
+        Add all entries of a Cat_Reader to the index, at the given priority.
+        Entries under the scripts folder are skipped, since the game
+        does not read scripts from catalogs. Entries whose cat path does
+        not map back from a virtual path (eg. base folder cat entries
+        for folders the game reads from the addon) are also skipped.
+        '''
+        for cat_path, size in cat_reader.file_size_dict.items():
+            virtual_path = Cat_Path_to_Virtual_Path(cat_path)
+            if virtual_path.startswith('scripts/'):
+                continue
+            # Lookups convert virtual paths to cat paths, so only
+            #  entries that round trip would ever be found.
+            if Virtual_Path_to_Cat_Path(virtual_path) != cat_path:
+                continue
+            s.Add_Entry(VFS_Entry(
+                virtual_path = virtual_path,
+                source_type  = 'cat',
+                sys_path     = cat_file_path,
+                priority     = priority,
+                packed       = Is_Packed_Path(virtual_path),
+                cat_path     = cat_path,
+                offset       = cat_reader.file_offset_dict[cat_path],
+                size         = size,
+                ))
+        return
+
+
+    def Find(s, virtual_path):
+        '''
+        Returns the highest priority VFS_Entry for the given virtual path,
+        checking both the given path and its packed version, or None if
+        no source was indexed.
+        When both are found at the same priority, the packed version
+        is returned, matching game behavior.
+        Matching ignores case.
+
+        * virtual_path
+          - String, virtual path of the file, using the unpacked extension.
+        '''
+        virtual_path = virtual_path.lower()
+        entry = s.lower_entry_dict.get(virtual_path)
+        virtual_path_pck = Unpacked_Path_to_Packed_Path(virtual_path)
+        if virtual_path_pck != None:
+            entry_pck = s.lower_entry_dict.get(virtual_path_pck)
+            if entry_pck != None and (
+                    entry == None or entry_pck.priority <= entry.priority):
+                entry = entry_pck
+        return entry
+
+
+    def Get_Override_Lines(s):
+        '''
+        Returns a list of strings describing each virtual path which had
+        multiple sources, with the used source first.
+        '''
+        lines = []
+        for virtual_path in sorted(s.shadowed_entries_dict.keys()):
+            lines.append('{}'.format(virtual_path))
+            lines.append('  used:       {}'.format(s.entry_dict[virtual_path]))
+            for entry in sorted(s.shadowed_entries_dict[virtual_path],
+                                key = lambda x: x.priority):
+                lines.append('  overridden: {}'.format(entry))
+        return lines
+
+
+    def Log_Case_Variants(s):
+        '''
+        Write any paths that were found with multiple case variants to
+        the summary file, noting which was used, and print a warning.
+        '''
+        if not s.case_variants_dict:
+            return
+        Write_Summary_Line('Files found with differently cased paths:')
+        for lower_path, variants in sorted(s.case_variants_dict.items()):
+            Write_Summary_Line('{}'.format(', '.join(variants)))
+            Write_Summary_Line('  used:       {}'.format(
+                s.lower_entry_dict[lower_path]))
+        if Settings.verbose:
+            print('Warning: {} file paths were found with multiple case'
+                  ' variants; see the summary file for details.'.format(
+                      len(s.case_variants_dict)))
+        return
+
+
+    def Log_Overrides(s):
+        '''
+        Write the override descriptions to the summary file.
+        '''
+        lines = s.Get_Override_Lines()
+        if not lines:
+            return
+        Write_Summary_Line('File source overrides:')
+        for line in lines:
+            Write_Summary_Line(line)
+        return
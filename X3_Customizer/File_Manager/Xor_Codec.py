@@ -0,0 +1,106 @@
+'''
+Support for the xor encoding layers applied to cat/dat and x2 style
+pck data.
+
+Cat files use a running xor, starting at 0xDB and incrementing on
+each byte. Dat files use a constant 0x33 xor. X2 style pck files use
+a constant xor taken from their first byte.
+
+Encoding/decoding of these layers used to be done with a per-byte
+python loop or generator, which was very slow for the larger game files
+(eg. multi-megabyte obj files). The functions here instead make use of
+bytes.translate with a precomputed 256 entry table for constant xors,
+and a precomputed 256 byte key stream xor'd as a wide integer for
+running xors, so that the work is done across the whole payload in C.
+
+Xor is its own inverse, so the same functions handle both encoding
+and decoding.
+'''
+
+# Translation tables, keyed by xor value, filled in on demand.
+_xor_table_dict = {}
+# Running xor key streams, keyed by starting xor value, filled in on demand.
+_running_key_dict = {}
+
+def _Get_Xor_Table(xor_value):
+    '''
+    Returns a 256-byte translation table which maps each byte to
+    itself xor'd with xor_value.
+    '''
+    if xor_value not in _xor_table_dict:
+        _xor_table_dict[xor_value] = bytes(x ^ xor_value for x in range(256))
+    return _xor_table_dict[xor_value]
+
+
+def Xor_Constant(binary, xor_value):
+    '''
+    Xor every byte of the given binary with a constant value.
+    Returns a new bytearray, since some callers (eg. obj code) want
+    a mutable result.
+
+    * binary
+      - Bytes, bytearray, or other buffer object (eg. memoryview).
+    * xor_value
+      - Int, the byte value to xor with, 0-255.
+    '''
+    # Translating a bytearray returns a bytearray, so normalize other
+    #  buffer types to that first.
+    if not isinstance(binary, bytearray):
+        binary = bytearray(binary)
+    return binary.translate(_Get_Xor_Table(xor_value))
+
+
+def Xor_Dat(binary):
+    '''
+    Apply the dat file xor (0x33) to the given binary, returning
+    a bytearray. Used for both decoding and encoding.
+    '''
+    return Xor_Constant(binary, 0x33)
+
+
+def _Get_Running_Key(xor_value):
+    '''
+    Returns the 256-byte key stream for a running xor starting at
+    xor_value. The stream repeats after 256 bytes.
+    '''
+    if xor_value not in _running_key_dict:
+        _running_key_dict[xor_value] = bytes(
+            (xor_value + x) % 256 for x in range(256))
+    return _running_key_dict[xor_value]
+
+
+def Xor_Running(binary, xor_value = 0xDB):
+    '''
+    Xor the given binary with a running key, which starts at xor_value
+    and increments (wrapping at 256) on each byte.
+    Returns a new bytearray.
+
+    * binary
+      - Bytes, bytearray, or other buffer object.
+    * xor_value
+      - Int, the starting xor value; defaults to 0xDB, used by cat files.
+    '''
+    length = len(binary)
+    # Tile the key stream out to the payload length, then xor everything
+    #  in one go by treating both as very wide integers.
+    key = _Get_Running_Key(xor_value)
+    key_stream = (key * (length // 256 + 1))[:length]
+    result = int.from_bytes(binary, 'little') ^ int.from_bytes(key_stream, 'little')
+    return bytearray(result.to_bytes(length, 'little'))
+
+
+def Decode_Cat(binary):
+    '''
+    Decode cat file binary into a raw text string.
+    Each decoded byte maps to the character of the same value.
+    '''
+    # Latin-1 maps byte values directly to the first 256 code points.
+    return Xor_Running(binary).decode('latin-1')
+
+
+def Encode_Cat(binary):
+    '''
+    Encode cat file binary (already converted from text) using the
+    running xor. Returns a bytearray.
+    '''
+    return Xor_Running(binary)
@@ -3,7 +3,10 @@
 from .Misc import Load_File
 from .Misc import Transform_Wrapper
 from .Misc import Cleanup
+from .Misc import Finish_Transforms
 from .Misc import Write_Files
+from .Misc import Close
+from .Extraction import Extract_Files
 from .Misc import Copy_File
 from .Misc import Add_File
 from .Logs import Write_Summary_Line
@@ -85,6 +85,20 @@ def Run(*args):
         help =  'Disables generation of a catalog file; modified files'
                 ' will be placed in loose folders.')
     
+    argparser.add_argument(
+        '-skip_unchanged', 
+        action='store_true',
+        help =  'Leaves loose files from the prior run untouched when'
+                ' their contents would not change, instead of rewriting'
+                ' them.')
+    
+    argparser.add_argument(
+        '-use_run_cache', 
+        action='store_true',
+        help =  'Records the transform calls and outputs of this run, and'
+                ' reuses the outputs of the prior run instead of running'
+                ' transforms if the calls and source files are unchanged.')
+    
     argparser.add_argument(
         '-dev', 
         action='store_true',
@@ -121,6 +135,34 @@ def Run(*args):
                 ' a normal run but not writing out results.')
     
     
+    argparser.add_argument(
+        '-compression_level', 
+        type = int,
+        choices = range(10),
+        metavar = 'LEVEL',
+        help =  'Gzip compression level, 0 to 9, to use for files packed'
+                ' into the output catalog; lower levels write faster'
+                ' but give larger files. Defaults to 9.')
+    
+    argparser.add_argument(
+        '-extract', 
+        nargs = '+',
+        metavar = 'PATTERN',
+        help =  'Extracts all game files matching the given glob patterns'
+                ' (eg. "types/T*.txt") from their highest priority sources'
+                ' (source folder, loose files, or catalogs, as used by'
+                ' transforms), unpacking any packed files, instead of'
+                ' running transforms.'
+                ' Still requires a user_transform file which specifies'
+                ' the necessary paths.')
+    
+    argparser.add_argument(
+        '-extract_folder', 
+        default = 'extracted',
+        help =  'Folder to place files in when using -extract;'
+                ' defaults to "extracted" in the working directory.')
+    
+    
     # Run the parser on the sys args.
     args = argparser.parse_args(args)
 
@@ -170,6 +212,12 @@ def Run(*args):
         #  skipped early.
         Settings.skip_all_transforms = True
 
+    if args.extract:
+        if not args.quiet:
+            print('Enabling extraction mode; transforms will be skipped.')
+        # Skip transforms, as with cleanup mode.
+        Settings.skip_all_transforms = True
+
     if args.ignore_loose_files:
         if not args.quiet:
             print('Ignoring existing loose game files.')
@@ -190,6 +238,21 @@ def Run(*args):
             print('Disabling catalog generation.')
         Settings.output_to_catalog = False
         
+    if args.skip_unchanged:
+        if not args.quiet:
+            print('Skipping writes of unchanged loose files.')
+        Settings.skip_unchanged_outputs = True
+        
+    if args.use_run_cache:
+        if not args.quiet:
+            print('Enabling the run cache.')
+        Settings.use_run_cache = True
+        
+    if args.compression_level != None:
+        if not args.quiet:
+            print('Using compression level {}.'.format(args.compression_level))
+        Settings.compression_level = args.compression_level
+        
     if args.quiet:
         # No status message here, since being quiet.
         Settings.verbose = False
@@ -203,56 +266,78 @@ def Run(*args):
     if not args.quiet:
         print('Attempting to run {}'.format(user_module_name))
       
+    # Dat files may be held open for source reading once files load,
+    #  so make sure they are released even if something fails.
     try:
-        # Attempt to load the module.
-        # This will kick off all of the transforms as a result.
-        import importlib        
-        module = importlib.machinery.SourceFileLoader(
-            # Provide the name sys will use for this module.
-            # Use the basename to get rid of any path, and prefix
-            #  to ensure the name is unique (don't want to collide
-            #  with other loaded modules).
-            'user_module_' + os.path.basename(user_module_name), 
-            user_module_name
-            ).load_module()
+        try:
+            # Attempt to load the module.
+            # This will kick off all of the transforms as a result.
+            import importlib        
+            module = importlib.machinery.SourceFileLoader(
+                # Provide the name sys will use for this module.
+                # Use the basename to get rid of any path, and prefix
+                #  to ensure the name is unique (don't want to collide
+                #  with other loaded modules).
+                'user_module_' + os.path.basename(user_module_name), 
+                user_module_name
+                ).load_module()
 
-    except Exception as ex:
-        # Make a nice message, to prevent a full stack trace being
-        #  dropped on the user.
-        print('Exception of type "{}" encountered.\n'.format(
-            type(ex).__name__))
-        ex_text = str(ex)
-        if ex_text:
-            print(ex_text)
+        except Exception as ex:
+            # Make a nice message, to prevent a full stack trace being
+            #  dropped on the user.
+            print('Exception of type "{}" encountered.\n'.format(
+                type(ex).__name__))
+            ex_text = str(ex)
+            if ex_text:
+                print(ex_text)
             
-        # For version 3.5, the 'from Transforms import *' input
-        #  format has changed to 'from X3_Customizer import *'.
-        # Check for that here to give a nice message.
-        with open(user_module_name, 'r') as file:
-            for line in file.read().splitlines():
-                if line.strip() == 'from Transforms import *':
-                    print(  'Please update "from Transforms import *"'
-                            ' to "from X3_Customizer import *".')
+            # For version 3.5, the 'from Transforms import *' input
+            #  format has changed to 'from X3_Customizer import *'.
+            # Check for that here to give a nice message.
+            with open(user_module_name, 'r') as file:
+                for line in file.read().splitlines():
+                    if line.strip() == 'from Transforms import *':
+                        print(  'Please update "from Transforms import *"'
+                                ' to "from X3_Customizer import *".')
 
 
-        # In dev mode, reraise the exception.
-        if Settings.developer:
-            raise ex
-        #else:
-        #    print('Enable developer mode for exception stack trace.')
+            # In dev mode, reraise the exception.
+            if Settings.developer:
+                raise ex
+            #else:
+            #    print('Enable developer mode for exception stack trace.')
         
 
-    # If cleanup/writeback not disabled, run them.
-    # These are mainly disabled by the patch builder.
-    if not Settings.disable_cleanup_and_writeback:
-        # Run any needed cleanup.
-        X3_Customizer.File_Manager.Cleanup()
+        # In extraction mode, pull out the files and skip other writes.
+        if args.extract:
+            X3_Customizer.File_Manager.Extract_Files(
+                args.extract, output_folder = args.extract_folder)
+
+        # If cleanup/writeback not disabled, run them.
+        # These are mainly disabled by the patch builder.
+        elif not Settings.disable_cleanup_and_writeback:
+            # Finish up transforms first, while prior outputs are still in
+            #  place, so that any delayed by the run cache read the same
+            #  sources they would have during the script.
+            X3_Customizer.File_Manager.Finish_Transforms()
+
+            # Run any needed cleanup.
+            # The prior catalog is kept, so unchanged files can be reused
+            #  by the writer, along with prior loose files if requested.
+            X3_Customizer.File_Manager.Cleanup(
+                keep_prior_catalog = True,
+                keep_prior_loose_files = Settings.skip_unchanged_outputs)
         
-        # Everything should now be done.
-        # Can open most output files in X3 Editor to verify results.
-        X3_Customizer.File_Manager.Write_Files()
-    else:
-        print('Skipping file writes.')
+            # Everything should now be done.
+            # Can open most output files in X3 Editor to verify results.
+            X3_Customizer.File_Manager.Write_Files()
+        else:
+            # Transforms delayed by the run cache still need to run.
+            X3_Customizer.File_Manager.Finish_Transforms()
+            print('Skipping file writes.')
+    finally:
+        # Release any dat files held open for source reading.
+        X3_Customizer.File_Manager.Close()
 
     print('Run complete')
     
@@ -0,0 +1,768 @@
+'''
+Run timing benchmarks on select parts of the file handling code.
+
+These are developer checks for use when optimizing, and are not needed
+for normal customizer runs. Where a faster method replaced an older one,
+the older reference version is kept here to compare timings and to
+verify the results still match.
+
+Call with '-h' to see the available benchmarks.
+'''
+
+import os
+import sys
+import time
+from pathlib import Path
+import argparse
+import gc
+import gzip
+import math
+import random
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# To support packages cross-referencing each other, set up this
+#  top level as a package, findable on the sys path.
+parent_dir = Path(__file__).resolve().parent.parent
+if str(parent_dir) not in sys.path:
+    sys.path.append(str(parent_dir))
+
+import X3_Customizer
+from X3_Customizer.File_Manager import Xor_Codec
+from X3_Customizer.File_Manager import File_Fields
+from X3_Customizer.File_Manager import File_Types
+from X3_Customizer.File_Manager.File_Types import T_File
+from X3_Customizer.Common.Settings import Settings
+
+
+def Time_Call(function, *args, repeats = 3):
+    '''
+    Calls the function with the given args, repeating a few times.
+    Returns a tuple of (best time in seconds, last return value).
+    '''
+    best_time = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        if best_time == None or elapsed < best_time:
+            best_time = elapsed
+    return best_time, result
+
+
+def Time_Fresh_Call(make_function, function, repeats = 3):
+    '''
+    Calls the function on a fresh result of make_function each repeat,
+    eg. a newly parsed file, timing only the function call.
+    Returns a tuple of (best time in seconds, last return value).
+    '''
+    best_time = None
+    for _ in range(repeats):
+        made = make_function()
+        # Clear garbage from the make, so its collection is not timed.
+        gc.collect()
+        start = time.perf_counter()
+        result = function(made)
+        elapsed = time.perf_counter() - start
+        if best_time == None or elapsed < best_time:
+            best_time = elapsed
+    return best_time, result
+
+
+def Print_Comparison(name, old_time, new_time):
+    '''
+    Print a line comparing an old and new timing.
+    '''
+    print('  {:<30} old: {:8.4f}s   new: {:8.4f}s   speedup: {:.1f}x'.format(
+        name, old_time, new_time, old_time / max(new_time, 1e-9)))
+
+
+def Benchmark_Xor_Dat(args):
+    '''
+    Compare the constant xor codec against the per-byte generator,
+    on a 10 MB payload.
+    '''
+    payload = os.urandom(10 * 1024 * 1024)
+
+    def Reference(binary):
+        return bytearray(x ^ 0x33 for x in binary)
+
+    # The reference is slow, so only run it once.
+    old_time, old_result = Time_Call(Reference, payload, repeats = 1)
+    new_time, new_result = Time_Call(Xor_Codec.Xor_Dat, payload)
+    assert old_result == new_result
+    Print_Comparison('dat xor, 10 MB', old_time, new_time)
+
+
+def Benchmark_Cat_Codec(args):
+    '''
+    Compare the running xor cat codec against the per-byte loops,
+    on a synthetic catalog with 50k entries, and verify round trips.
+    '''
+    cat_lines = ['01.dat'] + [
+        'addon/types/file_{}.pck {}'.format(index, index * 7)
+        for index in range(50000)] + ['']
+    cat_binary = bytes('\n'.join(cat_lines), encoding = 'utf-8')
+
+    def Reference_Encode(binary):
+        xor_value = 0xDB
+        encoded_bytes = bytearray()
+        for byte in binary:
+            encoded_bytes.append(byte ^ xor_value)
+            xor_value = (xor_value + 1) % 256
+        return encoded_bytes
+
+    def Reference_Decode(binary):
+        xor_value = 0xDB
+        decoded_bytes = []
+        for byte in binary:
+            decoded_bytes.append(chr(byte ^ xor_value))
+            xor_value = (xor_value + 1) % 256
+        return ''.join(decoded_bytes)
+
+    old_time, old_encoded = Time_Call(Reference_Encode, cat_binary)
+    new_time, new_encoded = Time_Call(Xor_Codec.Encode_Cat, cat_binary)
+    assert old_encoded == new_encoded
+    Print_Comparison('cat encode, 50k entries', old_time, new_time)
+
+    old_time, old_decoded = Time_Call(Reference_Decode, new_encoded)
+    new_time, new_decoded = Time_Call(Xor_Codec.Decode_Cat, new_encoded)
+    assert old_decoded == new_decoded == cat_binary.decode('latin-1')
+    Print_Comparison('cat decode, 50k entries', old_time, new_time)
+
+    # Round trip some edge case lengths, around the key stream period.
+    for length in [0, 1, 255, 256, 257, 1000]:
+        payload = os.urandom(length)
+        assert Xor_Codec.Encode_Cat(payload) == Reference_Encode(payload)
+        assert Xor_Codec.Xor_Running(Xor_Codec.Encode_Cat(payload)) == payload
+
+
+def Benchmark_Compression(args):
+    '''
+    Compare gzip compression levels for size and time on real game
+    files (TShips and x3_universe), and serial against thread pool
+    compression for a batch of them.
+    Requires the -x3_folder argument.
+    '''
+    if args.x3_folder == None:
+        print('  Skipped; needs -x3_folder to read game files from.')
+        return
+
+    X3_Customizer.Set_Path(path_to_x3_folder = args.x3_folder)
+    from X3_Customizer.File_Manager import Misc
+    Misc.Init()
+    binaries = []
+    for virtual_path in ['types/TShips.txt', 'maps/x3_universe.xml']:
+        game_file = Misc.Source_Reader.Read(virtual_path)
+        binaries.append(game_file.Get_Binary())
+    Misc.Close()
+    total_size = sum(len(x) for x in binaries)
+    print('  Input: {} files, {} bytes'.format(len(binaries), total_size))
+
+    for level in [1, 3, 6, 9]:
+        def Compress_All():
+            return [gzip.compress(x, level) for x in binaries]
+        elapsed, results = Time_Call(Compress_All)
+        size = sum(len(x) for x in results)
+        print('  level {}: {:8.4f}s   size: {:9} ({:.1%})'.format(
+            level, elapsed, size, size / max(total_size, 1)))
+        # Verify the data survives.
+        assert [gzip.decompress(x) for x in results] == binaries
+
+    # Batch of copies, as when many files are modified.
+    batch = binaries * 8
+    def Serial():
+        return [gzip.compress(x, 9) for x in batch]
+    def Parallel():
+        with ThreadPoolExecutor() as executor:
+            return list(executor.map(lambda x: gzip.compress(x, 9), batch))
+    old_time, old_result = Time_Call(Serial)
+    new_time, new_result = Time_Call(Parallel)
+    assert [gzip.decompress(x) for x in old_result] == [
+        gzip.decompress(x) for x in new_result]
+    Print_Comparison('level 9, {} files threaded'.format(len(batch)),
+                     old_time, new_time)
+
+
+def Make_TShips_Binary(line_count, seed = 0):
+    '''
+    Returns the binary of a synthetic TShips file, with the given
+    number of ship lines of random values.
+    '''
+    rand = random.Random(seed)
+    subtypes = ['SG_SH_M3', 'SG_SH_M4', 'SG_SH_M5', 'SG_SH_TS', 'SG_SH_M2']
+    lines = ['// Synthetic TShips\n', '17;{};\n'.format(line_count)]
+    for index in range(line_count):
+        fields = [str(rand.randint(0, 90000)) for _ in range(64)]
+        fields[5] = rand.choice(subtypes)
+        fields[21] = '0.{}'.format(rand.randint(1, 999))
+        fields[-1] = 'SS_SH_{}'.format(index)
+        lines.append(';'.join(fields) + ';\n')
+    return ''.join(lines).replace('\n', '\r\n').encode()
+
+
+def Make_Jobs_Binary(line_count, column_count = 134, seed = 0):
+    '''
+    Returns the binary of a synthetic Jobs file, with the given number
+    of job lines of random values. The column count picks the format,
+    134 for AP and 181 for FL, including the newline entry.
+    '''
+    rand = random.Random(seed)
+    lines = ['// Synthetic Jobs\n', '17;{};\n'.format(line_count)]
+    for index in range(line_count):
+        fields = [str(rand.randint(0, 500)) for _ in range(column_count - 1)]
+        fields[0] = str(index)
+        lines.append(';'.join(fields) + ';\n')
+    return ''.join(lines).replace('\n', '\r\n').encode()
+
+
+def Reference_T_Parse(file_binary, file_name):
+    '''
+    Reference t file parser, making an OrderedDict for every line.
+    Returns a tuple of (line_dict_list, data_dict_list).
+    '''
+    line_dict_list = []
+    data_dict_list = []
+    text = file_binary.decode().replace('\r\n','\n')
+    field_dict = File_Fields.T_file_name_field_dict_dict[file_name]
+    for line in text.splitlines(True):
+        if line.startswith('//'):
+            continue
+        data_list = line.split(';')
+        if ('alt_fields_cols_names' in field_dict
+        and len(data_list) in field_dict['alt_fields_cols_names']):
+            field_dict = File_Fields.T_file_name_field_dict_dict[
+                field_dict['alt_fields_cols_names'][len(data_list)]]
+        this_dict = OrderedDict()
+        for index, field_string in enumerate(data_list):
+            this_key = index
+            if len(data_list) >= field_dict['min_data_entries']:
+                if index in field_dict:
+                    this_key = field_dict[index]
+                negative_index = index - len(data_list)
+                if negative_index in field_dict:
+                    this_key = field_dict[negative_index]
+            this_dict[this_key] = field_string
+        line_dict_list.append(this_dict)
+        if len(this_dict) >= field_dict['min_data_entries']:
+            data_dict_list.append(this_dict)
+    return line_dict_list, data_dict_list
+
+
+def Reference_T_Binary(line_dict_list):
+    '''
+    Reference t file writer, for the line dicts of Reference_T_Parse.
+    '''
+    return bytearray(''.join(';'.join(x.values()) for x in line_dict_list
+                             ).replace('\n','\r\n').encode())
+
+
+def Benchmark_T_File_Columns(args):
+    '''
+    Compare the column store T_File against per-line OrderedDicts,
+    on a synthetic TShips with 20k lines, for parse time, memory held,
+    and a scaling of every ship's hull.
+    '''
+    file_binary = Make_TShips_Binary(20000)
+
+    def New_Parse(binary):
+        t_file = T_File(file_binary = binary,
+                        virtual_path = 'types/TShips.txt')
+        t_file.Parse()
+        return t_file
+
+    old_time, (line_dict_list, data_dict_list) = Time_Call(
+        Reference_T_Parse, file_binary, 'TShips.txt')
+    new_time, t_file = Time_Call(New_Parse, file_binary)
+    assert [dict(x) for x in data_dict_list] == [
+        dict(x) for x in t_file.data_dict_list]
+    assert Reference_T_Binary(line_dict_list) == t_file.Get_Binary()
+    Print_Comparison('parse, 20k lines', old_time, new_time)
+
+    # Measure the memory held by the parsed results.
+    for name, function in [
+            ('old', lambda: Reference_T_Parse(file_binary, 'TShips.txt')),
+            ('new', lambda: New_Parse(file_binary))]:
+        tracemalloc.start()
+        result = function()
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        print('  memory {}: held {:6.1f} MB, peak {:6.1f} MB'.format(
+            name, size / 2**20, peak / 2**20))
+
+    # Scan a column, counting the fighters.
+    def Reference_Scan(dict_list):
+        return sum(1 for x in dict_list if x['subtype'] == 'SG_SH_M3')
+
+    def Column_Scan(t_file):
+        return t_file.Get_Column('subtype').count('SG_SH_M3')
+
+    old_time, old_count = Time_Call(Reference_Scan, data_dict_list)
+    row_time, row_count = Time_Call(Reference_Scan, t_file.data_dict_list)
+    column_time, column_count = Time_Call(Column_Scan, t_file)
+    assert old_count == row_count == column_count
+    Print_Comparison('subtype scan, row views', old_time, row_time)
+    Print_Comparison('subtype scan, column', old_time, column_time)
+
+    # Scale every hull, as with Adjust_Ship_Hull.
+    def Reference_Update(dict_list):
+        for this_dict in dict_list:
+            this_dict['hull_strength'] = str(
+                int(int(this_dict['hull_strength']) * 1.2))
+
+    def Column_Update(t_file):
+        t_file.Set_Column('hull_strength', [
+            str(int(int(x) * 1.2)) for x in t_file.Get_Column('hull_strength')])
+
+    def Update_Old(parsed):
+        Reference_Update(parsed[1])
+        return parsed[0]
+
+    def Update_Rows(t_file):
+        Reference_Update(t_file.data_dict_list)
+        return t_file
+
+    def Update_Column(t_file):
+        Column_Update(t_file)
+        return t_file
+
+    # Reparse for each repeat, so the values are scaled once.
+    old_time, line_dict_list = Time_Fresh_Call(
+        lambda: Reference_T_Parse(file_binary, 'TShips.txt'), Update_Old)
+    row_time, row_file = Time_Fresh_Call(
+        lambda: New_Parse(file_binary), Update_Rows)
+    column_time, column_file = Time_Fresh_Call(
+        lambda: New_Parse(file_binary), Update_Column)
+    assert (Reference_T_Binary(line_dict_list) == row_file.Get_Binary()
+            == column_file.Get_Binary())
+    Print_Comparison('hull update, row views', old_time, row_time)
+    Print_Comparison('hull update, column', old_time, column_time)
+
+
+def Benchmark_T_File_Numbers(args):
+    '''
+    Compare typed number access on T_File rows against parsing and
+    formatting the field text on every use, for several passes over
+    the speed and hull of a synthetic TShips with 20k lines, as when
+    a run calls multiple ship transforms. Includes the writeout.
+    '''
+    file_binary = Make_TShips_Binary(20000)
+    fields = ['speed', 'acceleration', 'hull_strength']
+
+    def New_Parse():
+        t_file = T_File(file_binary = file_binary,
+                        virtual_path = 'types/TShips.txt')
+        t_file.Parse()
+        return t_file
+
+    def Text_Passes(t_file):
+        for _ in range(5):
+            for this_dict in t_file.data_dict_list:
+                for field in fields:
+                    this_dict[field] = str(round(int(this_dict[field]) * 1.1))
+        return t_file.Get_Binary()
+
+    def Typed_Passes(t_file):
+        for _ in range(5):
+            for this_dict in t_file.data_dict_list:
+                for field in fields:
+                    this_dict.Set_Number(
+                        field, round(this_dict.Get_Int(field) * 1.1))
+        return t_file.Get_Binary()
+
+    def Column_Passes(t_file):
+        for _ in range(5):
+            for field in fields:
+                t_file.Set_Number_Column(field, [
+                    round(x * 1.1) for x in t_file.Get_Number_Column(field)])
+        return t_file.Get_Binary()
+
+    # Reparse for each repeat, so the values are scaled the same.
+    old_time, old_binary = Time_Fresh_Call(New_Parse, Text_Passes)
+    new_time, new_binary = Time_Fresh_Call(New_Parse, Typed_Passes)
+    column_time, column_binary = Time_Fresh_Call(New_Parse, Column_Passes)
+    assert old_binary == new_binary == column_binary
+    Print_Comparison('5 passes, typed rows', old_time, new_time)
+    Print_Comparison('5 passes, typed columns', old_time, column_time)
+
+    # Untouched fields, including odd number text, keep their text.
+    t_file = New_Parse()
+    t_file.columns['speed'][0] = '+0012'
+    row = t_file.data_dict_list[0]
+    assert row.Get_Int('speed') == 12 and row['speed'] == '+0012'
+    row.Set_Number('hull_strength', row.Get_Int('hull_strength'))
+    assert b';+0012;' in t_file.Get_Binary()
+
+
+def Benchmark_T_File_Index(args):
+    '''
+    Compare indexed Find lookups against scanning all lines, for 2000
+    ship names on a synthetic TShips with 20k lines, and check the
+    index follows name edits and added lines.
+    '''
+    t_file = T_File(file_binary = Make_TShips_Binary(20000),
+                    virtual_path = 'types/TShips.txt')
+    names = ['SS_SH_{}'.format(x) for x in range(0, 20000, 10)]
+
+    def Reference_Find(key, value):
+        for line_dict in t_file.data_dict_list:
+            if line_dict[key] == value:
+                return line_dict
+        return None
+
+    old_time, old_results = Time_Call(
+        lambda: [Reference_Find('name', x) for x in names], repeats = 1)
+    new_time, new_results = Time_Call(
+        lambda: [t_file.Find('name', x) for x in names])
+    assert all(x is y for x, y in zip(old_results, new_results))
+    Print_Comparison('find 2000 names', old_time, new_time)
+
+    # Edits and new lines are picked up.
+    row = t_file.Find('name', 'SS_SH_5')
+    row['name'] = 'SS_SH_RENAMED'
+    new_line = OrderedDict(row)
+    new_line['name'] = 'SS_SH_NEW'
+    t_file.Add_Entries([new_line])
+    assert t_file.Find('name', 'SS_SH_5') == None
+    assert t_file.Find('name', 'SS_SH_RENAMED') is row
+    assert t_file.Find('name', 'SS_SH_NEW') is t_file.data_dict_list[-1]
+    assert (t_file.Find_All('subtype', 'SG_SH_M3')
+            == [x for x in t_file.data_dict_list if x['subtype'] == 'SG_SH_M3'])
+
+    # Entries given to Add_Entries are left as given, so annotations
+    #  survive for later calls, as when variant or factory transforms
+    #  run back to back and regenerate text for all prior additions.
+    prior_new_lines = []
+    for suffix in ['A', 'B']:
+        new_line = OrderedDict(row)
+        new_line['name'] = 'SS_SH_NEW_' + suffix
+        new_line.template_name = row['name']
+        new_lines = [new_line]
+        t_file.Add_Entries(new_lines)
+        prior_new_lines += new_lines
+        assert all(x.template_name == 'SS_SH_RENAMED' for x in prior_new_lines)
+    assert t_file.Find('name', 'SS_SH_NEW_B') is t_file.data_dict_list[-1]
+
+
+def Benchmark_T_File_Updates(args):
+    '''
+    Compare the ship scaling transforms (hull, speed, pricing, laser
+    recharge and shield regen, with per-subtype factors) written as
+    loops over line dicts against the same edits using Update_Fields,
+    on a synthetic TShips with 20k lines. The writeout is timed
+    separately, as it is shared by both.
+    '''
+    file_binary = Make_TShips_Binary(20000)
+    factors_dict = {'SG_SH_M3': 1.5, 'SG_SH_M5': 0.7}
+    regen_dict = {'SG_SH_M2': (1000, 0.5, 40000)}
+
+    def New_Parse():
+        t_file = T_File(file_binary = file_binary,
+                        virtual_path = 'types/TShips.txt')
+        t_file.Parse()
+        return t_file
+
+    def Round_Hull(new_value):
+        if new_value > 10000:
+            return math.ceil(new_value/1000)*1000
+        elif new_value > 1000:
+            return math.ceil(new_value/100)*100
+        return math.ceil(new_value/10)*10
+
+    def Reference_Updates(t_file):
+        for this_dict in t_file.data_dict_list:
+            factor = factors_dict.get(this_dict['subtype'], 1.2)
+            value = int(this_dict['hull_strength'])
+            this_dict['hull_strength'] = str(Round_Hull(value * factor))
+            for field in ['speed', 'acceleration',
+                          'relative_value_npc', 'relative_value_player']:
+                value = int(this_dict[field])
+                this_dict[field] = str(round(value * factor))
+            value = float(this_dict['weapon_recharge_factor'])
+            this_dict['weapon_recharge_factor'] = '{0:.6f}'.format(value * factor)
+            if this_dict['subtype'] in regen_dict:
+                target, factor, max_val = regen_dict[this_dict['subtype']]
+                value = int(this_dict['shield_power'])
+                if value > target:
+                    new_value = min(target + (value - target) * factor, max_val)
+                    this_dict['shield_power'] = str(int(round(new_value/10)*10))
+        return t_file
+
+    def Regen(value, subfields):
+        target, factor, max_val = subfields
+        if value <= target:
+            return None
+        return int(round(min(target + (value - target) * factor, max_val)/10)*10)
+
+    def New_Updates(t_file):
+        factors = t_file.Get_Line_Factors(1.2, factors_dict)
+        t_file.Update_Fields('hull_strength', factors,
+                             function = lambda x, y: Round_Hull(x * y))
+        t_file.Update_Fields(['speed', 'acceleration',
+                              'relative_value_npc', 'relative_value_player'],
+                             factors, rounding = round)
+        t_file.Update_Fields('weapon_recharge_factor', factors,
+                             number_type = float, text_format = '{0:.6f}')
+        t_file.Update_Fields('shield_power',
+                             t_file.Get_Line_Factors(None, regen_dict),
+                             function = Regen)
+        return t_file
+
+    old_time, old_file = Time_Fresh_Call(New_Parse, Reference_Updates)
+    new_time, new_file = Time_Fresh_Call(New_Parse, New_Updates)
+    old_write_time, old_binary = Time_Call(old_file.Get_Binary)
+    new_write_time, new_binary = Time_Call(new_file.Get_Binary)
+    assert old_binary == new_binary
+    Print_Comparison('5 ship transforms', old_time, new_time)
+    Print_Comparison('with writeout', old_time + old_write_time,
+                     new_time + new_write_time)
+
+    # Dict and function selectors pick the same lines, so scaling
+    #  up with one and back down with the other restores the file.
+    t_file = New_Parse()
+    original_binary = t_file.Get_Binary()
+    t_file.Update_Fields('speed', 2, selector = {'subtype': 'SG_SH_M3'})
+    t_file.Update_Fields('speed', 0.5, rounding = int,
+                         selector = lambda x: x['subtype'] == 'SG_SH_M3')
+    assert t_file.Get_Binary() == original_binary
+
+
+def Benchmark_T_File_Numpy(args):
+    '''
+    Compare Update_Fields with and without numpy arrays, for ship
+    scalings with per-subtype factors, rounding, limits and a flags
+    filter on a synthetic TShips with 20k lines, and check both give
+    the same file text, including for lines with blank fields.
+    '''
+    if not File_Types.Numpy_available:
+        print('  skipped, numpy not found')
+        return
+    file_binary = Make_TShips_Binary(20000)
+    factors_dict = {'SG_SH_M3': 1.5, 'SG_SH_M5': 0.7}
+    # Treat the missile compatibility as flags, and pick ships with
+    #  the first bit set and second bit clear.
+    flags = {'missile_compatibility_flags': (1, 2)}
+
+    def New_Parse():
+        t_file = T_File(file_binary = file_binary,
+                        virtual_path = 'types/TShips.txt')
+        t_file.Parse()
+        return t_file
+
+    def Updates(t_file):
+        factors = t_file.Get_Line_Factors(1.2, factors_dict)
+        t_file.Update_Fields(['speed', 'acceleration'], factors,
+                             rounding = round)
+        t_file.Update_Fields(['relative_value_npc', 'relative_value_player'],
+                             factors, rounding = math.ceil, minimum = 100)
+        t_file.Update_Fields('weapon_recharge_factor', factors,
+                             number_type = float, text_format = '{0:.6f}')
+        t_file.Update_Fields('hull_strength', 0.9, rounding = int,
+                             maximum = 50000, flags = flags,
+                             selector = {'subtype': ['SG_SH_M3', 'SG_SH_M4']})
+        return t_file
+
+    def Timed_Updates(use_numpy):
+        Settings.use_numpy_for_t_files = use_numpy
+        try:
+            return Time_Fresh_Call(New_Parse, Updates)
+        finally:
+            Settings.use_numpy_for_t_files = True
+
+    old_time, old_file = Timed_Updates(False)
+    new_time, new_file = Timed_Updates(True)
+    assert old_file.Get_Binary() == new_file.Get_Binary()
+    Print_Comparison('ship scalings, numpy', old_time, new_time)
+
+    # Lines that are not picked may have fields that are not numbers,
+    #  and a flags field may be absent; these should be handled the
+    #  same either way.
+    t_file = New_Parse()
+    for line_dict in t_file.data_dict_list:
+        if line_dict['subtype'] == 'SG_SH_M2':
+            line_dict['speed'] = ''
+    mixed_binary = t_file.Get_Binary()
+
+    def Mixed_Updates(use_numpy):
+        Settings.use_numpy_for_t_files = use_numpy
+        try:
+            t_file = T_File(file_binary = mixed_binary,
+                            virtual_path = 'types/TShips.txt')
+            t_file.Parse()
+            t_file.Update_Fields('speed', 2, rounding = round,
+                                 selector = {'subtype': 'SG_SH_M3'})
+            t_file.Update_Fields('speed', 2, flags = {'absent_flags': (1, 0)})
+            return t_file.Get_Binary()
+        finally:
+            Settings.use_numpy_for_t_files = True
+
+    assert Mixed_Updates(False) == Mixed_Updates(True) != mixed_binary
+
+
+def Benchmark_T_File_Writeout(args):
+    '''
+    Compare writing out a synthetic TShips with 20k lines against
+    rejoining every field of every line, when a few lines are modified
+    and when all are, and check the output is the same.
+    '''
+    file_binary = Make_TShips_Binary(20000)
+
+    def New_Parse():
+        t_file = T_File(file_binary = file_binary,
+                        virtual_path = 'types/TShips.txt')
+        t_file.Parse()
+        return t_file
+
+    def Reference_Binary(t_file):
+        # Rejoin every line from its fields in the columns.
+        t_file._Serialize_Numbers()
+        line_list = []
+        for line_dict in t_file.line_dict_list:
+            if isinstance(line_dict, OrderedDict):
+                line_list.append(';'.join(line_dict.values()))
+                continue
+            index = line_dict.index
+            line_list.append(';'.join([t_file.columns[key][index]
+                                       for key in t_file.row_keys[index]]))
+        return bytearray(''.join(line_list).replace('\n','\r\n').encode())
+
+    for name, line_count in [('3 lines', 3), ('all lines', 20000)]:
+        t_file = New_Parse()
+        for row in t_file.data_dict_list[:line_count]:
+            row.Set_Number('speed', row.Get_Int('speed') + 1)
+        old_time, old_binary = Time_Call(Reference_Binary, t_file)
+        new_time, new_binary = Time_Call(t_file.Get_Binary)
+        assert old_binary == new_binary
+        Print_Comparison('writeout, {} modified'.format(name),
+                         old_time, new_time)
+
+    # Unmodified lines keep their original text, including values
+    #  that would not be written the same way by Set_Number.
+    odd_binary = file_binary.replace(b'\r\n17;20000;', b'\r\n17;+0020000;', 1)
+    odd_binary = odd_binary.replace(b'SS_SH_1;', b'SS_SH_1 ;', 1)
+    t_file = T_File(file_binary = odd_binary, virtual_path = 'types/TShips.txt')
+    t_file.data_dict_list[5]['name'] = 'SS_SH_EDITED'
+    t_file.data_dict_list[5]['name'] = 'SS_SH_5'
+    assert bytes(t_file.Get_Binary()) == odd_binary.split(b'\r\n', 1)[1]
+
+
+def Benchmark_T_File_Parse_Jobs(args):
+    '''
+    Measure parse throughput on a synthetic Jobs file with 20k lines in
+    the AP format, compared to the reference parser, and compare looking
+    up the field keys of each line by column count against working them
+    out cell by cell. Also checks the keys for the FL format.
+    '''
+    line_count = 20000
+    file_binary = Make_Jobs_Binary(line_count)
+
+    def New_Parse():
+        t_file = T_File(file_binary = file_binary,
+                        virtual_path = 'types/Jobs.txt')
+        t_file.Parse()
+        return t_file
+
+    old_time, (_, old_data) = Time_Call(
+        Reference_T_Parse, file_binary, 'Jobs.txt')
+    new_time, t_file = Time_Call(New_Parse)
+    Print_Comparison('parse 20k AP jobs', old_time, new_time)
+    print('  {:<30} {:8.0f} lines/s   {:6.1f} MB/s'.format(
+        'parse throughput', line_count / new_time,
+        len(file_binary) / new_time / 1e6))
+    assert all(list(x.items()) == list(y.items())
+               for x, y in zip(old_data[::997], t_file.data_dict_list[::997]))
+
+    # The field key step on its own, for each data line.
+    data_list_list = [x.split(';') for x in
+                      file_binary.decode().splitlines(True)[2:]]
+    def Reference_Keys():
+        field_dict = File_Fields.T_file_name_field_dict_dict['Jobs.txt.ap']
+        key_list = []
+        for data_list in data_list_list:
+            keys = []
+            for index in range(len(data_list)):
+                this_key = index
+                if index in field_dict:
+                    this_key = field_dict[index]
+                negative_index = index - len(data_list)
+                if negative_index in field_dict:
+                    this_key = field_dict[negative_index]
+                    assert index not in field_dict
+                keys.append(this_key)
+            key_list.append(tuple(keys))
+        return key_list
+    def New_Keys():
+        row_keys_dict = File_Types._row_keys_cache.setdefault('Jobs.txt.ap', {})
+        key_list = []
+        for data_list in data_list_list:
+            keys = row_keys_dict.get(len(data_list))
+            if keys == None:
+                keys = row_keys_dict[len(data_list)] = (
+                    File_Types._Compile_Row_Keys('Jobs.txt.ap', len(data_list)))
+            key_list.append(keys)
+        return key_list
+    old_time, old_keys = Time_Call(Reference_Keys, repeats = 1)
+    new_time, new_keys = Time_Call(New_Keys)
+    assert old_keys == new_keys
+    Print_Comparison('field keys, 20k lines', old_time, new_time)
+
+    # FL jobs switch to their own fields.
+    fl_binary = Make_Jobs_Binary(100, column_count = 181)
+    t_file = T_File(file_binary = fl_binary, virtual_path = 'types/Jobs.txt')
+    _, fl_data = Reference_T_Parse(fl_binary, 'Jobs.txt')
+    assert [list(x.keys()) for x in t_file.data_dict_list] == [
+        list(x.keys()) for x in fl_data]
+    assert t_file.Get_Binary() == Reference_T_Binary(
+        Reference_T_Parse(fl_binary, 'Jobs.txt')[0])
+
+
+# Benchmarks, keyed by the name used on the command line.
+Benchmark_dict = {
+    'xor_dat'     : Benchmark_Xor_Dat,
+    'cat_codec'   : Benchmark_Cat_Codec,
+    'compression' : Benchmark_Compression,
+    't_columns'   : Benchmark_T_File_Columns,
+    't_numbers'   : Benchmark_T_File_Numbers,
+    't_index'     : Benchmark_T_File_Index,
+    't_updates'   : Benchmark_T_File_Updates,
+    't_numpy'     : Benchmark_T_File_Numpy,
+    't_writeout'  : Benchmark_T_File_Writeout,
+    't_parse_jobs': Benchmark_T_File_Parse_Jobs,
+    }
+
+
+def Make(*args):
+
+    # Set up command line arguments.
+    argparser = argparse.ArgumentParser(
+        description='Run timing benchmarks on select file handling code.',
+        )
+
+    argparser.add_argument(
+        'benchmarks',
+        nargs = '*',
+        help = 'Names of benchmarks to run; runs all if none given.'
+               ' Options: {}.'.format(', '.join(Benchmark_dict.keys())))
+
+    argparser.add_argument(
+        '-x3_folder',
+        help = 'Path to an X3 install, for benchmarks which use real'
+               ' game files.')
+
+    # Run the parser on the input args.
+    parsed_args = argparser.parse_args(args)
+
+    names = parsed_args.benchmarks or list(Benchmark_dict.keys())
+    for name in names:
+        if name not in Benchmark_dict:
+            argparser.error('unknown benchmark {}'.format(name))
+    for name in names:
+        print('Running {}:'.format(name))
+        Benchmark_dict[name](parsed_args)
+
+
+if __name__ == '__main__':
+    # Feed all args except the first (which is the file name).
+    Make(*sys.argv[1:])
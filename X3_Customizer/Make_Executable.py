@@ -201,7 +201,8 @@ def Make(*args):
         # Exclude scipy, since it adds 500 MB to the 12 MB compile.
         # Code which uses scipy should have an appropriate backup.
         # Also skip numpy and matplotlib, which are only present for
-        #  some optional scaling equation verification.
+        #  some optional scaling equation verification and faster
+        #  T file updates, which fall back on plain python.
         '    excludes = [',
         '        r"scipy",',
         '        r"numpy",',
@@ -145,11 +145,10 @@ def Add_More_Factory_Sizes(
                         size] = factory_dict
 
 
-    # For FL, also get organized entries from tfacsizes, keyed by name.
+    # For FL, also get the tfacsizes file, to look up entries by name.
     if FL:
-        name_tfacsize_dict = {}
-        for facsize_dict in File_Manager.Load_File('types/TFacSizes.txt'):
-            name_tfacsize_dict[facsize_dict['name']] = facsize_dict
+        tfacsizes_file = File_Manager.Load_File('types/TFacSizes.txt',
+                                                return_game_file = True)
         
 
     #Build a list of all factory names.
@@ -294,7 +293,8 @@ def Add_More_Factory_Sizes(
 
                     if FL:
                         # Duplicate the facsize entry, based on names.
-                        template_facsize_dict = name_tfacsize_dict[template_factory_dict['name']]
+                        template_facsize_dict = tfacsizes_file.Find(
+                            'name', template_factory_dict['name'])
                         new_facsize_dict = copy.copy(template_facsize_dict)
                         new_facsize_dict['name'] = new_name
                         new_fac_sizes_list.append(new_facsize_dict)
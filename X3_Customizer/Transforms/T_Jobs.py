@@ -56,29 +56,27 @@ def Adjust_Job_Count(
         match supported) based on the name in the jobs file.
       - '*' will match all jobs not otherwise matched.
     '''
-    # Loop over the jobs.
-    for this_dict in File_Manager.Load_File('types/Jobs.txt'):
-        # Skip dummy entries, determined by abscence of a script for now.
-        # Xrm has many of these dummies seemingly to act as spacing or placeholders.
-        if not this_dict['script']:
-            continue
-
-        # Check for key in the dict, going in order.
-        factor = Find_entry_match(this_dict, job_count_factors)
-        # Skip if no entry was found.
-        if factor == None:
-            continue
-
-        # Adjust both max jobs and max jobs per sector.
-        for entry in ['max_jobs', 'max_jobs_in_sector']:
-            value = int(this_dict[entry])
-            value = round(value * factor)
-            # Floor to 1 if the factor was not 0, to avoid low count
-            #  jobs getting rounded away.
-            if factor != 0:
-                value = max(1, value)
-            # Put back.
-            this_dict[entry] = str(value)
+    jobs_file = File_Manager.Load_File('types/Jobs.txt', return_game_file = True)
+
+    # Check for key in the dict for each job, going in order.
+    # Skip dummy entries, determined by abscence of a script for now.
+    # Xrm has many of these dummies seemingly to act as spacing or placeholders.
+    # Jobs without a match are also skipped, with a None factor.
+    factors = [Find_entry_match(this_dict, job_count_factors)
+               if this_dict['script'] else None
+               for this_dict in jobs_file.Read_Data()]
+
+    def Scale_Count(value, factor):
+        value = round(value * factor)
+        # Floor to 1 if the factor was not 0, to avoid low count
+        #  jobs getting rounded away.
+        if factor != 0:
+            value = max(1, value)
+        return value
+
+    # Adjust both max jobs and max jobs per sector.
+    jobs_file.Update_Fields(['max_jobs', 'max_jobs_in_sector'], factors,
+                            function = Scale_Count)
 
                 
             
@@ -100,9 +98,13 @@ def Adjust_Job_Respawn_Time(
         match supported) based on the name in the jobs file.
       - '*' will match all jobs not otherwise matched.
     '''
-    # Loop over the jobs.
-    for this_dict in File_Manager.Load_File('types/Jobs.txt'):
+    jobs_file = File_Manager.Load_File('types/Jobs.txt', return_game_file = True)
+
+    # Pair up the multiplier and adder for each job, or None to skip it.
+    factors = []
+    for this_dict in jobs_file.Read_Data():
         if not this_dict['script']:
+            factors.append(None)
             continue
 
         # Check for key in the dict, going in order.
@@ -111,15 +113,15 @@ def Adjust_Job_Respawn_Time(
         minutes_to_add = Find_entry_match(this_dict, time_adder_list)
         
         # Skip if no entry was found for either of these.
-        if multiplier == None:
-            continue
-        if minutes_to_add == None:
-            continue
-
-        # Apply adjustment, converting minutes to seconds.
-        value = int(this_dict['respawn_time'])
-        value = round(value * multiplier + minutes_to_add * 60)
-        this_dict['respawn_time'] = str(value)
+        if multiplier == None or minutes_to_add == None:
+            factors.append(None)
+        else:
+            factors.append((multiplier, minutes_to_add))
+
+    # Apply adjustment, converting minutes to seconds.
+    jobs_file.Update_Fields(
+        'respawn_time', factors,
+        function = lambda value, pair: round(value * pair[0] + pair[1] * 60))
 
     return
 
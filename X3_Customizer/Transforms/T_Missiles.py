@@ -301,37 +301,42 @@ def Adjust_Missile_Speed(
         # Get the function.
         scaling_func = Scaling_Equations.Get_Scaling_Fit(x_vec, y_vec)
         
-    # Step through each missile.
-    for this_dict in File_Manager.Load_File('types/TMissiles.txt'):
+    tmissiles_file = File_Manager.Load_File('types/TMissiles.txt',
+                                            return_game_file = True)
 
-        # Get speed in m/s, using /500 factor.
-        speed = int(this_dict['speed']) / 500
-        
-        # Adjust the range, using equation or flat factor.
-        if use_scaling_equation:
-            new_speed = scaling_func(speed)
-        else:
-            new_speed = speed * scaling_factor
-
-        # To keep range unchanged, boost lifetime by a corresponding amount.
-        lifetime = int(this_dict['lifetime'])
-        new_lifetime = lifetime * speed / new_speed
-
-        # Adjust acceleration proportional with speed.
-        acceleration = int(this_dict['acceleration'])
-        new_acceleration = acceleration * new_speed / speed
-
-        # Put speed back with *500 factor.
-        this_dict['speed']    = str(int(new_speed * 500))
-        this_dict['acceleration'] = str(int(new_acceleration))
-        this_dict['lifetime'] = str(int(new_lifetime))
+    # Get speeds in m/s, using /500 factor.
+    speeds = [x / 500 for x in tmissiles_file.Get_Number_Column('speed')]
+    # Adjust the speeds, using equation or flat factor.
+    if use_scaling_equation:
+        new_speeds = [scaling_func(x) for x in speeds]
+    else:
+        new_speeds = [x * scaling_factor for x in speeds]
+    # Pair up the old and new speeds for each missile.
+    speed_pairs = list(zip(speeds, new_speeds))
+
+    # To keep range unchanged, boost lifetime by a corresponding amount.
+    tmissiles_file.Update_Fields(
+        'lifetime', speed_pairs,
+        function = lambda value, pair: int(value * pair[0] / pair[1]))
+
+    # Adjust acceleration proportional with speed.
+    tmissiles_file.Update_Fields(
+        'acceleration', speed_pairs,
+        function = lambda value, pair: int(value * pair[1] / pair[0]))
+
+    # Put speed back with *500 factor.
+    tmissiles_file.Update_Fields(
+        'speed', speed_pairs,
+        function = lambda value, pair: int(pair[1] * 500))
         
-        # Debug printout.
-        # Give missile name, old and new value,
-        #  and the scaling factor.
-        if print_changes:
+    # Debug printout.
+    # Give missile name, old and new value,
+    #  and the scaling factor.
+    if print_changes:
+        for name, speed, new_speed in zip(
+                tmissiles_file.Get_Column('name'), speeds, new_speeds):
             File_Manager.Write_Summary_Line('{:<30} : {:>10.2f} -> {:>10.2f}, x{}'.format(
-                this_dict['name'],
+                name,
                 speed,
                 new_speed,
                 # Give only two sig digits for the scaling factor.
@@ -397,33 +402,36 @@ def Adjust_Missile_Range(
         # Get the function.
         scaling_func = Scaling_Equations.Get_Scaling_Fit(x_vec, y_vec)
         
-    # Step through each missile.
-    for this_dict in File_Manager.Load_File('types/TMissiles.txt'):
-
-        # Calculate original range from speed and lifetime.
-        speed = int(this_dict['speed'])
-        lifetime = int(this_dict['lifetime'])
-
-        # Translate to km, where speed was meters per 500 s and
-        #  lifetime was in ms.
-        range_km = speed * lifetime / 500 / 1000 / 1000
-
-        # Adjust the range, using equation or flat factor.
-        if use_scaling_equation:
-            new_range_km = scaling_func(range_km)
-        else:
-            new_range_km = range_km * scaling_factor
-
-        # Apply new range by adjusting lifetime.
-        new_lifetime = lifetime * new_range_km / range_km
-        this_dict['lifetime'] = str(int(new_lifetime))
+    tmissiles_file = File_Manager.Load_File('types/TMissiles.txt',
+                                            return_game_file = True)
+
+    # Calculate original range from speed and lifetime.
+    # Translate to km, where speed was meters per 500 s and
+    #  lifetime was in ms.
+    ranges_km = [speed * lifetime / 500 / 1000 / 1000
+                 for speed, lifetime in zip(
+                     tmissiles_file.Get_Number_Column('speed'),
+                     tmissiles_file.Get_Number_Column('lifetime'))]
+
+    # Adjust the ranges, using equation or flat factor.
+    if use_scaling_equation:
+        new_ranges_km = [scaling_func(x) for x in ranges_km]
+    else:
+        new_ranges_km = [x * scaling_factor for x in ranges_km]
+
+    # Apply new range by adjusting lifetime.
+    tmissiles_file.Update_Fields(
+        'lifetime', list(zip(ranges_km, new_ranges_km)),
+        function = lambda value, pair: int(value * pair[1] / pair[0]))
         
-        # Debug printout.
-        # Give missile name, old and new range,
-        #  and the scaling factor.
-        if print_changes:
+    # Debug printout.
+    # Give missile name, old and new range,
+    #  and the scaling factor.
+    if print_changes:
+        for name, range_km, new_range_km in zip(
+                tmissiles_file.Get_Column('name'), ranges_km, new_ranges_km):
             File_Manager.Write_Summary_Line('{:<30} : {:>10.2f} -> {:>10.2f}, x{}'.format(
-                this_dict['name'],
+                name,
                 range_km,
                 new_range_km,
                 # Give only two sig digits for the scaling factor.
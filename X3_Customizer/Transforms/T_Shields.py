@@ -18,10 +18,11 @@ def Adjust_Shield_Regen(
     * scaling_factor:
       - Multiplier to apply to all shield types.
     '''
-    for this_dict in File_Manager.Load_File('types/TShields.txt'):
-        if scaling_factor != 1:
-            # Grab the shield efficiency, as a float.
-            value = float(this_dict['efficiency'])
-            new_value = value * scaling_factor
-            # Put it back, with 1 decimal place.
-            this_dict['efficiency'] = str('{0:.1f}'.format(new_value))
+    tshields_file = File_Manager.Load_File('types/TShields.txt',
+                                           return_game_file = True)
+    if scaling_factor != 1:
+        # Scale the shield efficiency, as a float, and put it back with
+        #  1 decimal place.
+        tshields_file.Update_Fields('efficiency', scaling_factor,
+                                    number_type = float,
+                                    text_format = '{0:.1f}')
@@ -55,29 +55,30 @@ def Adjust_Ship_Hull(
       - Bool, if True (default) repair lasers will be scaled by the M6 
         hull scaling (if given), to avoid large changes in repair times.
     '''
-    for this_dict in File_Manager.Load_File('types/TShips.txt'):
-        if this_dict['subtype'] in adjustment_factors_dict or scaling_factor != 1:
-            value = int(this_dict['hull_strength'])
-            
-            # Pick the table scaling factor, or the default.
-            if this_dict['subtype'] in adjustment_factors_dict:
-                new_value = value * adjustment_factors_dict[this_dict['subtype']]
-            else:
-                new_value = value * scaling_factor
-
-            # Most hulls appear to be in the thousands, so round to nearest thousand.
-            # Skip this for ships with very small hulls, eg. fighter drones (10) and
-            #  similar, using a smaller rounding.
-            if new_value > 10000:
-                new_value = math.ceil(new_value/1000)*1000
-            elif new_value > 1000:
-                new_value = math.ceil(new_value/100)*100
-            else:
-                new_value = math.ceil(new_value/10)*10
-            # Error check on hull getting 0'd out on a ship that didn't already
-            #  have 0 hull (as in some dummy entries)
-            assert new_value != 0 or value == 0
-            this_dict['hull_strength'] = str(new_value)
+    tships_file = File_Manager.Load_File('types/TShips.txt',
+                                         return_game_file = True)
+    # Pick the table scaling factor for each ship, or the default.
+    factors = tships_file.Get_Line_Factors(
+        scaling_factor if scaling_factor != 1 else None,
+        adjustment_factors_dict)
+
+    def Scale_Hull(value, factor):
+        new_value = value * factor
+        # Most hulls appear to be in the thousands, so round to nearest thousand.
+        # Skip this for ships with very small hulls, eg. fighter drones (10) and
+        #  similar, using a smaller rounding.
+        if new_value > 10000:
+            new_value = math.ceil(new_value/1000)*1000
+        elif new_value > 1000:
+            new_value = math.ceil(new_value/100)*100
+        else:
+            new_value = math.ceil(new_value/10)*10
+        # Error check on hull getting 0'd out on a ship that didn't already
+        #  have 0 hull (as in some dummy entries)
+        assert new_value != 0 or value == 0
+        return new_value
+
+    tships_file.Update_Fields('hull_strength', factors, function = Scale_Hull)
 
 
     # Upscale repair lasers if M3 scaling given.
@@ -122,29 +123,20 @@ def Adjust_Ship_Speed(
     # Here, ratios will be hard set based on feel or other analysis.
     # Note: while acceleration could also be changed, since it was buffed to a lesser extent
     #  as well, it should be safe to leave it alone for now.
-    for this_dict in File_Manager.Load_File('types/TShips.txt'):
-
-        # Determine the scaling factor.
-        this_scaling_factor = scaling_factor
-        # Check for specific ship name.
-        if this_dict['name'] in adjustment_factors_dict:
-            this_scaling_factor = adjustment_factors_dict[this_dict['name']]
-        # Check for ship type.
-        elif this_dict['subtype'] in adjustment_factors_dict:
-            this_scaling_factor = adjustment_factors_dict[this_dict['subtype']]
-
-        # Adjust speed.
-        if this_scaling_factor != 1:
-            # Change both speed and acceleration, so that faster ships
-            #  are also more maneuverable.
-            for field in ['speed','acceleration']:
-                # Only really need to adjust base speed itself, not tuning count.
-                value = int(this_dict[field])
-                new_value = value * this_scaling_factor
-                # Round it off.
-                new_value = round(new_value)
-                # Put it back.
-                this_dict[field] = str(new_value)
+    tships_file = File_Manager.Load_File('types/TShips.txt',
+                                         return_game_file = True)
+    # Determine the scaling factor, checking for specific ship names
+    #  ahead of ship types.
+    factors = tships_file.Get_Line_Factors(
+        scaling_factor, adjustment_factors_dict, keys = ('name', 'subtype'))
+    # Skip ships that are not being changed.
+    factors = [None if x == 1 else x for x in factors]
+
+    # Change both speed and acceleration, so that faster ships
+    #  are also more maneuverable.
+    # Only really need to adjust base speed itself, not tuning count.
+    tships_file.Update_Fields(['speed','acceleration'], factors,
+                              rounding = round)
 
             
 @File_Manager.Transform_Wrapper('types/TShips.txt')
@@ -165,31 +157,27 @@ def Adjust_Ship_Laser_Recharge(
         This may cause oddities if applied to an existing save.
         Defaults False.
     '''
-    for this_dict in File_Manager.Load_File('types/TShips.txt'):
-        if this_dict['subtype'] in adjustment_factors_dict or scaling_factor != 1:
-            
-            # Pick the table scaling factor, or the default.
-            if this_dict['subtype'] in adjustment_factors_dict:
-                this_scaling = adjustment_factors_dict[this_dict['subtype']]
-            else:
-                this_scaling = scaling_factor
-
-            #  The recharge is stored as a multiplier on the ships
-            #   maximum stored energy.
-            #  When updating the maximum, only it needs to change and the
-            #   recharge will scale accordingly.
-            #  When not updating maximum, the multiplier needs to be
-            #   changed directly.
-            if adjust_energy_cap:
-                value = int(this_dict['weapon_energy'])
-                new_value = value * this_scaling
-                this_dict['weapon_energy'] = str(int(new_value))
-            else:
-                # Note that weapon recharge is a float, so do no rounding.
-                value = float(this_dict['weapon_recharge_factor'])
-                new_value = value * this_scaling
-                # Limit to 6 decimals.
-                this_dict['weapon_recharge_factor'] = str('{0:.6f}'.format(new_value))
+    tships_file = File_Manager.Load_File('types/TShips.txt',
+                                         return_game_file = True)
+    # Pick the table scaling factor for each ship, or the default.
+    factors = tships_file.Get_Line_Factors(
+        scaling_factor if scaling_factor != 1 else None,
+        adjustment_factors_dict)
+
+    #  The recharge is stored as a multiplier on the ships
+    #   maximum stored energy.
+    #  When updating the maximum, only it needs to change and the
+    #   recharge will scale accordingly.
+    #  When not updating maximum, the multiplier needs to be
+    #   changed directly.
+    if adjust_energy_cap:
+        tships_file.Update_Fields('weapon_energy', factors, rounding = int)
+    else:
+        # Note that weapon recharge is a float, so do no rounding.
+        # Limit to 6 decimals.
+        tships_file.Update_Fields('weapon_recharge_factor', factors,
+                                  number_type = float,
+                                  text_format = '{0:.6f}')
 
             
             
@@ -206,22 +194,16 @@ def Adjust_Ship_Pricing(
     * adjustment_factors_dict:
       - Dict keyed by ship type, holding a scaling factor to be applied.
     '''
-    for this_dict in File_Manager.Load_File('types/TShips.txt'):
-        if this_dict['subtype'] in adjustment_factors_dict or scaling_factor != 1:
-            # Apply change to both npc and player costs.
-            for field in ['relative_value_npc', 'relative_value_player']:
-                value = int(this_dict[field])
-
-                # Pick the table scaling factor, or the default.
-                if this_dict['subtype'] in adjustment_factors_dict:
-                    new_value = value * adjustment_factors_dict[this_dict['subtype']]
-                else:
-                    new_value = value * scaling_factor
-
-                # Round it off.
-                new_value = round(new_value)
-                # Put it back.
-                this_dict[field] = str(new_value)
+    tships_file = File_Manager.Load_File('types/TShips.txt',
+                                         return_game_file = True)
+    # Pick the table scaling factor for each ship, or the default.
+    factors = tships_file.Get_Line_Factors(
+        scaling_factor if scaling_factor != 1 else None,
+        adjustment_factors_dict)
+    # Apply change to both npc and player costs.
+    tships_file.Update_Fields(
+        ['relative_value_npc', 'relative_value_player'], factors,
+        rounding = round)
 
 
                 
@@ -245,33 +227,33 @@ def Adjust_Ship_Shield_Regen(
         reduction_factor applied to the difference in original and target 
         rates. Recharge rates will be capped at max_rate.
     '''
-    for this_dict in File_Manager.Load_File('types/TShips.txt'):
-        if this_dict['subtype'] in adjustment_factors_dict:
-            # Get the subfields from the dict.
-            target, factor, max_val = adjustment_factors_dict[this_dict['subtype']]
-
-            # Get the original shield power.
-            value = int(this_dict['shield_power'])
-
-            # Only apply factor if it was over the target.
-            if value > target:
-                new_value = target + (value - target) * factor
-                # Apply max if given.
-                if max_val != None:
-                     new_value = min(new_value, max_val)
-                # Round to the nearest 50, since shield regen is normally scaled to
-                #  100 or occasionally 50. Sometimes it goes lower for light ships,
-                #  so update this to round to 10.
-                new_value = round(new_value/10)*10
-                this_dict['shield_power'] = str(int(new_value))
-                
-        # Do a global adjustment separate from the category adjustments.
-        if scaling_factor != 1:
-            value = int(this_dict['shield_power'])
-            new_value = value * scaling_factor
-            # Scale to nearest 10, as above.
-            new_value = round(new_value/10)*10
-            this_dict['shield_power'] = str(int(new_value))
+    tships_file = File_Manager.Load_File('types/TShips.txt',
+                                         return_game_file = True)
+    # Get the subfields for each ship from the dict.
+    factors = tships_file.Get_Line_Factors(None, adjustment_factors_dict)
+
+    def Reduce_Regen(value, subfields):
+        target, factor, max_val = subfields
+        # Only apply factor if it was over the target.
+        if value <= target:
+            return None
+        new_value = target + (value - target) * factor
+        # Apply max if given.
+        if max_val != None:
+             new_value = min(new_value, max_val)
+        # Round to the nearest 50, since shield regen is normally scaled to
+        #  100 or occasionally 50. Sometimes it goes lower for light ships,
+        #  so update this to round to 10.
+        return int(round(new_value/10)*10)
+
+    tships_file.Update_Fields('shield_power', factors, function = Reduce_Regen)
+
+    # Do a global adjustment separate from the category adjustments.
+    if scaling_factor != 1:
+        # Scale to nearest 10, as above.
+        tships_file.Update_Fields(
+            'shield_power', scaling_factor,
+            function = lambda value, factor: int(round(value*factor/10)*10))
                 
 
             
@@ -349,15 +331,16 @@ def Fix_Pericles_Pricing():
     what it should be.
     Does nothing if the existing npc and player prices are matched.
     '''
-    for this_dict in File_Manager.Load_File('types/TShips.txt'):
-        if this_dict['name'] == 'SS_SH_P_M4_ENH':
-            # Verify the bug is in place, with mismatched pricing.
-            # If this was already fixed in the source file, skip this step.
-            npc_price    = int(this_dict['relative_value_npc'])
-            player_price = int(this_dict['relative_value_player'])
-            if npc_price < player_price:
-                this_dict['relative_value_npc'] = this_dict['relative_value_player']
-            break
+    this_dict = File_Manager.Load_File('types/TShips.txt', 
+                                       return_game_file = True
+                                       ).Find('name', 'SS_SH_P_M4_ENH')
+    if this_dict != None:
+        # Verify the bug is in place, with mismatched pricing.
+        # If this was already fixed in the source file, skip this step.
+        npc_price    = int(this_dict['relative_value_npc'])
+        player_price = int(this_dict['relative_value_player'])
+        if npc_price < player_price:
+            this_dict['relative_value_npc'] = this_dict['relative_value_player']
 
        
 @File_Manager.Transform_Wrapper('types/TShips.txt')
@@ -444,20 +427,18 @@ def Boost_Truelight_Seeker_Shield_Reactor():
     If the TLS is already at least 1/5 of Centaur shielding, this
     transform is not applied.
     '''
-    # Look for the centaur.
-    for this_dict in File_Manager.Load_File('types/TShips.txt'):
-        if this_dict['name'] == 'SS_SH_A_M6_P':
-            # Note its shield reactor.
-            centaur_shield_power = int(this_dict['shield_power'])
-            break
-    # Look for the TLS.
-    for this_dict in File_Manager.Load_File('types/TShips.txt'):
-        if this_dict['name'] == 'SS_SH_TLS':
-            shield_power = int(this_dict['shield_power'])
-            # Apply change if not within 1/5 of the centaur shielding.
-            if shield_power < centaur_shield_power / 5:
-                this_dict['shield_power'] = str(centaur_shield_power)
-            break
+    tships_file = File_Manager.Load_File('types/TShips.txt', 
+                                         return_game_file = True)
+    # Look for the centaur and the TLS.
+    centaur_dict = tships_file.Find('name', 'SS_SH_A_M6_P')
+    this_dict = tships_file.Find('name', 'SS_SH_TLS')
+    if this_dict != None:
+        # Note the centaur shield reactor.
+        centaur_shield_power = int(centaur_dict['shield_power'])
+        shield_power = int(this_dict['shield_power'])
+        # Apply change if not within 1/5 of the centaur shielding.
+        if shield_power < centaur_shield_power / 5:
+            this_dict['shield_power'] = str(centaur_shield_power)
 
         
 @File_Manager.Transform_Wrapper('types/TShips.txt')
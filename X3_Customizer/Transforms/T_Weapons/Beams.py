@@ -144,32 +144,28 @@ def Adjust_Beam_Weapon_Width(
     '''
     # TODO: consider length increases, which may have performance benefit at the
     #  drawback of beams maybe visually going through small targets slightly.
-    for this_dict in File_Manager.Load_File('types/TBullets.txt'):
-        flags_dict = Flags.Unpack_Tbullets_Flags(this_dict)
-
-        # Skip if this isn't a beam.
-        if not flags_dict['beam']:
-            continue
-
-        # Determine the scaling, or skip if a scaling not found.
-        if this_dict['name'] in bullet_name_adjustment_dict:
-            min_val, factor, max_val = bullet_name_adjustment_dict[this_dict['name']]
-        elif '*' in bullet_name_adjustment_dict:
-            min_val, factor, max_val = bullet_name_adjustment_dict['*']
+    tbullets_file = File_Manager.Load_File('types/TBullets.txt',
+                                           return_game_file = True)
+    # Only change beams.
+    beam_flags = {'flags': (Flags.Get_Flag_Bits(Flags.TBullets_flag_bits, 'beam'), 0)}
+
+    # Apply each scaling to the beams it matches.
+    for name, (min_val, factor, max_val) in bullet_name_adjustment_dict.items():
+        if name == '*':
+            selector = lambda x: x['name'] not in bullet_name_adjustment_dict
         else:
-            continue
-
-        # Apply to width and height.
-        for field in ['box_width', 'box_height']:
-            # Look up the value, apply scalings.
-            value = float(this_dict[field])
-            value *= factor
-            if min_val != None:
-                value = max(value, min_val)
-            if max_val != None:
-                value = min(value, max_val)
-            # Put it back, with 1 decimal place.
-            this_dict[field] = '{0:.1f}'.format(value)
+            selector = {'name': name}
+
+        # Apply to width and height, putting it back with 1 decimal
+        #  place. Limits are floats so the formatting is the same.
+        tbullets_file.Update_Fields(
+            ['box_width', 'box_height'], factor,
+            selector = selector,
+            flags = beam_flags,
+            number_type = float,
+            minimum = None if min_val == None else float(min_val),
+            maximum = None if max_val == None else float(max_val),
+            text_format = '{0:.1f}')
             
 
 # Replace beams with normal shots.
@@ -58,6 +58,8 @@ Usage for the Python source code:
    - If the scipy package is available, this supports smoother curve fits
      for some transforms, which were omitted from the Release due to
      file size.
+   - If the numpy package is available, bulk edits to T files are done
+     on whole columns as arrays, which is faster for large files.
  * "X3_Customizer\Make_Documentation.py"
    - Generates updated documentation for this project, as markdown
      formatted files README.md and Documentation.md.
@@ -65,6 +67,10 @@ Usage for the Python source code:
    - Generates a standalone executable and support files, placed
      in the bin folder. Requires the PyInstaller package be available.
      The executable will be created for the system it was generated on.
+ * "X3_Customizer\Make_Benchmarks.py"
+   - Runs timing benchmarks on select file handling code, comparing
+     against older reference implementations where available.
+     Intended for development use.
  * "X3_Customizer\Make_Patches.py"
    - Generates patch files for this project from some select modified
      game scripts. Requires the modified scripts be present in the